@@ -1,5 +1,130 @@
-from django.contrib import admin
-from .models import Destination, Package, Booking, UserProfile
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import OperationalError, connections
+from django.http import FileResponse, Http404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from .models import Destination, Package, Booking, SeatHold, Task, UserProfile
+from . import exports, queue, tasks
+
+
+def estimated_count(queryset):
+    """Row count of an unfiltered queryset from the planner statistics, or None if there are none"""
+    if queryset.query.where:
+        return None
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        try:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                # Written by ANALYZE / PRAGMA optimize; the first number is the row count
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+        except OperationalError:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Use the planner's row estimate instead of COUNT(*) for large unfiltered changelists"""
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_ROWS', 100000):
+            return estimate
+        return super().count
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """A related-object filter that searches as you type instead of listing every object"""
+    template = 'admin/bookings/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.model_admin = model_admin
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        return []
+
+    def has_output(self):
+        return True
+
+    def rendered_widget(self):
+        widget = AutocompleteSelect(self.field, self.model_admin.admin_site, attrs={
+            'data-filter-param': self.lookup_kwarg, 'style': 'width: 100%',
+        })
+        # Only the selected object is loaded, to show its name
+        form_field = forms.ModelChoiceField(
+            self.field.remote_field.model._default_manager.all(), widget=widget, required=False
+        )
+        return form_field.widget.render(self.lookup_kwarg, self.lookup_val[0] if self.lookup_val else None)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin options for tables too large to count, scan or list in full.
+
+    Changelists count with the planner's estimate, skip the unfiltered total
+    and facet counts, and filter related objects through autocomplete. The
+    CSV export action streams small selections and hands large ones to the
+    task queue.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    actions = ['export_csv']
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media + forms.Media(
+            js=['bookings/admin/autocomplete_filter.js']
+        )
+
+    @admin.action(description='Export selected %(verbose_name_plural)s to CSV', permissions=['view'])
+    def export_csv(self, request, queryset):
+        limit = getattr(settings, 'ADMIN_EXPORT_SYNC_ROWS', 5000)
+        name = exports.file_name(self.model, request.user.id)
+        # Counting at most one row past the limit keeps the check cheap
+        if queryset[:limit + 1].count() <= limit:
+            return exports.stream(queryset, name)
+        url = request.build_absolute_uri(reverse(
+            f'admin:{self.model._meta.app_label}_{self.model._meta.model_name}_export', args=[name]
+        ))
+        # Large selections come from "select all", which the changelist query string describes
+        queue.enqueue(tasks.export_changelist, self.model._meta.label, request.GET.urlencode(), request.user.id, name, url)
+        self.message_user(request, format_html(
+            'More than {} rows selected, so the export is being prepared in the background. '
+            'It will be available <a href="{}">here</a>{}.',
+            limit, url, ' and a link will be emailed to you' if request.user.email else '',
+        ), messages.INFO)
+        return None
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('exports/<str:name>/', self.admin_site.admin_view(self.download_export), name='%s_%s_export' % info),
+        ] + super().get_urls()
+
+    def download_export(self, request, name):
+        # Users may only fetch their own exports of this model
+        if not self.has_view_permission(request) or not name.startswith(f'{self.model._meta.model_name}-{request.user.id}-'):
+            raise Http404
+        file = exports.export_root() / name
+        if '/' in name or not file.is_file():
+            raise Http404('This export does not exist or is not ready yet.')
+        return FileResponse(open(file, 'rb'), as_attachment=True, filename=name)
+
 
 @admin.register(Destination)
 class DestinationAdmin(admin.ModelAdmin):
@@ -9,25 +134,50 @@ class DestinationAdmin(admin.ModelAdmin):
     ordering = ('name',)
 
 @admin.register(Package)
-class PackageAdmin(admin.ModelAdmin):
+class PackageAdmin(LargeTableAdmin):
     list_display = ('name', 'destination', 'package_type', 'price', 'duration_days', 'available_seats', 'departure_date')
-    list_filter = ('package_type', 'destination', 'departure_date', 'includes_flight', 'includes_hotel')
+    list_filter = ('package_type', ('destination', AutocompleteFilter), 'departure_date', 'includes_flight', 'includes_hotel')
+    list_select_related = ('destination',)
     search_fields = ('name', 'destination__name', 'destination__city')
+    autocomplete_fields = ('destination',)
     ordering = ('departure_date',)
-    date_hierarchy = 'departure_date'
+
+    def get_queryset(self, request):
+        # Package names include the destination, also in autocomplete results
+        return super().get_queryset(request).select_related('destination')
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = ('id', 'user', 'package', 'travel_date', 'number_of_travelers', 'total_price', 'status', 'booking_date')
-    list_filter = ('status', 'booking_date', 'travel_date', 'package__destination')
+    list_filter = ('status', 'booking_date', 'travel_date', ('package__destination', AutocompleteFilter), ('package', AutocompleteFilter))
+    list_select_related = ('user', 'package__destination')
     search_fields = ('user__username', 'user__email', 'package__name')
-    ordering = ('-booking_date',)
-    date_hierarchy = 'booking_date'
+    autocomplete_fields = ('user', 'package')
+    # Ids follow booking dates, and the primary key needs no extra index to page through
+    ordering = ('-id',)
     readonly_fields = ('booking_date',)
 
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'package', 'seats', 'created_at', 'expires_at')
+    list_select_related = ('user', 'package__destination')
+    search_fields = ('user__username', 'package__name')
+    autocomplete_fields = ('user', 'package')
+    ordering = ('expires_at',)
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number', 'date_of_birth', 'created_at')
     list_filter = ('created_at',)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email', 'phone_number')
+    autocomplete_fields = ('user',)
     ordering = ('user__username',)
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name',)
+    ordering = ('-run_at',)
+    readonly_fields = ('created_at',)
@@ -0,0 +1,23 @@
+"""The bookings routes with the catalog pages served by their async views.
+
+``bookings.middleware.AsyncURLConfMiddleware`` routes ASGI requests here;
+WSGI requests keep using ``bookings.urls``.
+"""
+from django.urls import path
+from . import urls, views
+
+app_name = 'bookings'
+
+ASYNC_VIEWS = {
+    'home': views.ahome,
+    'package_list': views.apackage_list,
+    'package_detail': views.apackage_detail,
+    'destination_list': views.adestination_list,
+    'destination_detail': views.adestination_detail,
+    'package_export': views.apackage_export,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+    for pattern in urls.urlpatterns
+]
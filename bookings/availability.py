@@ -0,0 +1,64 @@
+"""Day-by-day availability of a destination's packages.
+
+A package is available on every day of its trip, from departure to return,
+while it has seats left. ``calendar`` reads every package overlapping the
+range with one query and sweeps the days in order: packages join the active
+set on departure and leave it after their return, so each day's package
+count, seats and lowest price come from the active set instead of a query
+per day.
+"""
+import heapq
+from datetime import timedelta
+
+from .models import Package
+
+# Longest range one request may ask for
+MAX_DAYS = 366
+
+
+def sweep(packages, start, end):
+    """Per-day figures for ``packages``, given as (id, departure, return, seats, price) sorted by departure"""
+    days = []
+    active = []  # (return_date, id, seats), earliest return first
+    prices = []  # (price, return_date), cheapest first; returned trips are dropped lazily
+    seats = 0
+    index = 0
+    day = start
+    while day <= end:
+        departures = []
+        while index < len(packages) and packages[index][1] <= day:
+            package_id, departure, returns, package_seats, price = packages[index]
+            index += 1
+            if returns < day:
+                continue
+            heapq.heappush(active, (returns, package_id, package_seats))
+            heapq.heappush(prices, (price, returns))
+            seats += package_seats
+            if departure == day:
+                departures.append(package_id)
+        while active and active[0][0] < day:
+            seats -= heapq.heappop(active)[2]
+        while prices and prices[0][1] < day:
+            heapq.heappop(prices)
+        days.append({
+            'date': day,
+            'packages': len(active),
+            'seats': seats,
+            'min_price': prices[0][0] if prices else None,
+            'departures': departures,
+        })
+        day += timedelta(days=1)
+    return days
+
+
+def calendar(destination_id, start, end):
+    """Availability of a destination for each day from ``start`` to ``end`` inclusive"""
+    packages = list(
+        Package.objects.filter(
+            destination_id=destination_id, available_seats__gt=0,
+            departure_date__lte=end, return_date__gte=start,
+        )
+        .order_by('departure_date', 'id')
+        .values_list('id', 'departure_date', 'return_date', 'available_seats', 'price')
+    )
+    return sweep(packages, start, end)
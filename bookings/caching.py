@@ -0,0 +1,214 @@
+"""Server-side caching for the anonymous catalog pages.
+
+Page keys carry a catalog stamp: the ``updated_at`` of the most recently
+saved ``Destination`` or ``Package``, bumped by the signal handlers in
+``bookings.signals`` and by ``bookings.services`` when a package sells out or
+comes back on sale. Any catalog edit therefore moves every page to a fresh
+key. Rebuilds are single-flight: one request recomputes an expired page
+while the others serve the stale copy, or wait briefly for the first build.
+"""
+import asyncio
+import hashlib
+import inspect
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+STAMP_KEY = 'catalog:stamp'
+
+# How long an expired entry may still be served while it is being rebuilt
+STALE_SECONDS = 60
+
+
+def catalog_stamp():
+    """Current catalog stamp, initialised on first use"""
+    stamp = cache.get(STAMP_KEY)
+    if stamp is None:
+        cache.add(STAMP_KEY, str(time.time()), None)
+        stamp = cache.get(STAMP_KEY)
+    return stamp
+
+
+def bump_catalog_stamp(updated_at=None):
+    """Move every cached page to a new key after a catalog change"""
+    stamp = updated_at.timestamp() if updated_at else time.time()
+    cache.set(STAMP_KEY, str(stamp), None)
+
+
+def get_or_build(key, build, timeout, cacheable=None, lock_timeout=10, wait=0.05, attempts=100):
+    """Return the cached value for ``key``, letting only one caller run ``build`` at a time"""
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            value = build()
+            if cacheable is None or cacheable(value):
+                cache.set(key, (now + timeout, value), timeout + STALE_SECONDS)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    # Someone else is rebuilding: serve the stale copy, or wait for theirs
+    if entry is not None:
+        return entry[1]
+    for _ in range(attempts):
+        time.sleep(wait)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+    return build()
+
+
+async def aget_or_build(key, build, timeout, cacheable=None, lock_timeout=10, wait=0.05, attempts=100):
+    """``get_or_build`` for coroutines: ``build`` is awaited and waiting does not block the event loop"""
+    entry = await cache.aget(key)
+    now = time.time()
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    lock_key = f'{key}:lock'
+    if await cache.aadd(lock_key, 1, lock_timeout):
+        try:
+            value = await build()
+            if cacheable is None or cacheable(value):
+                await cache.aset(key, (now + timeout, value), timeout + STALE_SECONDS)
+            return value
+        finally:
+            await cache.adelete(lock_key)
+
+    if entry is not None:
+        return entry[1]
+    for _ in range(attempts):
+        await asyncio.sleep(wait)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry[1]
+    return await build()
+
+
+def page_key(view, request, extra):
+    parts = [view.__name__, request.get_full_path(), catalog_stamp(), *extra]
+    return 'page:' + hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def cache_catalog_page(key_func=None):
+    """Cache a view's response for anonymous GET requests.
+
+    ``key_func(request, *args, **kwargs)`` may add extra key parts, such as
+    the ``updated_at`` of the object being shown. Async views are supported
+    and may use an async ``key_func``.
+    """
+    def decorator(view):
+        def cacheable(response):
+            return response.status_code == 200
+
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # The lazy request.user cannot query from async code, so resolve it here
+                request.user = await request.auser()
+                if request.method != 'GET' or request.user.is_authenticated or len(get_messages(request)):
+                    return await view(request, *args, **kwargs)
+                extra = []
+                if key_func is not None:
+                    part = key_func(request, *args, **kwargs)
+                    extra.append(await part if inspect.isawaitable(part) else part)
+                return await aget_or_build(
+                    page_key(view, request, extra),
+                    lambda: view(request, *args, **kwargs),
+                    timeout=getattr(settings, 'CATALOG_CACHE_SECONDS', 60),
+                    cacheable=cacheable,
+                )
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+            extra = [key_func(request, *args, **kwargs)] if key_func is not None else []
+            return get_or_build(
+                page_key(view, request, extra),
+                lambda: view(request, *args, **kwargs),
+                timeout=getattr(settings, 'CATALOG_CACHE_SECONDS', 60),
+                cacheable=cacheable,
+            )
+        return wrapper
+    return decorator
+
+
+def conditional_page(last_modified_func):
+    """Answer conditional GETs for a view before it renders.
+
+    ``last_modified_func(request, *args, **kwargs)`` (sync, or async for an
+    async view) returns when the page content last changed, or None to skip
+    validation, and is kept on ``request.last_modified`` for use as a page
+    cache key part (see ``last_modified_key``). The ETag also covers the viewer, so a logged-in page is never
+    revalidated against an anonymous one, and the full path, so each query
+    string has its own. Only 200 and 304 responses carry validators; error
+    responses are left alone. Anonymous responses are marked public for
+    shared caches, with ``s-maxage`` from ``CATALOG_HTTP_MAX_AGE``.
+    """
+    def decorator(view):
+        def validators(request, last_modified):
+            if last_modified is None or request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return None, None
+            viewer = request.user.pk if request.user.is_authenticated else 'anonymous'
+            etag = hashlib.md5(
+                f'{view.__name__}:{request.get_full_path()}:{last_modified.isoformat()}:{viewer}'.encode()
+            ).hexdigest()
+            return f'"{etag}"', int(last_modified.timestamp())
+
+        def finish(request, response, etag, last_modified):
+            if etag is None or response.status_code not in (200, 304):
+                return response
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=0)
+            else:
+                patch_cache_control(
+                    response, public=True, max_age=0, s_maxage=getattr(settings, 'CATALOG_HTTP_MAX_AGE', 0)
+                )
+            patch_vary_headers(response, ['Cookie'])
+            return response
+
+        if inspect.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                request.user = await request.auser()
+                request.last_modified = await last_modified_func(request, *args, **kwargs)
+                etag, last_modified = validators(request, request.last_modified)
+                response = None
+                if etag is not None:
+                    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return finish(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.last_modified = last_modified_func(request, *args, **kwargs)
+            etag, last_modified = validators(request, request.last_modified)
+            response = None
+            if etag is not None:
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return finish(request, response, etag, last_modified)
+        return wrapper
+    return decorator
+
+
+def last_modified_key(request, *args, **kwargs):
+    """Page cache key part for views under ``conditional_page``, so edits are never served stale"""
+    return request.last_modified
@@ -0,0 +1,74 @@
+"""SQLite tuning for concurrent writers.
+
+Every new SQLite connection runs the ``SQLITE_PRAGMAS`` from settings:
+``busy_timeout`` makes a writer wait for the lock instead of failing at once.
+With ``SQLITE_WAL`` on, the production profile, connections also switch the
+database to WAL journaling, which lets readers carry on while one connection
+writes. WAL is a property of the database file rather than the connection,
+so it is left off unless asked for.
+Write transactions that still lose the race raise "database is locked";
+``retry_on_locked`` runs them again after a short, growing, jittered delay.
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# Added to SQLITE_PRAGMAS when SQLITE_WAL is on
+WAL_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+}
+
+
+def sqlite_pragmas():
+    """The pragmas each new SQLite connection runs"""
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if getattr(settings, 'SQLITE_WAL', False):
+        pragmas.update(WAL_PRAGMAS)
+    return pragmas
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply the pragmas to each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def is_locked(error):
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def retry_on_locked(func):
+    """Retry a write transaction that failed because another connection held the lock.
+
+    Up to ``WRITE_RETRIES`` further attempts are made, waiting
+    ``WRITE_RETRY_BACKOFF_MS`` doubled on each attempt plus jitter. A call
+    inside an outer transaction is not retried, as the outer transaction
+    would have to be repeated as well.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = getattr(settings, 'WRITE_RETRIES', 5)
+        backoff = getattr(settings, 'WRITE_RETRY_BACKOFF_MS', 20) / 1000
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if attempt >= retries or connection.in_atomic_block or not is_locked(error):
+                    raise
+            delay = backoff * 2 ** attempt
+            time.sleep(delay + random.uniform(0, delay))
+            attempt += 1
+    return wrapper
@@ -0,0 +1,158 @@
+"""Facet counts for the package search form.
+
+Each facet is counted with every search filter except its own, so picking
+a price range still lists the other ranges with what they would return.
+Facets whose own filters are unset share one grouped aggregate over the
+filtered catalog: rows are grouped by (package_type, price bucket, duration
+bucket, departure month) and the group counts are summed per facet in
+Python. That is at most a few hundred groups, whatever the catalog size.
+Each facet with a filter of its own set costs one more, smaller aggregate.
+Results are cached per normalized filter set.
+"""
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils.dateformat import format as date_format
+from .models import Package
+from . import caching
+
+# (lower, upper) price bounds; the upper bound is exclusive
+PRICE_BUCKETS = [(0, 500), (500, 1000), (1000, 2000), (2000, 5000), (5000, None)]
+
+# (shortest, longest) trip lengths in days, inclusive
+DURATION_BUCKETS = [(1, 3), (4, 7), (8, 14), (15, None)]
+
+
+def bucket(field, buckets, lookup):
+    """Annotation numbering the bucket each row's ``field`` falls in"""
+    whens = [
+        When(**{f'{field}__{lookup}': upper}, then=Value(index))
+        for index, (lower, upper) in enumerate(buckets)
+        if upper is not None
+    ]
+    return Case(*whens, default=Value(len(buckets) - 1), output_field=IntegerField())
+
+
+# Search form fields each facet filters on
+FACET_FILTERS = {
+    'package_type': ('package_type',),
+    'price_bucket': ('min_price', 'max_price'),
+    'duration_bucket': ('duration_min', 'duration_max'),
+    'month': ('departure_month',),
+}
+
+
+def count_groups(packages, names):
+    """Counts per value of each facet in ``names`` from one grouped aggregate"""
+    annotations = {
+        'price_bucket': bucket('price', PRICE_BUCKETS, 'lt'),
+        'duration_bucket': bucket('duration_days', DURATION_BUCKETS, 'lte'),
+        'month': TruncMonth('departure_date'),
+    }
+    groups = (
+        packages.order_by()
+        .annotate(**{name: annotations[name] for name in names if name in annotations})
+        .values(*names)
+        .annotate(count=Count('id'))
+    )
+    counts = {name: Counter() for name in names}
+    for group in groups:
+        for name, counter in counts.items():
+            counter[group[name]] += group['count']
+    return {name: dict(counter) for name, counter in counts.items()}
+
+
+def count_facets(form, packages):
+    """Counts per package type, price bucket, duration bucket and departure month.
+
+    ``packages`` is the catalog before the form's filters are applied.
+    """
+    if not form.is_valid():
+        return count_groups(packages, list(FACET_FILTERS))
+    own = {
+        name: fields for name, fields in FACET_FILTERS.items()
+        if any(form.cleaned_data.get(field) for field in fields)
+    }
+    shared = [name for name in FACET_FILTERS if name not in own]
+    counts = count_groups(form.filter_queryset(packages), shared) if shared else {}
+    for name, fields in own.items():
+        counts.update(count_groups(form.filter_queryset(packages, exclude=fields), [name]))
+    return counts
+
+
+def filter_key(form):
+    """Stable cache key for the filters a search form was submitted with"""
+    data = form.cleaned_data if form.is_valid() else {}
+    parts = []
+    for name in sorted(data):
+        value = data[name]
+        if value in (None, ''):
+            continue
+        if name == 'destination':
+            value = ' '.join(value.lower().split())
+        parts.append(f'{name}={value}')
+    return hashlib.md5('&'.join(parts).encode()).hexdigest()
+
+
+def cached_facets(form, packages):
+    """Facet counts for the catalog under a form's filters, shared by every search with the same filters"""
+    key = f'facets:{caching.catalog_stamp()}:{filter_key(form)}'
+    return caching.get_or_build(
+        key,
+        lambda: count_facets(form, packages),
+        timeout=getattr(settings, 'CATALOG_CACHE_SECONDS', 60),
+    )
+
+
+def price_label(lower, upper):
+    return f'${lower}+' if upper is None else f'${lower} - ${upper}'
+
+
+def duration_label(shortest, longest):
+    return f'{shortest}+ days' if longest is None else f'{shortest}-{longest} days'
+
+
+def facet_options(counts, params):
+    """Display options with counts and the query string that applies each one"""
+    def query(**changes):
+        updated = params.copy()
+        for name in ('page', 'after', 'before'):
+            updated.pop(name, None)
+        for name, value in changes.items():
+            updated[name] = value
+        return updated.urlencode()
+
+    options = {
+        'package_type': [
+            {'label': label, 'count': counts['package_type'][value], 'query': query(package_type=value)}
+            for value, label in Package.PACKAGE_TYPES
+            if counts['package_type'].get(value)
+        ],
+        'price': [],
+        'duration': [],
+        'month': [],
+    }
+    for index, (lower, upper) in enumerate(PRICE_BUCKETS):
+        if counts['price_bucket'].get(index):
+            options['price'].append({
+                'label': price_label(lower, upper),
+                'count': counts['price_bucket'][index],
+                'query': query(min_price=lower, max_price='' if upper is None else f'{upper - 0.01:.2f}'),
+            })
+    for index, (shortest, longest) in enumerate(DURATION_BUCKETS):
+        if counts['duration_bucket'].get(index):
+            options['duration'].append({
+                'label': duration_label(shortest, longest),
+                'count': counts['duration_bucket'][index],
+                'query': query(duration_min=shortest, duration_max=longest or ''),
+            })
+    for month in sorted(counts['month']):
+        options['month'].append({
+            'label': date_format(month, 'M Y'),
+            'count': counts['month'][month],
+            'query': query(departure_month=month.isoformat()),
+        })
+    return options
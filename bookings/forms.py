@@ -2,8 +2,9 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Booking, UserProfile, Package
+from . import search
 from django.core.exceptions import ValidationError
-from datetime import date
+from datetime import date, timedelta
 
 class UserRegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
@@ -37,6 +38,7 @@ class BookingForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         self.package = kwargs.pop('package', None)
+        self.held_seats = kwargs.pop('held_seats', 0)
         super().__init__(*args, **kwargs)
         if self.package:
             self.fields['travel_date'].help_text = f"Select a date between {self.package.departure_date} and {self.package.return_date}"
@@ -50,8 +52,13 @@ class BookingForm(forms.ModelForm):
     
     def clean_number_of_travelers(self):
         number_of_travelers = self.cleaned_data.get('number_of_travelers')
-        if self.package and number_of_travelers > self.package.available_seats:
-            raise ValidationError(f"Only {self.package.available_seats} seats available for this package")
+        if self.package:
+            if number_of_travelers > self.package.max_travelers:
+                raise ValidationError(f"This package takes at most {self.package.max_travelers} travelers per booking")
+            # Seats the user is already holding count as available to them
+            available = self.package.available_seats + self.held_seats
+            if number_of_travelers > available:
+                raise ValidationError(f"Only {available} seats available for this package")
         return number_of_travelers
 
 class PackageSearchForm(forms.Form):
@@ -60,5 +67,54 @@ class PackageSearchForm(forms.Form):
     min_price = forms.DecimalField(required=False, min_value=0, widget=forms.NumberInput(attrs={'placeholder': 'Min Price'}))
     max_price = forms.DecimalField(required=False, min_value=0, widget=forms.NumberInput(attrs={'placeholder': 'Max Price'}))
     departure_date = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    # Set by the month facet: any date in the month, usually the first
+    departure_month = forms.DateField(required=False, widget=forms.HiddenInput)
     duration_min = forms.IntegerField(required=False, min_value=1, widget=forms.NumberInput(attrs={'placeholder': 'Min Days'}))
     duration_max = forms.IntegerField(required=False, min_value=1, widget=forms.NumberInput(attrs={'placeholder': 'Max Days'}))
+    travelers = forms.IntegerField(required=False, min_value=1, max_value=50, widget=forms.NumberInput(attrs={'placeholder': 'Travelers'}))
+
+    def filter_queryset(self, packages, exclude=()):
+        """Apply the cleaned filters, except the fields named in ``exclude``, to a package queryset"""
+        data = {name: value for name, value in self.cleaned_data.items() if name not in exclude}
+        destination = data.get('destination')
+        package_type = data.get('package_type')
+        min_price = data.get('min_price')
+        max_price = data.get('max_price')
+        departure_date = data.get('departure_date')
+        departure_month = data.get('departure_month')
+        duration_min = data.get('duration_min')
+        duration_max = data.get('duration_max')
+        travelers = data.get('travelers')
+        
+        if destination:
+            # Full-text match, best ranked first
+            packages = search.filter_packages(packages, destination)
+        
+        if package_type:
+            packages = packages.filter(package_type=package_type)
+        
+        if min_price:
+            packages = packages.filter(price__gte=min_price)
+        
+        if max_price:
+            packages = packages.filter(price__lte=max_price)
+        
+        if departure_date:
+            packages = packages.filter(departure_date__gte=departure_date)
+        
+        if departure_month:
+            start = departure_month.replace(day=1)
+            end = (start + timedelta(days=31)).replace(day=1)
+            packages = packages.filter(departure_date__gte=start, departure_date__lt=end)
+        
+        if duration_min:
+            packages = packages.filter(duration_days__gte=duration_min)
+        
+        if duration_max:
+            packages = packages.filter(duration_days__lte=duration_max)
+        
+        if travelers:
+            # Only packages the whole party fits on
+            packages = packages.filter(available_seats__gte=travelers)
+        
+        return packages
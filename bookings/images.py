@@ -0,0 +1,131 @@
+"""Resized derivatives of destination images.
+
+Each uploaded image is cropped and recompressed into a few variants (thumb,
+card, hero) at several widths. A new upload is rendered by a queued task,
+off the request path; the backfill command renders many images at once in a
+process pool it starts and shuts down itself. Files are named
+after a hash of the source bytes, so a URL never changes meaning and can be
+cached forever; replacing an image produces new names. The variant paths are
+stored on ``Destination.image_variants`` and rendered as ``srcset`` by the
+``responsive_image`` template tag.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .models import Destination
+from . import caching
+
+# Variant -> (width / height ratio, widths rendered, ``sizes`` attribute)
+VARIANTS = {
+    'thumb': (1, [60, 120], '60px'),
+    'card': (2, [400, 800], '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw'),
+    'hero': (8 / 3, [800, 1200, 1600], '(min-width: 992px) 66vw, 100vw'),
+}
+
+DERIVATIVE_DIR = 'derivatives'
+
+# What Pillow raises for files it cannot or will not decode: UnidentifiedImageError
+# and truncated files are OSErrors, oversized ones DecompressionBombError, and
+# some corrupt headers ValueError
+UNREADABLE = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def render_variants(data, image_format='WEBP', quality=80):
+    """Render every variant of an image; runs in a task or a pool worker process.
+
+    Returns ``[(variant, width, height, bytes), ...]``. Images are never
+    upscaled, but each variant gets at least its smallest width.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        source = source.convert('RGBA' if source.mode in ('RGBA', 'LA', 'P') and image_format == 'WEBP' else 'RGB')
+        rendered = []
+        for variant, (ratio, widths, _sizes) in VARIANTS.items():
+            for width in [w for w in widths if w <= source.width] or widths[:1]:
+                height = round(width / ratio)
+                resized = ImageOps.fit(source, (width, height), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format, quality=quality, optimize=True)
+                rendered.append((variant, width, height, buffer.getvalue()))
+        return rendered
+
+
+def save_variants(digest, rendered, extension):
+    """Write rendered variants to storage and return the ``image_variants`` mapping"""
+    variants = {}
+    for variant, width, height, data in rendered:
+        name = f'{DERIVATIVE_DIR}/{digest[:2]}/{digest}-{variant}-{width}.{extension}'
+        # The same content always renders to the same name
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+        variants.setdefault(variant, []).append({'path': name, 'width': width, 'height': height})
+    return variants
+
+
+def process_images(destinations, force=False, pool=None):
+    """Generate derivatives for several destinations at once, in ``pool`` if given.
+
+    Returns ``(updated, failed)``: the number of destinations given new
+    variants and the ids of those whose image could not be read.
+    """
+    image_format = getattr(settings, 'IMAGE_FORMAT', 'WEBP')
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    pending, failed = [], []
+    for destination in destinations:
+        if not destination.image:
+            continue
+        if not force and (destination.image_variants or {}).get('source') == destination.image.name:
+            continue
+        try:
+            with destination.image.open('rb') as handle:
+                data = handle.read()
+        except OSError:
+            failed.append(destination.id)
+            continue
+        job = pool.submit(render_variants, data, image_format) if pool is not None else data
+        pending.append((destination, content_hash(data), job))
+
+    updated = 0
+    for destination, digest, job in pending:
+        try:
+            rendered = job.result() if pool is not None else render_variants(job, image_format)
+        except UNREADABLE:
+            failed.append(destination.id)
+            continue
+        variants = save_variants(digest, rendered, extension)
+        variants['source'] = destination.image.name
+        destination.image_variants = variants
+        # A queryset update keeps the post_save handlers from running again
+        Destination.objects.filter(id=destination.id).update(image_variants=variants, updated_at=timezone.now())
+        updated += 1
+    return updated, failed
+
+
+def process_destination(destination_id):
+    """Generate derivatives after a destination's image changes"""
+    destination = Destination.objects.filter(id=destination_id).first()
+    if destination is not None and process_images([destination])[0]:
+        caching.bump_catalog_stamp()
+
+
+def srcset(variants, variant):
+    """``(src, srcset, width, height)`` for one variant, or None if it was not generated"""
+    renditions = (variants or {}).get(variant)
+    if not renditions:
+        return None
+    smallest = renditions[0]
+    return (
+        default_storage.url(smallest['path']),
+        ', '.join(f'{default_storage.url(r["path"])} {r["width"]}w' for r in renditions),
+        smallest['width'],
+        smallest['height'],
+    )
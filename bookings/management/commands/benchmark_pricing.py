@@ -0,0 +1,71 @@
+import statistics
+import time
+from datetime import date
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from bookings import pricing
+from bookings.models import Package
+
+# One rule of each built-in kind, so every quote goes through all of them
+RULES = [
+    pricing.GroupDiscount({4: 0.05, 8: 0.10}),
+    pricing.SeasonalPricing({6: 0.10, 7: 0.15, 8: 0.15, 12: 0.10, 1: -0.05}),
+    pricing.PackageTypeSurcharge({'premium': 0.03, 'luxury': 0.05}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure batch quoting throughput against quoting one package at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=100000, help='Synthetic packages to quote')
+        parser.add_argument('--travelers', type=int, default=4, help='Party size quoted')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed batch quotes')
+        parser.add_argument('--sample', type=int, default=2000, help='Packages quoted one at a time for comparison')
+        parser.add_argument('--catalog', action='store_true', help='Quote the packages in the database instead')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rows = self.catalog() if options['catalog'] else self.synthetic(options['packages'], options['seed'])
+        if not rows:
+            raise CommandError('No packages to quote; load data with "manage.py populate_sample_data" first')
+        travelers = options['travelers']
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            _, totals = pricing.price(pricing.Batch.from_packages(rows, travelers), RULES)
+            timings.append(time.perf_counter() - started)
+        batch_seconds = statistics.median(timings)
+
+        sample = rows[:options['sample']]
+        started = time.perf_counter()
+        single = [pricing.price(pricing.Batch.from_packages([row], travelers), RULES)[1][0] for row in sample]
+        single_seconds = (time.perf_counter() - started) / len(sample)
+        if single != list(totals[:len(sample)]):
+            raise CommandError('Batch and single quotes disagree')
+
+        self.stdout.write(f'{len(rows)} packages, party of {travelers}, {len(RULES)} rules')
+        self.stdout.write(
+            f'batch:  {batch_seconds * 1000:.1f} ms per batch, '
+            f'{len(rows) / batch_seconds:,.0f} quotes/s (median of {options["repeat"]})'
+        )
+        self.stdout.write(
+            f'single: {single_seconds * 1e6:.1f} us per quote, {1 / single_seconds:,.0f} quotes/s '
+            f'({len(sample)} quoted)'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Batch quoting is {single_seconds * len(rows) / batch_seconds:.0f}x faster per package'
+        ))
+
+    def synthetic(self, count, seed):
+        """(price, package_type, departure_date) rows spread over the next year"""
+        rng = np.random.default_rng(seed)
+        prices = np.round(rng.lognormal(7, 0.4, count), 2)
+        types = rng.choice(['basic', 'standard', 'premium', 'luxury'], count, p=[0.4, 0.35, 0.18, 0.07])
+        departures = np.datetime64(date.today()) + rng.integers(0, 365, count)
+        return list(zip(prices.tolist(), types.tolist(), departures.tolist()))
+
+    def catalog(self):
+        return list(Package.objects.values_list(*pricing.FIELDS).iterator(chunk_size=5000))
@@ -0,0 +1,99 @@
+import threading
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from bookings.models import Destination, Package, Booking
+from bookings import services
+
+
+class Command(BaseCommand):
+    help = 'Stress test the seat reservation service with concurrent bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Number of concurrent booking threads')
+        parser.add_argument('--attempts', type=int, default=50, help='Booking attempts per thread')
+        parser.add_argument('--seats', type=int, default=200, help='Seats available on the benchmark package')
+        parser.add_argument('--travelers', type=int, default=1, help='Travelers per booking')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark rows afterwards')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        attempts = options['attempts']
+        seats = options['seats']
+        travelers = options['travelers']
+
+        user, _ = User.objects.get_or_create(username='benchmark_user', defaults={'email': 'bench@example.com'})
+        destination = Destination.objects.create(
+            name='Benchmark Destination', description='Reservation benchmark', country='Nowhere', city='Nowhere'
+        )
+        package = Package.objects.create(
+            destination=destination,
+            name='Benchmark Package',
+            description='Reservation benchmark',
+            duration_days=3,
+            price=100,
+            max_travelers=seats,
+            available_seats=seats,
+            departure_date=date.today() + timedelta(days=30),
+            return_date=date.today() + timedelta(days=33),
+        )
+
+        counts = {'booked': 0, 'sold_out': 0, 'errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def worker():
+            local = {'booked': 0, 'sold_out': 0, 'errors': 0}
+            start.wait()
+            try:
+                for _ in range(attempts):
+                    booking = Booking(
+                        user=user,
+                        package=package,
+                        travel_date=package.departure_date,
+                        number_of_travelers=travelers,
+                        contact_phone='000',
+                        contact_email='bench@example.com',
+                    )
+                    try:
+                        services.create_booking(booking)
+                        local['booked'] += 1
+                    except services.SeatsUnavailable:
+                        local['sold_out'] += 1
+                    except OperationalError:
+                        local['errors'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        self.stdout.write(f'Running {threads} threads x {attempts} attempts against {seats} seats...')
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        began = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - began
+
+        package.refresh_from_db()
+        booked_seats = Booking.objects.filter(package=package).count() * travelers
+        oversold = seats - package.available_seats - booked_seats
+
+        self.stdout.write(f'Bookings created:   {counts["booked"]}')
+        self.stdout.write(f'Sold-out rejects:   {counts["sold_out"]}')
+        self.stdout.write(f'Database errors:    {counts["errors"]}')
+        self.stdout.write(f'Seats remaining:    {package.available_seats}')
+        self.stdout.write(f'Elapsed:            {elapsed:.3f}s')
+        self.stdout.write(f'Throughput:         {counts["booked"] / elapsed:.1f} bookings/sec')
+
+        if not options['keep']:
+            destination.delete()
+
+        if oversold or package.available_seats < 0:
+            raise CommandError(f'Seat accounting mismatch: {oversold} seats unaccounted for')
+        self.stdout.write(self.style.SUCCESS('No oversell detected'))
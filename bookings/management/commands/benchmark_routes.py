@@ -0,0 +1,155 @@
+import json
+import platform
+import random
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from bookings.models import Booking, Destination, Package
+from bookings import urls
+
+# Routes that need the benchmark user to be logged in
+AUTHENTICATED = {'create_booking', 'booking_detail', 'user_dashboard', 'cancel_booking'}
+
+
+def percentile(samples, pct):
+    """``pct``th percentile of ``samples`` by linear interpolation"""
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[pct - 1]
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, query counts and throughput for every route against the current database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per route')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per route beforehand')
+        parser.add_argument('--routes', nargs='+', help='Only benchmark these route names')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON file from an earlier run to report p95 changes against')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in urls.urlpatterns]
+        selected = options['routes'] or names
+        unknown = set(selected) - set(names)
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(sorted(unknown))}')
+
+        self.rng = random.Random(options['seed'])
+        self.load_ids()
+        previous = self.load(options['compare']) if options['compare'] else {}
+
+        results = {}
+        # Routes such as cancel_booking write, so everything is rolled back
+        with transaction.atomic():
+            for name in selected:
+                results[name] = self.measure(name, options['requests'], options['warmup'])
+                self.report(name, results[name], previous.get(name))
+            transaction.set_rollback(True)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'rows': {
+                    'destinations': len(self.destination_ids),
+                    'packages': len(self.package_ids),
+                    'bookings': Booking.objects.count(),
+                },
+                'routes': results,
+            }, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def load_ids(self):
+        self.destination_ids = list(Destination.objects.values_list('id', flat=True))
+        self.package_ids = list(Package.objects.values_list('id', flat=True))
+        # The busiest customer makes the dashboard and booking pages realistic
+        user = (
+            Booking.objects.values('user').annotate(total=Count('id')).order_by('-total')
+            .values_list('user', flat=True).first()
+        )
+        if not self.package_ids or user is None:
+            raise CommandError('Load data first, e.g. "manage.py populate_sample_data --scale 10"')
+        self.user = Booking.objects.filter(user_id=user).select_related('user').first().user
+        self.booking_ids = list(Booking.objects.filter(user=self.user).values_list('id', flat=True))
+        self.pending_ids = list(
+            Booking.objects.filter(user=self.user, status='pending').values_list('id', flat=True)
+        ) or self.booking_ids
+
+    def request_for(self, name):
+        """Return (method, url) for one request to route ``name`` with randomly chosen ids"""
+        choice = self.rng.choice
+        args = {
+            'package_detail': lambda: [choice(self.package_ids)],
+            'create_booking': lambda: [choice(self.package_ids)],
+            'booking_detail': lambda: [choice(self.booking_ids)],
+            'cancel_booking': lambda: [self.pending_ids.pop() if len(self.pending_ids) > 1 else self.pending_ids[0]],
+            'destination_detail': lambda: [choice(self.destination_ids)],
+            'destination_availability': lambda: [choice(self.destination_ids)],
+        }.get(name, lambda: [])()
+        method = 'post' if name == 'cancel_booking' else 'get'
+        return method, reverse(f'bookings:{name}', args=args)
+
+    def measure(self, name, count, warmup):
+        client = Client(SERVER_NAME='localhost')
+        if name in AUTHENTICATED:
+            client.force_login(self.user)
+        for _ in range(warmup):
+            method, url = self.request_for(name)
+            getattr(client, method)(url)
+
+        timings, queries, statuses = [], [], Counter()
+        began = time.perf_counter()
+        for _ in range(count):
+            method, url = self.request_for(name)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, method)(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+        elapsed = time.perf_counter() - began
+
+        return {
+            'requests': count,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'throughput_rps': round(count / elapsed, 1),
+            'status_codes': {str(code): total for code, total in sorted(statuses.items())},
+        }
+
+    def report(self, name, result, previous):
+        line = (
+            f'{name:<20} p50 {result["p50_ms"]:>8.2f}ms  p95 {result["p95_ms"]:>8.2f}ms  '
+            f'p99 {result["p99_ms"]:>8.2f}ms  queries {result["queries_mean"]:>5.1f} (max {result["queries_max"]})  '
+            f'{result["throughput_rps"]:>7.1f} req/s  status {result["status_codes"]}'
+        )
+        if previous:
+            change = (result['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100
+            line += f'  p95 {change:+.0f}%'
+        self.stdout.write(line)
+
+    def load(self, path):
+        try:
+            return json.loads(Path(path).read_text())['routes']
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Cannot read {path}: {error}')
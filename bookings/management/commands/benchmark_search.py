@@ -0,0 +1,95 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from bookings.models import Destination, Package
+from bookings import search
+
+CITIES = [
+    'Paris', 'Tokyo', 'Lisbon', 'Sydney', 'Cairo', 'Lima', 'Oslo', 'Nairobi', 'Hanoi', 'Quito',
+    'Reykjavik', 'Havana', 'Kyoto', 'Porto', 'Seville', 'Zanzibar', 'Cusco', 'Bergen', 'Hoi An', 'Marrakech',
+]
+COUNTRIES = ['France', 'Japan', 'Portugal', 'Australia', 'Egypt', 'Peru', 'Norway', 'Kenya', 'Vietnam', 'Ecuador']
+THEMES = ['Adventure', 'Discovery', 'Escape', 'Explorer', 'Getaway', 'Retreat', 'Journey', 'Experience']
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text search latency with the icontains filter on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=100000, help='Number of synthetic packages')
+        parser.add_argument('--destinations', type=int, default=5000, help='Number of synthetic destinations')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('The full-text search index is not available on this database')
+        rng = random.Random(42)
+        # Everything happens in a transaction that is rolled back at the end
+        with transaction.atomic():
+            self.populate(rng, options['destinations'], options['packages'])
+            terms = ['paris', 'norway', 'kyoto', 'zanzibar retreat', 'lim']
+            self.stdout.write(f'{"query":<20}{"icontains ms":>15}{"fts ms":>10}{"speedup":>10}')
+            for term in terms:
+                legacy = self.measure(lambda: self.legacy_filter(term), options['repeat'])
+                fts = self.measure(lambda: search.filter_packages(self.available(), term), options['repeat'])
+                self.stdout.write(f'{term:<20}{legacy:>15.2f}{fts:>10.2f}{legacy / fts:>9.1f}x')
+            transaction.set_rollback(True)
+
+    def populate(self, rng, destination_count, package_count):
+        self.stdout.write(f'Generating {destination_count} destinations and {package_count} packages...')
+        destinations = Destination.objects.bulk_create([
+            Destination(
+                name=f'{rng.choice(CITIES)} {rng.choice(THEMES)} {i}',
+                description='Synthetic benchmark destination',
+                city=rng.choice(CITIES),
+                country=rng.choice(COUNTRIES),
+            )
+            for i in range(destination_count)
+        ], batch_size=1000)
+        today = date.today()
+        batch = []
+        for i in range(package_count):
+            departure = today + timedelta(days=rng.randint(1, 365))
+            duration = rng.randint(3, 14)
+            batch.append(Package(
+                destination=rng.choice(destinations),
+                name=f'{rng.choice(THEMES)} package {i}',
+                description='Synthetic benchmark package',
+                package_type=rng.choice(['basic', 'premium', 'luxury']),
+                duration_days=duration,
+                price=rng.randint(300, 5000),
+                available_seats=rng.randint(0, 30),
+                departure_date=departure,
+                return_date=departure + timedelta(days=duration),
+            ))
+            if len(batch) == 5000:
+                Package.objects.bulk_create(batch)
+                batch = []
+        Package.objects.bulk_create(batch)
+        search.rebuild()
+
+    def available(self):
+        return Package.objects.filter(available_seats__gt=0)
+
+    def legacy_filter(self, term):
+        return self.available().filter(
+            Q(destination__name__icontains=term) |
+            Q(destination__city__icontains=term) |
+            Q(destination__country__icontains=term)
+        )
+
+    def measure(self, build, repeat):
+        """Median milliseconds to fetch the first page and the total count"""
+        timings = []
+        for _ in range(repeat):
+            began = time.perf_counter()
+            queryset = build()
+            list(queryset[:12])
+            queryset.count()
+            timings.append((time.perf_counter() - began) * 1000)
+        return statistics.median(timings)
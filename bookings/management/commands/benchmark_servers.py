@@ -0,0 +1,142 @@
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+from bookings.models import Destination, Package
+from .benchmark_routes import percentile
+
+ROUTES = ['home', 'package_list', 'package_detail', 'destination_list', 'destination_detail']
+
+
+class Command(BaseCommand):
+    help = 'Compare requests/sec of the WSGI and ASGI applications on the catalog routes at high concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per server mode')
+        parser.add_argument('--concurrency', type=int, default=64, help='Requests in flight at once')
+        parser.add_argument('--routes', nargs='+', default=ROUTES, choices=ROUTES)
+        parser.add_argument(
+            '--cache-seconds', type=int, default=0,
+            help='CATALOG_CACHE_SECONDS during the run (0 renders every page)',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        package_ids = list(Package.objects.values_list('id', flat=True))
+        destination_ids = list(Destination.objects.values_list('id', flat=True))
+        if not package_ids or not destination_ids:
+            raise CommandError('Load data first, e.g. "manage.py populate_sample_data --scale 10"')
+        # Both servers are sent the same request sequence
+        rng = random.Random(options['seed'])
+        paths = [self.path(rng.choice(options['routes']), rng, package_ids, destination_ids) for _ in range(options['requests'])]
+        connections.close_all()
+
+        results = {}
+        with override_settings(CATALOG_CACHE_SECONDS=options['cache_seconds']):
+            results['WSGI, sync views'] = self.run_wsgi(paths, options['concurrency'])
+            results['ASGI, async views'] = asyncio.run(self.run_asgi(paths, options['concurrency']))
+            with override_settings(ASYNC_URLCONF=None):
+                results['ASGI, sync views'] = asyncio.run(self.run_asgi(paths, options['concurrency']))
+        self.stdout.write(f'{len(paths)} requests, concurrency {options["concurrency"]}, routes {", ".join(options["routes"])}')
+        baseline = results['WSGI, sync views']['throughput_rps']
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<20}{result["throughput_rps"]:>8.1f} req/s ({result["throughput_rps"] / baseline:.2f}x)  '
+                f'p50 {result["p50_ms"]:>8.2f}ms  p95 {result["p95_ms"]:>8.2f}ms  p99 {result["p99_ms"]:>8.2f}ms  '
+                f'status {result["status_codes"]}'
+            )
+
+    def path(self, route, rng, package_ids, destination_ids):
+        if route == 'package_detail':
+            return reverse('bookings:package_detail', args=[rng.choice(package_ids)])
+        if route == 'destination_detail':
+            return reverse('bookings:destination_detail', args=[rng.choice(destination_ids)])
+        if route == 'package_list' and rng.random() < 0.3:
+            return reverse('bookings:package_list') + '?package_type=' + rng.choice(['basic', 'premium', 'luxury'])
+        return reverse(f'bookings:{route}')
+
+    def summarize(self, timings, statuses, elapsed):
+        return {
+            'throughput_rps': len(timings) / elapsed,
+            'p50_ms': percentile(timings, 50),
+            'p95_ms': percentile(timings, 95),
+            'p99_ms': percentile(timings, 99),
+            'mean_ms': statistics.fmean(timings),
+            'status_codes': dict(sorted(statuses.items())),
+        }
+
+    def run_wsgi(self, paths, concurrency):
+        """A threaded WSGI server: one worker thread per request in flight"""
+        application = get_wsgi_application()
+        statuses = Counter()
+
+        def request(path):
+            path, _, query = path.partition('?')
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+                'wsgi.run_once': False, 'wsgi.version': (1, 0),
+            }
+            status = []
+            start = time.perf_counter()
+            response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            statuses[int(status[0].split()[0])] += 1
+            return (time.perf_counter() - start) * 1000
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(request, paths))
+        return self.summarize(timings, statuses, time.perf_counter() - began)
+
+    async def run_asgi(self, paths, concurrency):
+        """An ASGI server: every request is a task on one event loop"""
+        application = get_asgi_application()
+        statuses = Counter()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def request(path):
+            path, _, query = path.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+                'root_path': '', 'headers': [(b'host', b'localhost')],
+                'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+            }
+            body_sent = False
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client stays connected until the response is complete
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses[message['status']] += 1
+
+            async with slots:
+                start = time.perf_counter()
+                await application(scope, receive, send)
+                return (time.perf_counter() - start) * 1000
+
+        began = time.perf_counter()
+        timings = await asyncio.gather(*(request(path) for path in paths))
+        return self.summarize(timings, statuses, time.perf_counter() - began)
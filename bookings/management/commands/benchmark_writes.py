@@ -0,0 +1,139 @@
+import logging
+import multiprocessing
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from bookings.database import WAL_PRAGMAS, sqlite_pragmas
+from bookings.models import Destination, Package
+
+# How the database was configured before the production profile
+BASELINE = {
+    'journal_mode': 'delete',
+    'options': {},
+    'conn_max_age': 0,
+    'settings': {'SQLITE_PRAGMAS': {}, 'SQLITE_WAL': False, 'WRITE_RETRIES': 0},
+}
+
+
+def production():
+    default = settings.DATABASES['default']
+    return {
+        'journal_mode': WAL_PRAGMAS['journal_mode'],
+        'options': default.get('OPTIONS', {}),
+        'conn_max_age': default.get('CONN_MAX_AGE', 0),
+        'settings': {'SQLITE_WAL': True},
+    }
+
+
+def write_worker(profile, user_id, package_id, bookings, barrier, results):
+    """Post ``bookings`` booking forms from one process and report what happened"""
+    connection.settings_dict.update(OPTIONS=profile['options'], CONN_MAX_AGE=profile['conn_max_age'])
+    # Lock errors are counted rather than logged as server errors
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    with override_settings(**profile['settings']):
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(User.objects.get(id=user_id))
+        url = reverse('bookings:create_booking', args=[package_id])
+        data = {
+            'travel_date': date.today() + timedelta(days=30),
+            'number_of_travelers': 1,
+            'contact_phone': '000',
+            'contact_email': 'bench@example.com',
+        }
+        counts = {'booked': 0, 'rejected': 0, 'errors': 0}
+        close_old_connections()
+        barrier.wait()
+        started = time.time()
+        for _ in range(bookings):
+            try:
+                response = client.post(url, data)
+                counts['booked' if response.status_code == 302 else 'rejected'] += 1
+            except OperationalError:
+                counts['errors'] += 1
+            # The test client leaves connections open; end the "request" as a server would
+            close_old_connections()
+        results.put((started, time.time(), counts))
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Compare booking throughput and lock errors with several processes posting to create_booking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8, help='Concurrent writer processes')
+        parser.add_argument('--bookings', type=int, default=50, help='Bookings posted per process')
+        parser.add_argument(
+            '--profile', choices=['baseline', 'production', 'both'], default='both',
+            help='Database profile to run: the old defaults, the production profile or both',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark measures SQLite locking')
+        processes, bookings = options['processes'], options['bookings']
+        profiles = {'baseline': BASELINE, 'production': production()}
+        if options['profile'] != 'both':
+            profiles = {options['profile']: profiles[options['profile']]}
+
+        destination = Destination.objects.create(
+            name='Write Benchmark', description='Write benchmark', country='Nowhere', city='Nowhere'
+        )
+        seats = processes * bookings * len(profiles)
+        package = Package.objects.create(
+            destination=destination, name='Write Benchmark', description='Write benchmark',
+            duration_days=3, price=100, max_travelers=seats, available_seats=seats,
+            departure_date=date.today() + timedelta(days=30), return_date=date.today() + timedelta(days=33),
+        )
+        users = [
+            User.objects.get_or_create(username=f'write_benchmark_{index}')[0]
+            for index in range(processes)
+        ]
+        try:
+            self.stdout.write(f'{processes} processes x {bookings} bookings')
+            for name, profile in profiles.items():
+                result = self.run(profile, users, package, bookings)
+                attempts = sum(result[key] for key in ('booked', 'rejected', 'errors'))
+                self.stdout.write(
+                    f'{name:<12}{result["booked"] / result["elapsed"]:>8.1f} bookings/s  '
+                    f'errors {result["errors"]}/{attempts} ({result["errors"] / attempts:.1%})  '
+                    f'rejected {result["rejected"]}  elapsed {result["elapsed"]:.2f}s'
+                )
+        finally:
+            # Leave the database in the journal mode its own settings ask for
+            self.set_journal_mode(sqlite_pragmas().get('journal_mode', 'delete'))
+            destination.delete()
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def set_journal_mode(self, mode):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {mode}')
+
+    def run(self, profile, users, package, bookings):
+        self.set_journal_mode(profile['journal_mode'])
+        # Forked processes must open their own connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(len(users))
+        results = context.Queue()
+        workers = [
+            context.Process(target=write_worker, args=(profile, user.id, package.id, bookings, barrier, results))
+            for user in users
+        ]
+        for worker in workers:
+            worker.start()
+        reports = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        totals = {'booked': 0, 'rejected': 0, 'errors': 0}
+        for _, _, counts in reports:
+            for key, value in counts.items():
+                totals[key] += value
+        totals['elapsed'] = max(end for _, end, _ in reports) - min(start for start, _, _ in reports)
+        return totals
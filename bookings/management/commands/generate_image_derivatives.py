@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from bookings.models import Destination
+from bookings import caching, images
+from .import_catalog import batched
+
+
+class Command(BaseCommand):
+    help = 'Generate resized image derivatives for destinations that are missing them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Images rendered in parallel per batch')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that are already up to date')
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        destinations = Destination.objects.exclude(image='').exclude(image__isnull=True).order_by('id')
+        updated, failed = 0, []
+        with ProcessPoolExecutor(max_workers=getattr(settings, 'IMAGE_WORKERS', None)) as pool:
+            for batch in batched(destinations.iterator(chunk_size=options['batch_size']), options['batch_size']):
+                batch_updated, batch_failed = images.process_images(batch, force=options['force'], pool=pool)
+                updated += batch_updated
+                failed += batch_failed
+        if updated:
+            caching.bump_catalog_stamp()
+        for destination_id in failed:
+            self.stderr.write(f'Could not read the image of destination {destination_id}')
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated derivatives for {updated} destinations in {elapsed:.2f}s '
+            f'({updated / elapsed if elapsed else 0:.1f} images/sec), {len(failed)} failed'
+        ))
@@ -0,0 +1,181 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from bookings.models import Destination, Package
+from bookings import caching, search, summaries, tasks
+
+DESTINATION_FIELDS = ('name', 'description', 'country', 'city')
+PACKAGE_FIELDS = (
+    'name', 'description', 'package_type', 'duration_days', 'price', 'max_travelers', 'available_seats',
+    'departure_date', 'return_date', 'includes_flight', 'includes_hotel', 'includes_meals', 'includes_transport',
+)
+
+MAX_WARNINGS = 20
+
+# bulk_update builds a CASE per column whose cost grows with the batch, so
+# updates are written in smaller statements than inserts
+UPDATE_BATCH_SIZE = 200
+
+
+def read_rows(path):
+    """Yield one dict per row of a .csv or .jsonl file without loading it whole"""
+    path = Path(path)
+    with path.open(newline='', encoding='utf-8') as handle:
+        if path.suffix == '.csv':
+            yield from csv.DictReader(handle)
+        elif path.suffix in ('.jsonl', '.ndjson'):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise CommandError(f'Unsupported file type: {path.name} (expected .csv or .jsonl)')
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def convert(model, fields, row, optional=()):
+    """Build field values for ``model`` from a raw row, using each field's own parsing"""
+    values = {}
+    for name in fields:
+        if name not in row:
+            field = model._meta.get_field(name)
+            if field.has_default() or name in optional:
+                continue
+            raise ValidationError(f'missing {name}')
+        field = model._meta.get_field(name)
+        raw = row[name]
+        if isinstance(raw, str) and field.get_internal_type() == 'BooleanField':
+            raw = raw.strip().lower() in ('1', 't', 'true', 'y', 'yes')
+        values[name] = field.to_python(None if raw == '' and field.null else raw)
+    return values
+
+
+class Command(BaseCommand):
+    help = 'Bulk import destinations and packages from CSV or JSONL files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--destinations', help='CSV/JSONL file of destinations (name, description, country, city)')
+        parser.add_argument(
+            '--packages',
+            help='CSV/JSONL file of packages; the "destination" column names an existing or imported destination',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows written per statement')
+
+    def handle(self, *args, **options):
+        if not options['destinations'] and not options['packages']:
+            raise CommandError('Pass --destinations and/or --packages')
+        batch_size = options['batch_size']
+        self.warnings = 0
+        # Destination name -> id, the only catalog state kept in memory
+        self.destination_ids = dict(Destination.objects.values_list('name', 'id'))
+
+        if options['destinations']:
+            self.run('destinations', options['destinations'], batch_size, self.import_destinations)
+        if options['packages']:
+            self.run('packages', options['packages'], batch_size, self.import_packages)
+
+        # Bulk writes bypass the model signals, so refresh derived data once
+        search.rebuild()
+        summaries.rebuild()
+        # The rebuild is quadratic in the catalog size, so a worker runs it; it also
+        # schedules the periodic rebuild that keeps the lists current
+        tasks.schedule_recommendations_rebuild()
+        caching.bump_catalog_stamp()
+
+    def run(self, label, path, batch_size, import_batch):
+        self.stdout.write(f'Importing {label} from {path}...')
+        began = time.perf_counter()
+        written = skipped = 0
+        for batch in batched(read_rows(path), batch_size):
+            with transaction.atomic():
+                batch_written, batch_skipped = import_batch(batch)
+            written += batch_written
+            skipped += batch_skipped
+            rate = (written + skipped) / (time.perf_counter() - began)
+            self.stdout.write(f'  {written + skipped} rows ({rate:.0f} rows/sec)')
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {written} written, {skipped} skipped '
+            f'in {elapsed:.2f}s ({(written + skipped) / elapsed if elapsed else 0:.0f} rows/sec)'
+        ))
+
+    def warn(self, message):
+        """Report the first few bad rows without flooding the output"""
+        self.warnings += 1
+        if self.warnings <= MAX_WARNINGS:
+            self.stderr.write(message)
+        elif self.warnings == MAX_WARNINGS + 1:
+            self.stderr.write('Further skipped rows are counted but not listed')
+
+    def import_destinations(self, rows):
+        new, existing, skipped = {}, {}, 0
+        now = timezone.now()
+        for row in rows:
+            try:
+                values = convert(Destination, DESTINATION_FIELDS, row)
+            except ValidationError as error:
+                skipped += 1
+                self.warn(f'Skipping destination {row.get("name")!r}: {error.messages[0]}')
+                continue
+            destination = Destination(updated_at=now, **values)
+            if values['name'] in self.destination_ids:
+                destination.id = self.destination_ids[values['name']]
+                existing[destination.id] = destination
+            else:
+                new[values['name']] = destination
+        Destination.objects.bulk_create(new.values())
+        Destination.objects.bulk_update(
+            existing.values(), ['description', 'country', 'city', 'updated_at'], batch_size=UPDATE_BATCH_SIZE
+        )
+        for destination in new.values():
+            self.destination_ids[destination.name] = destination.id
+        return len(new) + len(existing), skipped
+
+    def import_packages(self, rows):
+        packages, skipped = {}, 0
+        now = timezone.now()
+        for row in rows:
+            destination_id = self.destination_ids.get(row.get('destination'))
+            try:
+                if destination_id is None:
+                    raise ValidationError(f'unknown destination {row.get("destination")!r}')
+                values = convert(Package, PACKAGE_FIELDS, row, optional=('available_seats',))
+            except ValidationError as error:
+                skipped += 1
+                self.warn(f'Skipping package {row.get("name")!r}: {error.messages[0]}')
+                continue
+            # New packages start fully available, existing ones keep their seats
+            columns = frozenset(values)
+            values.setdefault('available_seats', values.get('max_travelers', 10))
+            key = (destination_id, values['name'], values['departure_date'])
+            packages[key] = (columns, Package(destination_id=destination_id, updated_at=now, **values))
+
+        # Upsert on the (destination, name, departure_date) natural key, only
+        # overwriting the columns each row provides: rows are written in groups
+        # with the same columns, so a row without seats never resets another's
+        groups = defaultdict(list)
+        for columns, package in packages.values():
+            groups[columns].append(package)
+        for columns, group in groups.items():
+            update_fields = [
+                name for name in PACKAGE_FIELDS if name in columns and name not in ('name', 'departure_date')
+            ]
+            Package.objects.bulk_create(
+                group,
+                update_conflicts=True,
+                unique_fields=['destination', 'name', 'departure_date'],
+                update_fields=update_fields + ['updated_at'],
+            )
+        return len(packages), skipped
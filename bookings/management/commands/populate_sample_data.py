@@ -1,12 +1,63 @@
+import random
+import time
+from decimal import Decimal
+from itertools import accumulate
+
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from bookings.models import Destination, Package
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from bookings.models import Destination, Package, Booking
+from bookings import caching, search, summaries, tasks
 from datetime import date, timedelta
 
+# Rows generated per unit of --scale
+SCALE_DESTINATIONS = 50
+SCALE_PACKAGES = 1000
+SCALE_USERS = 200
+SCALE_BOOKINGS = 2000
+
+CITIES = [
+    ('Paris', 'France'), ('Nice', 'France'), ('Tokyo', 'Japan'), ('Kyoto', 'Japan'), ('New York', 'USA'),
+    ('San Francisco', 'USA'), ('Bali', 'Indonesia'), ('London', 'UK'), ('Edinburgh', 'UK'),
+    ('Sydney', 'Australia'), ('Cairns', 'Australia'), ('Rome', 'Italy'), ('Florence', 'Italy'),
+    ('Barcelona', 'Spain'), ('Lisbon', 'Portugal'), ('Reykjavik', 'Iceland'), ('Cape Town', 'South Africa'),
+    ('Marrakech', 'Morocco'), ('Cusco', 'Peru'), ('Hanoi', 'Vietnam'), ('Bangkok', 'Thailand'),
+    ('Queenstown', 'New Zealand'), ('Banff', 'Canada'), ('Havana', 'Cuba'),
+]
+THEMES = ['Adventure', 'Discovery', 'Escape', 'Explorer', 'Getaway', 'Retreat', 'Journey', 'Experience', 'Highlights']
+
+# package_type -> (share of packages, median price per person)
+PACKAGE_MIX = {'basic': (0.55, 900), 'premium': (0.33, 1700), 'luxury': (0.12, 3800)}
+
+# Booking statuses for trips still to come and trips that have returned
+UPCOMING_STATUSES = (['confirmed'] * 65) + (['pending'] * 22) + (['cancelled'] * 13)
+FINISHED_STATUSES = (['completed'] * 80) + (['cancelled'] * 12) + (['expired'] * 8)
+
+# Party size -> share of bookings
+PARTY_SIZES = {1: 25, 2: 45, 3: 12, 4: 13, 6: 5}
+
 class Command(BaseCommand):
     help = 'Populate the database with sample destinations and packages'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, default=0,
+            help=(
+                f'Generate a synthetic catalog instead: {SCALE_DESTINATIONS} destinations, {SCALE_PACKAGES} packages, '
+                f'{SCALE_USERS} users and {SCALE_BOOKINGS} bookings per unit'
+            ),
+        )
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for --scale')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows written per statement with --scale')
+
     def handle(self, *args, **options):
+        if options['scale']:
+            self.generate(options['scale'], random.Random(options['seed']), options['batch_size'])
+            return
+        
         self.stdout.write('Creating sample data...')
         
         # Create sample destinations
@@ -180,3 +231,132 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Successfully created sample data!')
         )
+
+    def generate(self, scale, rng, batch_size):
+        """Bulk create a synthetic catalog with realistic skew in prices, dates and demand"""
+        began = time.perf_counter()
+        run = int(time.time())
+        today = date.today()
+
+        destination_count = SCALE_DESTINATIONS * scale
+        self.stdout.write(f'Creating {destination_count} destinations...')
+        destinations = Destination.objects.bulk_create([
+            Destination(
+                name=f'{city} {rng.choice(THEMES)} {run}-{i}',
+                description=f'Discover {city}, {country} with local guides and hand-picked stays.',
+                city=city,
+                country=country,
+            )
+            for i, (city, country) in enumerate(rng.choice(CITIES) for _ in range(destination_count))
+        ], batch_size=batch_size)
+        # A few destinations are far more popular than the rest; cumulative
+        # weights spare rng.choices from summing every weight on each draw
+        destination_weights = list(accumulate(1 / (rank + 1) for rank in range(len(destinations))))
+
+        package_count = SCALE_PACKAGES * scale
+        self.stdout.write(f'Creating {package_count} packages...')
+        types = list(PACKAGE_MIX)
+        type_weights = list(accumulate(share for share, _ in PACKAGE_MIX.values()))
+        packages = []
+        for start in range(0, package_count, batch_size):
+            count = min(batch_size, package_count - start)
+            batch = []
+            for i, package_type, destination in zip(
+                range(start, start + count),
+                rng.choices(types, cum_weights=type_weights, k=count),
+                rng.choices(destinations, cum_weights=destination_weights, k=count),
+            ):
+                duration = min(21, max(2, int(rng.gauss(7, 3))))
+                # Departures cluster in the summer and winter holidays
+                offset = int(rng.choice([rng.uniform(7, 365), rng.gauss(200, 25), rng.gauss(75, 15)]))
+                departure = today + timedelta(days=max(1, offset))
+                max_travelers = rng.choice([8, 10, 12, 16, 20, 30, 40])
+                price = PACKAGE_MIX[package_type][1] * rng.lognormvariate(0, 0.35) * (duration / 7) ** 0.5
+                batch.append(Package(
+                    destination=destination,
+                    name=f'{rng.choice(THEMES)} {package_type.title()} {i}',
+                    description='Flights, hotels and guided tours for a stress-free trip.',
+                    package_type=package_type,
+                    duration_days=duration,
+                    price=Decimal(price).quantize(Decimal('0.01')),
+                    max_travelers=max_travelers,
+                    available_seats=max_travelers,
+                    departure_date=departure,
+                    return_date=departure + timedelta(days=duration),
+                    includes_flight=rng.random() < 0.85,
+                    includes_hotel=rng.random() < 0.95,
+                    includes_meals=package_type != 'basic' or rng.random() < 0.2,
+                    includes_transport=rng.random() < 0.7,
+                ))
+            packages.extend(Package.objects.bulk_create(batch))
+
+        user_count = SCALE_USERS * scale
+        self.stdout.write(f'Creating {user_count} users (password "password")...')
+        password = make_password('password')
+        users = User.objects.bulk_create([
+            User(username=f'traveler{run}-{i}', email=f'traveler{run}-{i}@example.com', password=password)
+            for i in range(user_count)
+        ], batch_size=batch_size)
+        # A small share of accounts (agents) make most of the bookings
+        user_weights = list(accumulate(20 if i % 50 == 0 else 1 for i in range(len(users))))
+
+        booking_count = SCALE_BOOKINGS * scale
+        self.stdout.write(f'Creating {booking_count} bookings...')
+        package_weights = list(accumulate(1 / (rank + 1) ** 0.8 for rank in range(len(packages))))
+        party_sizes = list(PARTY_SIZES)
+        party_weights = list(accumulate(PARTY_SIZES.values()))
+        seats = {package.id: package.max_travelers for package in packages}
+        created = skipped = 0
+        with transaction.atomic():
+            while created < booking_count:
+                count = min(batch_size, booking_count - created)
+                batch = []
+                for package, travelers, user in zip(
+                    rng.choices(packages, cum_weights=package_weights, k=count),
+                    rng.choices(party_sizes, cum_weights=party_weights, k=count),
+                    rng.choices(users, cum_weights=user_weights, k=count),
+                ):
+                    travelers = min(travelers, package.max_travelers)
+                    status = rng.choice(FINISHED_STATUSES if package.return_date < today else UPCOMING_STATUSES)
+                    if status not in ('cancelled', 'expired'):
+                        if travelers > seats[package.id]:
+                            # Sold out: leave the booking out rather than overbook the package
+                            skipped += 1
+                            continue
+                        seats[package.id] -= travelers
+                    batch.append(Booking(
+                        user=user,
+                        package=package,
+                        travel_date=package.departure_date,
+                        number_of_travelers=travelers,
+                        total_price=package.price * travelers,
+                        status=status,
+                        contact_phone='555-0100',
+                        contact_email=user.email,
+                    ))
+                if not batch:
+                    # Every package drawn was full
+                    break
+                Booking.objects.bulk_create(batch)
+                created += len(batch)
+
+            # Take booked seats off each generated package in one statement
+            booked = (
+                Booking.objects.filter(package=OuterRef('pk')).exclude(status__in=['cancelled', 'expired'])
+                .values('package').annotate(total=Sum('number_of_travelers')).values('total')
+            )
+            Package.objects.filter(id__in=[package.id for package in packages]).update(
+                available_seats=F('max_travelers') - Coalesce(Subquery(booked), Value(0))
+            )
+        self.stdout.write(f'Created {created} bookings, skipped {skipped} for sold-out packages')
+
+        self.stdout.write('Refreshing search index and destination summaries, queueing recommendations...')
+        search.rebuild()
+        summaries.rebuild()
+        # The rebuild is quadratic in the catalog size, so a worker runs it; it also
+        # schedules the periodic rebuild that keeps the lists current
+        tasks.schedule_recommendations_rebuild()
+        caching.bump_catalog_stamp()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated scale {scale} dataset in {time.perf_counter() - began:.1f}s'
+        ))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings import summaries
+
+
+class Command(BaseCommand):
+    help = 'Recompute the availability and price summary of every destination'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Summaries written per statement')
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        written = summaries.rebuild(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} destination summaries in {elapsed:.3f}s'))
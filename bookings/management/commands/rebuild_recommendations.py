@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings import recommendations
+from bookings.models import SimilarPackage
+
+
+class Command(BaseCommand):
+    help = 'Recompute the similar-package recommendations of every upcoming package'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--block-mb', type=int, default=None,
+            help='Memory for comparing a block of packages with the catalog (default RECOMMENDATIONS_BLOCK_MB)',
+        )
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        written = recommendations.rebuild(memory_mb=options['block_mb'])
+        elapsed = time.perf_counter() - began
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt recommendations for {written} packages ({SimilarPackage.objects.count()} neighbours) '
+            f'in {elapsed:.3f}s'
+        ))
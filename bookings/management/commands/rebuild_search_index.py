@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from bookings import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the package full-text search index'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('The full-text search index is not available on this database')
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
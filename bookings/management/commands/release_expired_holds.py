@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings import services
+
+
+class Command(BaseCommand):
+    help = 'Release expired seat holds and return their seats to packages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Holds released per transaction')
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        released = services.release_expired_holds(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - began
+        self.stdout.write(
+            self.style.SUCCESS(f'Released {released} expired hold(s) in {elapsed:.3f}s')
+        )
@@ -0,0 +1,36 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from bookings import queue, tasks  # noqa: F401 - registers the tasks
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks on a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds an idle worker waits before checking again')
+        parser.add_argument('--burst', action='store_true', help='Exit once no task is due')
+        parser.add_argument('--stats', action='store_true', help='Print queue depth and latency and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue.stats(), indent=2))
+            return
+
+        # The workers requeue stale tasks themselves, on start and once a lease
+        purged = queue.purge()
+        if purged:
+            self.stdout.write(f'Purged {purged} finished task(s)')
+        self.stdout.write(f'Starting {options["workers"]} worker(s)')
+        threads, stop = queue.start_workers(options['workers'], options['poll'], options['burst'])
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the tasks in progress...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(json.dumps(queue.stats())))
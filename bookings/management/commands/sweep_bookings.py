@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings import services
+
+
+class Command(BaseCommand):
+    help = 'Complete bookings whose trip has ended and expire stale pending bookings, returning their seats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bookings updated per transaction')
+
+    def handle(self, *args, **options):
+        for label, sweep in (
+            ('Completed', services.complete_finished_bookings),
+            ('Expired', services.expire_pending_bookings),
+        ):
+            began = time.perf_counter()
+            rows = sweep(batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - began
+            self.stdout.write(self.style.SUCCESS(
+                f'{label} {rows} booking(s) in {elapsed:.3f}s ({rows / elapsed:.0f} rows/sec)'
+            ))
@@ -0,0 +1,26 @@
+"""Serve ASGI requests from the async catalog views."""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+
+class AsyncURLConfMiddleware:
+    """Route ASGI requests through ``ASYNC_URLCONF``.
+
+    Under WSGI an async view runs in a fresh event loop per request, which
+    costs more than the sync view it replaces, so WSGI requests keep the
+    default URLconf.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.urlconf = getattr(settings, 'ASYNC_URLCONF', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = self.urlconf
+        return self.get_response(request)
@@ -0,0 +1,49 @@
+from django.db import migrations, OperationalError
+
+# The FTS5 table as bookings.search defined it when this migration was
+# written, kept here so later changes to that module cannot alter history
+CREATE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS bookings_package_fts USING fts5(
+    name, description, destination_name, city, country,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+DROP_SQL = "DROP TABLE IF EXISTS bookings_package_fts"
+
+INDEX_SQL = """
+INSERT INTO bookings_package_fts (rowid, name, description, destination_name, city, country)
+SELECT p.id, p.name, p.description, d.name, d.city, d.country
+FROM bookings_package p
+JOIN bookings_destination d ON d.id = p.destination_id
+"""
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(CREATE_SQL)
+    except OperationalError:
+        # SQLite built without FTS5; search falls back to icontains
+        return
+    schema_editor.execute(INDEX_SQL)
+    # Searches on this connection look for the table again
+    schema_editor.connection.fts_available = None
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(DROP_SQL)
+    schema_editor.connection.fts_available = None
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_seathold'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def populate_summaries(apps, schema_editor):
+    Destination = apps.get_model('bookings', 'Destination')
+    DestinationSummary = apps.get_model('bookings', 'DestinationSummary')
+    Package = apps.get_model('bookings', 'Package')
+    rows = (
+        Package.objects.filter(available_seats__gt=0)
+        .values('destination_id')
+        .order_by('destination_id')
+        .annotate(
+            min_price=Min('price'),
+            available_packages=Count('id'),
+            available_seats=Sum('available_seats'),
+            next_departure=Min('departure_date'),
+        )
+    )
+    figures = {row.pop('destination_id'): row for row in rows}
+    DestinationSummary.objects.bulk_create(
+        DestinationSummary(destination_id=destination_id, **figures.get(destination_id, {}))
+        for destination_id in Destination.objects.values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_package_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DestinationSummary',
+            fields=[
+                ('destination', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='bookings.destination')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('available_packages', models.PositiveIntegerField(default=0)),
+                ('available_seats', models.PositiveIntegerField(default=0)),
+                ('next_departure', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
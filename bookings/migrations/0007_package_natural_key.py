@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicates(apps, schema_editor):
+    """Number repeated names per destination and departure date, so the natural key can be unique.
+
+    Renaming keeps every package with its bookings and seat holds, which a
+    merge would have to move.
+    """
+    Package = apps.get_model('bookings', 'Package')
+    max_length = Package._meta.get_field('name').max_length
+    duplicates = (
+        Package.objects.values('destination_id', 'name', 'departure_date')
+        .annotate(copies=Count('id')).filter(copies__gt=1).order_by()
+    )
+    for key in list(duplicates):
+        del key['copies']
+        ids = list(Package.objects.filter(**key).order_by('id').values_list('id', flat=True))
+        copy = 1
+        for package_id in ids[1:]:
+            while True:
+                copy += 1
+                suffix = f' ({copy})'
+                name = key['name'][:max_length - len(suffix)] + suffix
+                if not Package.objects.filter(**{**key, 'name': name}).exists():
+                    break
+            Package.objects.filter(id=package_id).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='package',
+            constraint=models.UniqueConstraint(fields=('destination', 'name', 'departure_date'), name='package_natural_key'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_booking_expired_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarPackage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('distance', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_packages', to='bookings.package')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='bookings.package')),
+            ],
+            options={
+                'ordering': ['package', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('package', 'rank'), name='similar_package_rank')],
+            },
+        ),
+    ]
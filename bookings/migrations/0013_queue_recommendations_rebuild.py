@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def queue_rebuild(apps, schema_editor):
+    """Fill the new similar-package lists in the background; the rebuild then repeats itself"""
+    Package = apps.get_model('bookings', 'Package')
+    Task = apps.get_model('bookings', 'Task')
+    if Package.objects.exists():
+        Task.objects.create(name='bookings.tasks.rebuild_recommendations', run_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_similarpackage'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_rebuild, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def merge_duplicate_holds(apps, schema_editor):
+    """Keep the longest-lasting hold per user and package, returning the seats of the others"""
+    SeatHold = apps.get_model('bookings', 'SeatHold')
+    Package = apps.get_model('bookings', 'Package')
+    kept = set()
+    for hold in SeatHold.objects.order_by('user_id', 'package_id', '-expires_at', '-id').iterator():
+        key = (hold.user_id, hold.package_id)
+        if key not in kept:
+            kept.add(key)
+            continue
+        Package.objects.filter(id=hold.package_id).update(available_seats=F('available_seats') + hold.seats)
+        hold.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_queue_recommendations_rebuild'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_holds, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='seathold',
+            constraint=models.UniqueConstraint(fields=('user', 'package'), name='seathold_user_package_unique'),
+        ),
+        migrations.RemoveIndex(
+            model_name='seathold',
+            name='seathold_user_package_idx',
+        ),
+    ]
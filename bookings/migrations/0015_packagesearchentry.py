@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0014_seathold_user_package_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageSearchEntry',
+            fields=[
+                ('package', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='bookings.package')),
+                ('document', models.TextField(db_column='bookings_package_fts')),
+            ],
+            options={
+                'db_table': 'bookings_package_fts',
+                'managed': False,
+            },
+        ),
+    ]
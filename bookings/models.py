@@ -1,12 +1,15 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
 class Destination(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     image = models.ImageField(upload_to='destinations/', blank=True, null=True)
+    # Resized copies of ``image``, maintained by bookings.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     country = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -17,6 +20,9 @@ class Destination(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='destination_name_idx'),
+        ]
 
 class Package(models.Model):
     PACKAGE_TYPES = [
@@ -47,6 +53,67 @@ class Package(models.Model):
 
     class Meta:
         ordering = ['departure_date']
+        indexes = [
+            # Available catalog in departure order, also used for keyset pagination
+            models.Index(
+                fields=['departure_date', 'id'],
+                condition=models.Q(available_seats__gt=0),
+                name='package_avail_departure_idx',
+            ),
+            # Available packages of one destination
+            models.Index(
+                fields=['destination', 'departure_date'],
+                condition=models.Q(available_seats__gt=0),
+                name='package_destination_avail_idx',
+            ),
+        ]
+        constraints = [
+            # Natural key used by the catalog import to upsert packages
+            models.UniqueConstraint(fields=['destination', 'name', 'departure_date'], name='package_natural_key'),
+        ]
+
+class DestinationSummary(models.Model):
+    """Denormalized availability and pricing for a destination's packages"""
+    destination = models.OneToOneField(Destination, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    available_packages = models.PositiveIntegerField(default=0)
+    available_seats = models.PositiveIntegerField(default=0)
+    next_departure = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary for {self.destination.name}"
+
+class SimilarPackage(models.Model):
+    """One of a package's nearest neighbours, precomputed by ``bookings.recommendations``"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='similar_packages')
+    similar = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    distance = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.similar_id} is #{self.rank + 1} for {self.package_id}"
+
+    class Meta:
+        ordering = ['package', 'rank']
+        constraints = [
+            # Also the index package pages read their neighbours through
+            models.UniqueConstraint(fields=['package', 'rank'], name='similar_package_rank'),
+        ]
+
+class PackageSearchEntry(models.Model):
+    """A package's row in the FTS5 table that ``bookings.search`` creates and keeps in sync"""
+    package = models.OneToOneField(
+        Package, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid', db_constraint=False,
+        related_name='search_entry',
+    )
+    # FTS5's hidden column named after the table: MATCH against it searches every column
+    document = models.TextField(db_column='bookings_package_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'bookings_package_fts'
 
 class Booking(models.Model):
     STATUS_CHOICES = [
@@ -54,6 +121,7 @@ class Booking(models.Model):
         ('confirmed', 'Confirmed'),
         ('cancelled', 'Cancelled'),
         ('completed', 'Completed'),
+        ('expired', 'Expired'),
     ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
@@ -72,6 +140,34 @@ class Booking(models.Model):
 
     class Meta:
         ordering = ['-booking_date']
+        indexes = [
+            models.Index(fields=['user', '-booking_date'], name='booking_user_date_idx'),
+            # Dashboard history filtered by status, and the per-status stats,
+            # which read every column they need from the index
+            models.Index(fields=['user', 'status', '-booking_date'], name='booking_user_status_date_idx'),
+            models.Index(fields=['user', 'status', 'travel_date', 'total_price'], name='booking_user_stats_idx'),
+            # The lifecycle sweeper's scans for bookings due to complete or expire
+            models.Index(fields=['status', 'package'], name='booking_status_package_idx'),
+        ]
+
+class SeatHold(models.Model):
+    """Seats set aside for a user while they fill in the booking form"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_holds')
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='seat_holds')
+    seats = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Hold {self.id} - {self.user.username} - {self.seats} seat(s) on {self.package.name}"
+
+    class Meta:
+        ordering = ['expires_at']
+        constraints = [
+            # One hold per user and package, however many booking pages they open;
+            # also the index holds are looked up through
+            models.UniqueConstraint(fields=['user', 'package'], name='seathold_user_package_unique'),
+        ]
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -84,3 +180,33 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+class Task(models.Model):
+    """A unit of background work run by ``manage.py run_tasks``"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Task {self.id} - {self.name} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Workers look for the oldest due task
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
@@ -0,0 +1,147 @@
+"""Keyset (cursor) pagination for catalog listings.
+
+Pages are addressed by the ``(field, id)`` of the row at their edge rather
+than by an OFFSET, so every page costs one indexed range scan no matter how
+deep it is. Packages are paged by ``(departure_date, id)`` and destinations by
+``(name, id)``.
+"""
+import hashlib
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+
+class Keyset:
+    """Order by ``field`` then ``id``; ``parse`` turns a cursor's field part back into a value"""
+
+    def __init__(self, field, parse):
+        self.field = field
+        self.parse = parse
+
+
+PACKAGES = Keyset('departure_date', date.fromisoformat)
+DESTINATIONS = Keyset('name', str)
+
+
+def encode_cursor(row, keyset=PACKAGES):
+    value = getattr(row, keyset.field)
+    return f'{value.isoformat() if isinstance(value, date) else value}_{row.id}'
+
+
+def decode_cursor(token, keyset=PACKAGES):
+    """Return ``(value, id)`` for a cursor token, or None if it is malformed"""
+    try:
+        # The id never contains an underscore, a destination name may
+        value, pk = token.rsplit('_', 1)
+        return keyset.parse(value), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+class KeysetPage:
+    """One page of results plus the cursors of its neighbours"""
+
+    def __init__(self, object_list, has_next, has_previous, keyset=PACKAGES):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.keyset = keyset
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1], self.keyset) if self._has_next else None
+
+    @property
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0], self.keyset) if self._has_previous else None
+
+
+def keyset_query(queryset, after=None, before=None, per_page=12, keyset=PACKAGES):
+    """Return ``(queryset, backwards)`` fetching one row more than a page around the cursors"""
+    field = keyset.field
+    after = decode_cursor(after, keyset) if after else None
+    before = decode_cursor(before, keyset) if before else None
+    if before:
+        value, pk = before
+        queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+        return queryset.order_by(f'-{field}', '-id')[:per_page + 1], True
+    if after:
+        value, pk = after
+        queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+    return queryset.order_by(field, 'id')[:per_page + 1], False
+
+
+def build_page(rows, backwards, after, per_page, keyset=PACKAGES):
+    if backwards:
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], has_next=True, has_previous=has_previous, keyset=keyset)
+    return KeysetPage(
+        rows[:per_page], has_next=len(rows) > per_page, has_previous=bool(after and decode_cursor(after, keyset)),
+        keyset=keyset,
+    )
+
+
+def keyset_page(queryset, after=None, before=None, per_page=12, keyset=PACKAGES):
+    """Fetch the page following the ``after`` cursor or preceding the ``before`` cursor"""
+    query, backwards = keyset_query(queryset, after, before, per_page, keyset)
+    return build_page(list(query), backwards, after, per_page, keyset)
+
+
+async def akeyset_page(queryset, after=None, before=None, per_page=12, keyset=PACKAGES):
+    """``keyset_page`` using the async ORM"""
+    query, backwards = keyset_query(queryset, after, before, per_page, keyset)
+    return build_page([row async for row in query], backwards, after, per_page, keyset)
+
+
+def count_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return 'count:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+
+
+def cached_count(queryset):
+    """COUNT(*) for a queryset, cached briefly under a key derived from its SQL.
+
+    Set ``PACKAGE_COUNT_CACHE_SECONDS`` to 0 to always count exactly.
+    """
+    timeout = getattr(settings, 'PACKAGE_COUNT_CACHE_SECONDS', 60)
+    if not timeout:
+        return queryset.count()
+    key = count_key(queryset)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+async def acached_count(queryset):
+    """``cached_count`` using the async ORM and cache APIs"""
+    timeout = getattr(settings, 'PACKAGE_COUNT_CACHE_SECONDS', 60)
+    if not timeout:
+        return await queryset.acount()
+    key = count_key(queryset)
+    count = await cache.aget(key)
+    if count is None:
+        count = await queryset.acount()
+        await cache.aset(key, count, timeout)
+    return count
@@ -0,0 +1,264 @@
+"""Opt-in request profiling.
+
+``ProfilingMiddleware`` times the SQL, template rendering and total time of
+each request, WSGI or ASGI, and adds the total to a per-route latency
+histogram. Staff, and everyone when ``DEBUG`` is on, also get the timings in
+a ``Server-Timing`` header. A small random sample of WSGI requests also runs
+under cProfile; the profile is written to ``PROFILING_DUMP_DIR`` only if the
+request turns out slower than ``PROFILING_SLOW_MS``, so the cost of profiling
+is paid by a few requests rather than all of them.
+
+Template time is measured by wrapping ``Template.render`` only while a
+profiled request is in flight; the original method is put back once the last
+one finishes.
+
+Histograms live in process memory and cover the current and previous
+``PROFILING_WINDOW_SECONDS`` window, so they reflect recent traffic only.
+"""
+import cProfile
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+# Upper bounds in milliseconds of the histogram buckets; the last is open
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+_current = ContextVar('profiling_request', default=None)
+_profile_lock = threading.Lock()
+
+# Profiled requests in flight, and the Template.render they replaced
+_patch_lock = threading.Lock()
+_patch_users = 0
+_original_render = None
+
+
+class RequestTimings:
+    """Time spent by one request in SQL and template rendering"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def record_sql(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_count += 1
+            self.sql_ms += (time.perf_counter() - start) * 1000
+
+
+def _timed_render(render):
+    """Wrap ``Template.render`` so only the outermost template of a request is timed"""
+    @wraps(render)
+    def wrapper(self, context):
+        timings = _current.get()
+        if timings is None or timings.template_depth:
+            return render(self, context)
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            timings.template_depth -= 1
+            timings.template_ms += (time.perf_counter() - start) * 1000
+    return wrapper
+
+
+@contextmanager
+def template_timing():
+    """Time templates while at least one profiled request is running"""
+    global _patch_users, _original_render
+    with _patch_lock:
+        if not _patch_users:
+            _original_render = Template.render
+            Template.render = _timed_render(_original_render)
+        _patch_users += 1
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            _patch_users -= 1
+            if not _patch_users:
+                Template.render = _original_render
+
+
+def time_queries(stack, timings):
+    """Record the queries of this thread's connections until ``stack`` closes"""
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(timings.record_sql))
+
+
+class RouteHistograms:
+    """Latency histograms per route over a rolling window"""
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.current = {}
+        self.previous = {}
+
+    def record(self, route, ms):
+        with self.lock:
+            self._rotate()
+            entry = self.current.setdefault(route, {'counts': [0] * (len(BUCKETS_MS) + 1), 'total_ms': 0.0})
+            entry['counts'][bisect_left(BUCKETS_MS, ms)] += 1
+            entry['total_ms'] += ms
+
+    def _rotate(self):
+        elapsed = time.monotonic() - self.started
+        if elapsed < self.window:
+            return
+        # After a quiet spell longer than a window the old data is stale too
+        self.previous = self.current if elapsed < 2 * self.window else {}
+        self.current = {}
+        self.started = time.monotonic()
+
+    def snapshot(self):
+        """Bucket counts, request count, mean and approximate percentiles per route"""
+        with self.lock:
+            self._rotate()
+            merged = {}
+            for entries in (self.previous, self.current):
+                for route, entry in entries.items():
+                    target = merged.setdefault(route, {'counts': [0] * (len(BUCKETS_MS) + 1), 'total_ms': 0.0})
+                    target['counts'] = [a + b for a, b in zip(target['counts'], entry['counts'])]
+                    target['total_ms'] += entry['total_ms']
+        labels = [f'<={bound}ms' for bound in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        stats = {}
+        for route, entry in sorted(merged.items()):
+            requests = sum(entry['counts'])
+            stats[route] = {
+                'requests': requests,
+                'mean_ms': round(entry['total_ms'] / requests, 2),
+                'p50_ms': upper_bound(entry['counts'], 0.50),
+                'p95_ms': upper_bound(entry['counts'], 0.95),
+                'p99_ms': upper_bound(entry['counts'], 0.99),
+                'buckets': dict(zip(labels, entry['counts'])),
+            }
+        return stats
+
+
+def upper_bound(counts, fraction):
+    """Upper edge of the bucket holding the given fraction of requests (None for the open bucket)"""
+    needed = fraction * sum(counts)
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= needed:
+            return BUCKETS_MS[index] if index < len(BUCKETS_MS) else None
+    return None
+
+
+histograms = RouteHistograms(getattr(settings, 'PROFILING_WINDOW_SECONDS', 300))
+
+
+class ProfilingMiddleware:
+    """Time requests, feed the route histograms and sample slow WSGI requests with cProfile"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01)
+        self.slow_ms = getattr(settings, 'PROFILING_SLOW_MS', 500)
+        self.dump_dir = Path(getattr(settings, 'PROFILING_DUMP_DIR', settings.BASE_DIR / 'profiles'))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        # Only one cProfile can run per process, so concurrent samples are skipped
+        profiler = None
+        if random.random() < self.sample_rate and _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                time_queries(stack, timings)
+                stack.enter_context(template_timing())
+                if profiler:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler:
+                        profiler.disable()
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            _current.reset(token)
+            if profiler:
+                _profile_lock.release()
+
+        route = self.record(request, total_ms)
+        if profiler and total_ms >= self.slow_ms:
+            self.dump(profiler, route, total_ms)
+        if self.show_timings(getattr(request, 'user', None)):
+            self.add_header(response, timings, total_ms)
+        return response
+
+    async def __acall__(self, request):
+        """Async version of __call__.
+
+        The ORM runs queries on the request's sync thread, so the connections
+        are watched from that thread. cProfile only follows the thread that
+        starts it, so ASGI requests are not sampled.
+        """
+        timings = RequestTimings()
+        token = _current.set(timings)
+        stack = ExitStack()
+        start = time.perf_counter()
+        try:
+            await sync_to_async(time_queries)(stack, timings)
+            stack.enter_context(template_timing())
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            total_ms = (time.perf_counter() - start) * 1000
+            _current.reset(token)
+
+        self.record(request, total_ms)
+        user = await request.auser() if hasattr(request, 'auser') else None
+        if self.show_timings(user):
+            self.add_header(response, timings, total_ms)
+        return response
+
+    def record(self, request, total_ms):
+        """Add the request to its route's histogram and return the route"""
+        match = request.resolver_match
+        route = match.view_name if match else 'unresolved'
+        histograms.record(route, total_ms)
+        return route
+
+    def show_timings(self, user):
+        """Server-Timing reveals query counts and timings, so only staff see it outside DEBUG"""
+        return settings.DEBUG or (user is not None and user.is_staff)
+
+    def add_header(self, response, timings, total_ms):
+        response['Server-Timing'] = ', '.join([
+            f'sql;dur={timings.sql_ms:.1f};desc="{timings.sql_count} queries"',
+            f'tpl;dur={timings.template_ms:.1f}',
+            f'app;dur={max(total_ms - timings.sql_ms - timings.template_ms, 0):.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+    def dump(self, profiler, route, total_ms):
+        self.dump_dir.mkdir(parents=True, exist_ok=True)
+        name = f'{route.replace(":", "-")}-{time.strftime("%Y%m%d-%H%M%S")}-{total_ms:.0f}ms.prof'
+        profiler.dump_stats(self.dump_dir / name)
@@ -0,0 +1,170 @@
+"""A small task queue kept in the database.
+
+Functions decorated with ``@task`` can be queued with ``enqueue``, which
+writes a ``Task`` row in the caller's transaction: the task exists only if
+the work that queued it committed, and no message broker is needed.
+``manage.py run_tasks`` runs them on a pool of worker threads. A worker claims
+a task with a conditional UPDATE, so any number of workers and processes can
+share the queue. A task that raises is retried with exponential backoff
+until it has been tried ``max_attempts`` times, then left ``failed``. A task
+still running after ``TASK_LEASE_SECONDS`` is assumed lost with its worker
+and is put back for the live workers, which look for such tasks once a lease.
+"""
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Task name -> function
+registry = {}
+
+
+def task(func):
+    """Register a function so it can be queued; its arguments must be JSON serializable"""
+    func.task_name = f'{func.__module__}.{func.__name__}'
+    registry[func.task_name] = func
+    return func
+
+
+def enqueue(func, *args, delay=0, max_attempts=None, **kwargs):
+    """Queue ``func(*args, **kwargs)`` to run after ``delay`` seconds"""
+    return Task.objects.create(
+        name=func.task_name,
+        args=list(args),
+        kwargs=kwargs,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or getattr(settings, 'TASK_MAX_ATTEMPTS', 5),
+    )
+
+
+def claim():
+    """Take the oldest due task for this worker, or return None if there is none"""
+    now = timezone.now()
+    candidates = Task.objects.filter(status='queued', run_at__lte=now).order_by('run_at')
+    for task_id in candidates.values_list('id', flat=True)[:10]:
+        # Another worker may take the same row first; only one update succeeds
+        if Task.objects.filter(id=task_id, status='queued').update(
+            status='running', started_at=now, attempts=F('attempts') + 1
+        ):
+            return Task.objects.get(id=task_id)
+    return None
+
+
+def run(task):
+    """Run a claimed task and record the outcome"""
+    try:
+        func = registry[task.name]
+        func(*task.args, **task.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            logger.error('Task %s (%s) failed after %d attempts', task.id, task.name, task.attempts)
+            Task.objects.filter(id=task.id).update(status='failed', last_error=error, finished_at=timezone.now())
+        else:
+            backoff = getattr(settings, 'TASK_RETRY_BACKOFF_SECONDS', 10) * 2 ** (task.attempts - 1)
+            Task.objects.filter(id=task.id).update(
+                status='queued', last_error=error, run_at=timezone.now() + timedelta(seconds=backoff)
+            )
+        return False
+    Task.objects.filter(id=task.id).update(status='done', finished_at=timezone.now())
+    return True
+
+
+def run_pending(limit=None):
+    """Run due tasks in this thread until there are none left, returning how many ran"""
+    ran = 0
+    while limit is None or ran < limit:
+        task = claim()
+        if task is None:
+            break
+        run(task)
+        ran += 1
+    return ran
+
+
+def lease_seconds():
+    return getattr(settings, 'TASK_LEASE_SECONDS', 300)
+
+
+def requeue_stale():
+    """Put back tasks whose worker died while running them"""
+    cutoff = timezone.now() - timedelta(seconds=lease_seconds())
+    return Task.objects.filter(status='running', started_at__lt=cutoff).update(status='queued')
+
+
+def purge():
+    """Delete finished tasks older than ``TASK_RETENTION_DAYS``"""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'TASK_RETENTION_DAYS', 7))
+    return Task.objects.filter(status='done', finished_at__lt=cutoff).delete()[0]
+
+
+def stats(window=3600):
+    """Queue depth by status, the age of the oldest due task and recent wait and run times"""
+    now = timezone.now()
+    counts = Task.objects.aggregate(
+        due=Count('id', filter=Q(status='queued', run_at__lte=now)),
+        scheduled=Count('id', filter=Q(status='queued', run_at__gt=now)),
+        running=Count('id', filter=Q(status='running')),
+        failed=Count('id', filter=Q(status='failed')),
+        oldest_due=Min('run_at', filter=Q(status='queued', run_at__lte=now)),
+    )
+    oldest_due = counts.pop('oldest_due')
+    recent = list(
+        Task.objects.filter(status='done', finished_at__gte=now - timedelta(seconds=window))
+        .values_list('run_at', 'started_at', 'finished_at')
+    )
+    waits = sorted((started - run_at).total_seconds() for run_at, started, _ in recent)
+    runs = [(finished - started).total_seconds() for _, started, finished in recent]
+    return {
+        **counts,
+        'oldest_due_seconds': round((now - oldest_due).total_seconds(), 3) if oldest_due else 0,
+        'done_recently': len(recent),
+        'wait_mean_seconds': round(sum(waits) / len(waits), 3) if waits else None,
+        'wait_max_seconds': round(waits[-1], 3) if waits else None,
+        'run_mean_seconds': round(sum(runs) / len(runs), 3) if runs else None,
+    }
+
+
+def work(stop, poll_interval=1.0, burst=False):
+    """Worker thread loop: run due tasks until ``stop`` is set (or the queue is empty in burst mode)"""
+    next_requeue = 0
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            try:
+                if time.monotonic() >= next_requeue:
+                    if requeued := requeue_stale():
+                        logger.warning('Requeued %d task(s) whose lease expired', requeued)
+                    next_requeue = time.monotonic() + lease_seconds()
+                ran = run_pending(limit=100)
+            except Exception:
+                # Keep the worker alive through database hiccups
+                logger.exception('Task worker error')
+                ran = 0
+            if not ran:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+    finally:
+        connection.close()
+
+
+def start_workers(count, poll_interval=1.0, burst=False):
+    """Start ``count`` worker threads, returning them and the event that stops them"""
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work, args=(stop, poll_interval, burst), name=f'task-worker-{index}', daemon=True)
+        for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, stop
@@ -0,0 +1,204 @@
+"""Similar-package recommendations.
+
+Every upcoming package is described by a numeric feature vector: package
+type, price and duration on log scales, departure date in units of
+``DEPARTURE_WINDOW_DAYS`` and inclusions, each scaled so that the squared
+euclidean distance between two vectors is their weighted dissimilarity. A
+different destination or country adds a fixed penalty on top. The
+``SIMILAR_PACKAGES`` nearest available packages of each package are stored
+in ``SimilarPackage``, so a package page reads its recommendations with one
+indexed query.
+
+``rebuild`` recomputes every list, a block of packages at a time, with NumPy.
+Each block compares its packages with the whole catalog, so it is sized to
+keep that comparison within ``RECOMMENDATIONS_BLOCK_MB``; the rebuild still
+does work proportional to the square of the catalog size. It runs as a task
+that schedules itself again every ``RECOMMENDATIONS_REBUILD_HOURS``, which
+drops departed packages. Saving packages queues ``refresh_for_packages``,
+which recomputes only the lists the changes can affect: the packages' own,
+those they were already in, and those whose furthest entry they now beat. If
+that is more than ``REFRESH_LIMIT`` lists, the rest are left to a queued
+``rebuild``. Deleting a package removes
+it from lists through the foreign key cascade, and the rest of each list is
+still its nearest neighbours among the remaining packages.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Package, SimilarPackage
+from .pricing import as_days
+
+# Squared distance added per unit of difference in each feature
+WEIGHTS = {
+    'destination': 1.0,  # a different destination
+    'country': 1.0,  # a different country
+    'package_type': 0.5,  # per step from basic to luxury
+    'price': 1.0,  # per doubling of the price
+    'duration': 0.5,  # per doubling of the duration
+    'departure': 0.25,  # per DEPARTURE_WINDOW_DAYS between departures
+    'inclusions': 0.25,  # per inclusion only one of the two has
+}
+
+DEPARTURE_WINDOW_DAYS = 30
+
+# Most lists a package refresh recomputes before leaving the work to a full rebuild
+REFRESH_LIMIT = 200
+
+# Peak bytes per (block row, catalog package) pair: the float64 distances, the
+# int64 argpartition result and a boolean mask
+CELL_BYTES = 24
+
+# Most packages written in one transaction, so bookings are never held up for long
+MAX_BLOCK_ROWS = 1000
+
+TYPE_STEPS = {package_type: step for step, (package_type, _) in enumerate(Package.PACKAGE_TYPES)}
+
+COLUMNS = (
+    'id', 'destination_id', 'destination__country', 'package_type', 'price', 'duration_days', 'departure_date',
+    'includes_flight', 'includes_hotel', 'includes_meals', 'includes_transport', 'available_seats',
+)
+
+
+def list_length():
+    return getattr(settings, 'SIMILAR_PACKAGES', 10)
+
+
+class Catalog:
+    """Feature vectors of upcoming packages, one row per package in id order"""
+
+    def __init__(self, rows, today):
+        columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        self.ids = np.array(columns[0], dtype=np.int64)
+        self.position = {package_id: row for row, package_id in enumerate(self.ids.tolist())}
+        self.destinations = np.array(columns[1], dtype=np.int64)
+        self.countries = np.unique(np.array(columns[2], dtype=str), return_inverse=True)[1].reshape(-1)
+        features = [
+            ('package_type', np.array([TYPE_STEPS.get(package_type, 0) for package_type in columns[3]], dtype=np.float64)),
+            ('price', np.log2(np.maximum(np.array(columns[4], dtype=np.float64), 1))),
+            ('duration', np.log2(np.maximum(np.array(columns[5], dtype=np.float64), 1))),
+            # Relative to today, which keeps the values small without changing any distance
+            ('departure', (as_days(columns[6]) - np.datetime64(today, 'D')).astype(np.float64) / DEPARTURE_WINDOW_DAYS),
+        ] + [('inclusions', np.array(column, dtype=np.float64)) for column in columns[7:11]]
+        self.vectors = np.column_stack(
+            [values * math.sqrt(WEIGHTS[name]) for name, values in features]
+        ) if rows else np.zeros((0, len(features)))
+        self.norms = (self.vectors ** 2).sum(axis=1)
+        self.available = np.array(columns[11], dtype=np.int64) > 0
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def load():
+    """Catalog of every package that has not departed yet"""
+    today = timezone.localdate()
+    rows = Package.objects.filter(departure_date__gte=today).order_by('id').values_list(*COLUMNS)
+    return Catalog(list(rows.iterator(chunk_size=5000)), today)
+
+
+def block_rows(catalog, memory_mb=None):
+    """Packages per block that keep one block's comparison with the catalog within ``memory_mb``"""
+    if memory_mb is None:
+        memory_mb = getattr(settings, 'RECOMMENDATIONS_BLOCK_MB', 64)
+    return int(min(MAX_BLOCK_ROWS, max(1, memory_mb * 2 ** 20 // (CELL_BYTES * max(len(catalog), 1)))))
+
+
+def distances(catalog, rows):
+    """Squared distances from the packages at ``rows`` to every package, as a len(rows) x len(catalog) array"""
+    # Built up in place, so the only full-size temporary is a boolean mask
+    found = catalog.vectors[rows] @ catalog.vectors.T
+    found *= -2
+    found += catalog.norms[rows][:, None]
+    found += catalog.norms[None, :]
+    for name, groups in (('destination', catalog.destinations), ('country', catalog.countries)):
+        np.add(found, WEIGHTS[name], out=found, where=groups[rows][:, None] != groups[None, :])
+    # Rounding can leave identical vectors slightly below zero
+    return np.maximum(found, 0, out=found)
+
+
+def nearest(catalog, rows, count):
+    """(rows, distances) of the ``count`` nearest available packages to each of ``rows``, nearest first"""
+    found = distances(catalog, rows)
+    found[:, ~catalog.available] = np.inf
+    found[np.arange(len(rows)), rows] = np.inf
+    count = min(count, len(catalog))
+    if count < len(catalog):
+        # Partial sort: only the first ``count`` columns are put in order below
+        candidates = np.argpartition(found, count - 1, axis=1)[:, :count]
+    else:
+        candidates = np.tile(np.arange(len(catalog)), (len(rows), 1))
+    candidate_distances = np.take_along_axis(found, candidates, axis=1)
+    order = np.argsort(candidate_distances, axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_distances, order, axis=1)
+
+
+def write(catalog, rows, memory_mb=None):
+    """Replace the neighbour lists of the packages at ``rows``, returning the number of packages written"""
+    size = block_rows(catalog, memory_mb)
+    for start in range(0, len(rows), size):
+        block = rows[start:start + size]
+        neighbours, neighbour_distances = nearest(catalog, block, list_length())
+        objects = [
+            SimilarPackage(package_id=package_id, similar_id=similar_id, rank=rank, distance=distance)
+            for package_id, similar_ids, similar_distances in zip(
+                catalog.ids[block].tolist(), catalog.ids[neighbours].tolist(), neighbour_distances.tolist()
+            )
+            for rank, (similar_id, distance) in enumerate(zip(similar_ids, similar_distances))
+            if distance != math.inf
+        ]
+        with transaction.atomic():
+            SimilarPackage.objects.filter(package_id__in=catalog.ids[block].tolist()).delete()
+            SimilarPackage.objects.bulk_create(objects, batch_size=1000)
+    return len(rows)
+
+
+def rebuild(memory_mb=None):
+    """Recompute the neighbours of every upcoming package, returning the number of packages written"""
+    catalog = load()
+    written = write(catalog, np.arange(len(catalog)), memory_mb)
+    SimilarPackage.objects.filter(package__departure_date__lt=timezone.localdate()).delete()
+    return written
+
+
+def refresh_for_packages(package_ids, limit=None):
+    """Recompute the lists saved packages can change, returning the number of packages written.
+
+    When more than ``limit`` other lists would change, as before the first
+    rebuild when none exist, only the packages' own lists are written and
+    None is returned so the caller can schedule a ``rebuild``.
+    """
+    catalog = load()
+    package_ids = set(package_ids)
+    affected = set(SimilarPackage.objects.filter(similar_id__in=package_ids).values_list('package_id', flat=True))
+    rows = np.array(sorted(
+        catalog.position[package_id] for package_id in package_ids
+        if package_id in catalog.position and catalog.available[catalog.position[package_id]]
+    ), dtype=np.int64)
+    if len(rows):
+        # Lists not yet full count as having an infinitely distant last entry
+        furthest = dict(SimilarPackage.objects.filter(rank=list_length() - 1).values_list('package_id', 'distance'))
+        limits = np.array([furthest.get(other, math.inf) for other in catalog.ids.tolist()])
+        size = block_rows(catalog)
+        for start in range(0, len(rows), size):
+            closer = (distances(catalog, rows[start:start + size]) < limits).any(axis=0)
+            affected.update(catalog.ids[closer].tolist())
+    affected -= package_ids
+    deferred = limit is not None and len(affected) > limit
+    if deferred:
+        affected = set()
+    affected |= package_ids
+    rows = np.array(sorted(catalog.position[other] for other in affected if other in catalog.position), dtype=np.int64)
+    # Departed packages get no list
+    SimilarPackage.objects.filter(package_id__in=[p for p in package_ids if p not in catalog.position]).delete()
+    written = write(catalog, rows)
+    return None if deferred else written
+
+
+def similar_packages(package_id, limit=3):
+    """Upcoming available packages most like ``package_id``, nearest first"""
+    return Package.objects.select_related('destination').filter(
+        similar_to__package_id=package_id, available_seats__gt=0, departure_date__gte=timezone.localdate()
+    ).order_by('similar_to__rank')[:limit]
@@ -0,0 +1,108 @@
+"""Read-replica routing for catalog queries.
+
+Reads of the catalog models go to one of the ``DATABASE_REPLICAS`` aliases;
+everything else, and every write, goes to ``default``. Replicas lag behind
+the primary, so a client that has just written is pinned to the primary:
+
+* for the rest of the request once anything has been written, and
+* for ``REPLICA_PIN_SECONDS`` afterwards, through a cookie set by
+  ``ReplicaPinningMiddleware`` on unsafe requests and requests that wrote.
+
+Replicas are only used while the middleware is handling a request, so
+management commands and scripts always read from the primary.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PRIMARY = 'default'
+PIN_COOKIE = 'primary_until'
+
+# Models whose reads can tolerate replication lag
+CATALOG_MODELS = {'destination', 'package', 'destinationsummary', 'similarpackage'}
+
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+class RequestState:
+    """Whether the current request must read from the primary"""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.pinned or state.wrote or not replicas():
+            return PRIMARY
+        if model._meta.app_label != 'bookings' or model._meta.model_name not in CATALOG_MODELS:
+            return PRIMARY
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replicas hold the same rows; anything else is left to Django
+        databases = {PRIMARY, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+class ReplicaPinningMiddleware:
+    """Track writes per request and pin recent writers to the primary"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state, token = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.finish(request, response, state)
+
+    def begin(self, request):
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state = RequestState(pinned)
+        return state, _request_state.set(state)
+
+    def finish(self, request, response, state):
+        if state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            window = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            response.set_cookie(PIN_COOKIE, str(time.time() + window), max_age=window, httponly=True, samesite='Lax')
+        return response
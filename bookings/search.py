@@ -0,0 +1,139 @@
+"""Full-text search over packages and their destinations.
+
+On SQLite the catalog text is mirrored into an FTS5 table keyed by package
+id, kept in sync by the signal handlers in ``bookings.signals``. The
+unmanaged ``PackageSearchEntry`` model maps that table, so searches join it
+through the ORM. Other databases, or SQLite builds without FTS5, fall back to
+``icontains`` lookups over the same fields.
+"""
+import re
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import F, FloatField, Func, Lookup, Q, Value
+from django.dispatch import receiver
+from .models import PackageSearchEntry
+
+FTS_TABLE = 'bookings_package_fts'
+
+CREATE_SQL = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    name, description, destination_name, city, country,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+DROP_SQL = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+INDEX_SQL = f"""
+INSERT INTO {FTS_TABLE} (rowid, name, description, destination_name, city, country)
+SELECT p.id, p.name, p.description, d.name, d.city, d.country
+FROM bookings_package p
+JOIN bookings_destination d ON d.id = p.destination_id
+"""
+
+# Destination fields are weighted above package text when ranking, in column order
+RANK_WEIGHTS = (2.0, 0.5, 4.0, 4.0, 3.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def forget_availability(connection):
+    """Look for the table again on the next search, e.g. after creating or dropping it"""
+    connection.fts_available = None
+
+
+@receiver(connection_created)
+def probe_new_connections(sender, connection, **kwargs):
+    """A new connection looks for the table again, as it may have been created since"""
+    forget_availability(connection)
+
+
+def is_available():
+    """Whether the FTS5 table exists on the default database, looked up once per connection"""
+    available = getattr(connection, 'fts_available', None)
+    if available is None:
+        available = connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        connection.fts_available = available
+    return available
+
+
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+PackageSearchEntry._meta.get_field('document').register_lookup(Match)
+
+
+class BM25(Func):
+    """FTS5 relevance of the matched row, lower is better"""
+    function = 'bm25'
+    output_field = FloatField()
+
+
+def build_match(text):
+    """Turn free text into an FTS5 query matching every word as a prefix"""
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(text))
+
+
+def filter_packages(queryset, text):
+    """Restrict a package queryset to matches for ``text``, best matches first"""
+    match = build_match(text)
+    if not match:
+        return queryset
+    if not is_available():
+        # The indexed fields, every word somewhere in one of them
+        for token in TOKEN_RE.findall(text):
+            queryset = queryset.filter(
+                Q(name__icontains=token) |
+                Q(description__icontains=token) |
+                Q(destination__name__icontains=token) |
+                Q(destination__city__icontains=token) |
+                Q(destination__country__icontains=token)
+            )
+        return queryset
+    # The join lets SQLite drive the query from the FTS match
+    rank = BM25(F('search_entry__document'), *(Value(weight) for weight in RANK_WEIGHTS))
+    return queryset.filter(search_entry__document__match=match).alias(search_rank=rank).order_by(
+        'search_rank', 'departure_date'
+    )
+
+
+def index_packages(package_ids=None, destination_id=None):
+    """(Re)index the given packages, every package of a destination, or the whole catalog"""
+    if not is_available():
+        return
+    where, params = '', []
+    if package_ids is not None:
+        placeholders = ', '.join(['%s'] * len(package_ids))
+        where, params = f'WHERE p.id IN ({placeholders})', list(package_ids)
+    elif destination_id is not None:
+        where, params = 'WHERE p.destination_id = %s', [destination_id]
+    with connection.cursor() as cursor:
+        if where:
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT p.id FROM bookings_package p {where})",
+                params,
+            )
+        else:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"{INDEX_SQL} {where}", params)
+
+
+def remove_packages(package_ids):
+    """Drop deleted packages from the index"""
+    if not is_available() or not package_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(package_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", list(package_ids))
+
+
+def rebuild():
+    """Rebuild the whole index, e.g. after bulk loads that bypass signals"""
+    index_packages()
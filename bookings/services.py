@@ -0,0 +1,232 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from .models import Package, Booking, SeatHold
+from . import caching, pricing, summaries, tasks
+from .database import retry_on_locked
+from .queue import enqueue
+
+
+class SeatsUnavailable(Exception):
+    """Raised when a package no longer has enough seats for a booking"""
+
+
+def seats_left(package_id):
+    """(available_seats, destination_id) of a package just updated"""
+    return Package.objects.filter(id=package_id).values_list('available_seats', 'destination_id').get()
+
+
+def bump_catalog_on_commit():
+    """Invalidate cached listings once a package sells out or comes back on sale.
+
+    Other seat changes leave cached pages showing the old count for up to
+    ``CATALOG_CACHE_SECONDS``. Bumping after commit keeps a concurrent
+    request from caching the page as it was before the change.
+    """
+    transaction.on_commit(caching.bump_catalog_stamp)
+
+
+def reserve_seats(package_id, seats):
+    """Atomically take seats from a package, returning False if not enough are left"""
+    updated = Package.objects.filter(
+        id=package_id, available_seats__gte=seats
+    ).update(
+        available_seats=F('available_seats') - seats,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        left, destination_id = seats_left(package_id)
+        if left == 0:
+            bump_catalog_on_commit()
+        summaries.apply_seat_change(destination_id, -seats, available_changed=left == 0)
+    return updated == 1
+
+
+def release_seats(package_id, seats):
+    """Atomically return seats to a package"""
+    updated = Package.objects.filter(id=package_id).update(
+        available_seats=F('available_seats') + seats,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        left, destination_id = seats_left(package_id)
+        if left == seats:
+            bump_catalog_on_commit()
+        summaries.apply_seat_change(destination_id, seats, available_changed=left == seats)
+
+
+@retry_on_locked
+def create_booking(booking, hold=None):
+    """Save an unsaved booking and take its seats in a single transaction.
+
+    The seat decrement is a conditional UPDATE, so concurrent bookings can
+    never push ``available_seats`` below zero. When a seat hold is given its
+    seats are converted into the booking and only the difference is taken
+    from or returned to the package. The total is quoted by the pricing rules.
+    The confirmation email is queued in the same transaction. Raises
+    SeatsUnavailable when the package has sold out in the meantime.
+    """
+    with transaction.atomic():
+        held = 0
+        if hold is not None:
+            # The sweeper may have released the hold already
+            deleted, _ = SeatHold.objects.filter(id=hold.id).delete()
+            if deleted:
+                held = hold.seats
+        extra = booking.number_of_travelers - held
+        if extra > 0 and not reserve_seats(booking.package_id, extra):
+            raise SeatsUnavailable(
+                f"Not enough seats left for {booking.number_of_travelers} traveler(s)"
+            )
+        if extra < 0:
+            release_seats(booking.package_id, -extra)
+        booking.total_price = pricing.quote_total(booking.package, booking.number_of_travelers)
+        booking.save()
+        enqueue(tasks.send_booking_confirmation, booking.id)
+    return booking
+
+
+@retry_on_locked
+def cancel_booking(booking):
+    """Cancel a pending booking and return its seats, returning False if it was not pending"""
+    with transaction.atomic():
+        updated = Booking.objects.filter(id=booking.id, status='pending').update(status='cancelled')
+        if not updated:
+            return False
+        release_seats(booking.package_id, booking.number_of_travelers)
+        enqueue(tasks.send_cancellation_notice, booking.id)
+    booking.status = 'cancelled'
+    return True
+
+
+def hold_duration():
+    """How long a seat hold lasts before the sweeper may release it"""
+    return timedelta(minutes=getattr(settings, 'SEAT_HOLD_MINUTES', 10))
+
+
+@retry_on_locked
+def hold_seats(user, package, seats=1):
+    """Hold seats on a package for a user, returning None if they are not available.
+
+    An existing hold by the same user on the same package is extended rather
+    than duplicated; a unique constraint keeps concurrent requests from
+    creating two.
+    """
+    expires_at = timezone.now() + hold_duration()
+    with transaction.atomic():
+        # get_or_create catches the IntegrityError of a concurrent insert of
+        # the same hold in a savepoint and returns that hold instead
+        hold, created = SeatHold.objects.get_or_create(
+            user=user, package=package, defaults={'seats': seats, 'expires_at': expires_at}
+        )
+        if not created:
+            SeatHold.objects.filter(id=hold.id).update(expires_at=expires_at)
+            hold.expires_at = expires_at
+            return hold
+        if not reserve_seats(package.id, seats):
+            transaction.set_rollback(True)
+            return None
+    return hold
+
+
+def release_expired_holds(batch_size=1000, now=None):
+    """Delete expired seat holds in batches and return their seats, returning the number released"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                SeatHold.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            batch = SeatHold.objects.filter(id__in=ids)
+            totals = batch.values('package_id').order_by('package_id').annotate(seats=Sum('seats'))
+            for row in totals:
+                release_seats(row['package_id'], row['seats'])
+            released += batch.delete()[0]
+    return released
+
+
+def pending_booking_expiry():
+    """How long a booking may stay pending before the sweeper expires it, or None to wait for departure"""
+    days = getattr(settings, 'PENDING_BOOKING_DAYS', None)
+    return None if days is None else timedelta(days=days)
+
+
+@retry_on_locked
+def complete_batch(today, batch_size):
+    """Mark up to ``batch_size`` confirmed bookings whose package has returned as completed"""
+    due = Booking.objects.filter(status='confirmed', package__return_date__lt=today).order_by()
+    return Booking.objects.filter(id__in=due.values('id')[:batch_size]).update(status='completed')
+
+
+@retry_on_locked
+def expire_batch(now, batch_size):
+    """Expire up to ``batch_size`` stale pending bookings and return their seats.
+
+    A pending booking is stale once its package has departed, or once it is
+    older than ``PENDING_BOOKING_DAYS`` when that is set. The seats go back
+    with one UPDATE of the affected packages, each adding the travelers of
+    its own expired bookings from a correlated subquery, and the affected
+    destination summaries are recomputed together. Packages that were sold
+    out are back on sale, so cached listings are invalidated and their
+    recommendations refreshed once the batch commits.
+    """
+    stale = Q(package__departure_date__lte=timezone.localdate(now))
+    expiry = pending_booking_expiry()
+    if expiry is not None:
+        stale |= Q(booking_date__lte=now - expiry)
+    with transaction.atomic():
+        ids = list(
+            Booking.objects.select_for_update(skip_locked=True)
+            .filter(stale, status='pending')
+            .order_by()
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        batch = Booking.objects.filter(id__in=ids)
+        batch.update(status='expired')
+        seats = (
+            batch.filter(package=OuterRef('pk')).order_by().values('package')
+            .annotate(seats=Sum('number_of_travelers')).values('seats')
+        )
+        packages = Package.objects.filter(id__in=batch.values('package_id'))
+        # Every booking holds at least one seat, so each sold-out package reopens
+        reopened = list(packages.filter(available_seats=0).values_list('id', flat=True))
+        packages.update(available_seats=F('available_seats') + Subquery(seats), updated_at=now)
+        summaries.rebuild(destination_ids=packages.values('destination_id'))
+        if reopened:
+            bump_catalog_on_commit()
+            for package_id in reopened:
+                tasks.queue_recommendations_refresh(package_id)
+    return len(ids)
+
+
+def complete_finished_bookings(batch_size=1000, today=None):
+    """Move confirmed bookings to completed once their package has returned, returning how many moved"""
+    today = today or timezone.localdate()
+    completed = 0
+    while updated := complete_batch(today, batch_size):
+        completed += updated
+    return completed
+
+
+def expire_pending_bookings(batch_size=1000, now=None):
+    """Expire bookings left pending too long or past departure, returning how many expired.
+
+    Each batch is its own short transaction, so live bookings and
+    cancellations wait at most one batch for the lock.
+    """
+    now = now or timezone.now()
+    expired = 0
+    while updated := expire_batch(now, batch_size):
+        expired += updated
+    return expired
+
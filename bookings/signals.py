@@ -0,0 +1,106 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Destination, DestinationSummary, Package
+from . import caching, queue, search, summaries, tasks
+
+
+@receiver(post_save, sender=Package)
+def index_package(sender, instance, **kwargs):
+    """Keep the search index in step with package edits"""
+    search.index_packages(package_ids=[instance.id])
+
+
+@receiver(post_delete, sender=Package)
+def unindex_package(sender, instance, **kwargs):
+    search.remove_packages([instance.id])
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_save, sender=Destination)
+def invalidate_catalog_on_save(sender, instance, **kwargs):
+    # After commit, so no request can cache the old rows under the new stamp
+    transaction.on_commit(partial(caching.bump_catalog_stamp, instance.updated_at))
+
+
+@receiver(post_delete, sender=Package)
+@receiver(post_delete, sender=Destination)
+def invalidate_catalog_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(caching.bump_catalog_stamp)
+
+
+@receiver(pre_save, sender=Package)
+def remember_destination(sender, instance, raw=False, **kwargs):
+    """Note the destination a package is saved from, so a move can be told apart from an edit"""
+    instance.previous_destination_id = None
+    if not raw and not instance._state.adding:
+        instance.previous_destination_id = (
+            Package.objects.filter(id=instance.id).values_list('destination_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Package)
+def touch_destination_moved_from(sender, instance, **kwargs):
+    """The old destination's pages lose the package, which no remaining updated_at would show"""
+    previous = getattr(instance, 'previous_destination_id', None)
+    if previous is not None and previous != instance.destination_id:
+        Destination.objects.filter(id=previous).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Package)
+def touch_pages_listing_package(sender, instance, **kwargs):
+    """Deleting a package removes it from its destination and from the related lists of other packages.
+
+    Both vanish with the row, so their pages' last-modified times are moved
+    on before the delete cascades.
+    """
+    now = timezone.now()
+    Destination.objects.filter(id=instance.destination_id).update(updated_at=now)
+    Package.objects.filter(similar_packages__similar_id=instance.id).update(updated_at=now)
+
+
+@receiver(post_save, sender=Destination)
+def index_destination(sender, instance, created, **kwargs):
+    """Destination text is denormalized into every package row of the index"""
+    if not created:
+        search.index_packages(destination_id=instance.id)
+
+
+@receiver(post_save, sender=Package)
+def refresh_destination_summary(sender, instance, **kwargs):
+    summaries.refresh_destination(instance.destination_id)
+    previous = getattr(instance, 'previous_destination_id', None)
+    if previous is not None and previous != instance.destination_id:
+        # A moved package no longer counts towards the destination it left
+        summaries.refresh_destination(previous, create=False)
+
+
+@receiver(post_save, sender=Package)
+def refresh_recommendations(sender, instance, **kwargs):
+    """Queue a refresh of the neighbour lists the saved package can enter, leave or change"""
+    tasks.queue_recommendations_refresh(instance.id)
+
+
+@receiver(post_delete, sender=Package)
+def refresh_destination_summary_on_delete(sender, instance, **kwargs):
+    # The destination itself may be going away in the same cascade
+    summaries.refresh_destination(instance.destination_id, create=False)
+
+
+@receiver(post_save, sender=Destination)
+def create_destination_summary(sender, instance, created, **kwargs):
+    if created:
+        DestinationSummary.objects.get_or_create(destination=instance)
+
+
+@receiver(post_save, sender=Destination)
+def generate_image_variants(sender, instance, **kwargs):
+    """Queue rendering of derivatives for a new or replaced image; the task runs once the save commits"""
+    source = (instance.image_variants or {}).get('source')
+    if instance.image and instance.image.name != source:
+        queue.enqueue(tasks.generate_image_variants, instance.id)
+    elif not instance.image and source:
+        Destination.objects.filter(id=instance.id).update(image_variants={})
@@ -0,0 +1,15 @@
+'use strict';
+{
+    // Reload the changelist when an autocomplete filter is picked or cleared
+    const $ = django.jQuery;
+    $(document).on('change', 'select[data-filter-param]', function() {
+        const params = new URLSearchParams(window.location.search);
+        params.delete('p');
+        if (this.value) {
+            params.set(this.dataset.filterParam, this.value);
+        } else {
+            params.delete(this.dataset.filterParam);
+        }
+        window.location.search = params.toString();
+    });
+}
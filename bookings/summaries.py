@@ -0,0 +1,91 @@
+"""Maintenance of the per-destination ``DestinationSummary`` rows.
+
+Each refresh recomputes one destination from its own packages with a single
+grouped aggregate, so it stays cheap however large the catalog is. Bookings,
+cancellations and seat holds only move a package's seat count, which
+``apply_seat_change`` adds to the summary in place. ``rebuild`` recomputes
+every destination in batches.
+"""
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+from .models import Destination, DestinationSummary, Package
+
+EMPTY = {'min_price': None, 'available_packages': 0, 'available_seats': 0, 'next_departure': None}
+
+
+def aggregate(queryset):
+    """Summary figures for the available packages in ``queryset``"""
+    return queryset.filter(available_seats__gt=0).aggregate(
+        min_price=Min('price'),
+        available_packages=Count('id'),
+        available_seats=Sum('available_seats'),
+        next_departure=Min('departure_date'),
+    )
+
+
+def refresh_destination(destination_id, create=True):
+    """Recompute one destination's summary, creating the row if it is missing and ``create`` is set"""
+    figures = aggregate(Package.objects.filter(destination_id=destination_id))
+    figures['available_seats'] = figures['available_seats'] or 0
+    updated = DestinationSummary.objects.filter(destination_id=destination_id).update(
+        updated_at=timezone.now(), **figures
+    )
+    if not updated and create:
+        DestinationSummary.objects.create(destination_id=destination_id, **figures)
+
+
+def apply_seat_change(destination_id, change, available_changed=False):
+    """Add ``change`` seats (negative when taken) on one package to its destination's summary.
+
+    A package that sold out or came back on sale (``available_changed``) can
+    change every figure, so then, or when the summary row is missing, the
+    destination is recomputed instead.
+    """
+    if not available_changed:
+        updated = DestinationSummary.objects.filter(destination_id=destination_id).update(
+            available_seats=F('available_seats') + change, updated_at=timezone.now()
+        )
+        if updated:
+            return
+    refresh_destination(destination_id)
+
+
+def rebuild(batch_size=1000, destination_ids=None):
+    """Recompute every summary, or those of ``destination_ids``, returning the number written"""
+    packages = Package.objects.all()
+    destinations = Destination.objects.all()
+    if destination_ids is not None:
+        packages = packages.filter(destination_id__in=destination_ids)
+        destinations = destinations.filter(id__in=destination_ids)
+    rows = (
+        packages.filter(available_seats__gt=0)
+        .values('destination_id')
+        .order_by('destination_id')
+        .annotate(
+            min_price=Min('price'),
+            available_packages=Count('id'),
+            available_seats=Sum('available_seats'),
+            next_departure=Min('departure_date'),
+        )
+    )
+    figures = {row.pop('destination_id'): row for row in rows}
+    written = 0
+    batch = []
+    for destination_id in destinations.values_list('id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(DestinationSummary(destination_id=destination_id, **figures.get(destination_id, EMPTY)))
+        if len(batch) == batch_size:
+            written += _upsert(batch)
+            batch = []
+    if batch:
+        written += _upsert(batch)
+    return written
+
+
+def _upsert(summaries):
+    DestinationSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['destination'],
+        update_fields=['min_price', 'available_packages', 'available_seats', 'next_departure', 'updated_at'],
+    )
+    return len(summaries)
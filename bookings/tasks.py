@@ -0,0 +1,112 @@
+"""Background work run by ``manage.py run_tasks``"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.utils import timezone
+from .models import Booking, Task
+from .queue import enqueue, task
+from . import exports, images, recommendations
+
+
+def booking_for_email(booking_id):
+    return Booking.objects.select_related('package__destination', 'user').filter(id=booking_id).first()
+
+
+@task
+def send_booking_confirmation(booking_id):
+    """Email the booking contact a confirmation"""
+    booking = booking_for_email(booking_id)
+    if booking is None:
+        return
+    package = booking.package
+    send_mail(
+        f'Booking #{booking.id} received: {package.name}',
+        f'Hello {booking.user.get_full_name() or booking.user.username},\n\n'
+        f'We have received your booking for {package.name} in {package.destination.name}.\n'
+        f'Travel date: {booking.travel_date:%B %d, %Y}\n'
+        f'Travelers: {booking.number_of_travelers}\n'
+        f'Total: ${booking.total_price}\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [booking.contact_email],
+    )
+
+
+@task
+def send_cancellation_notice(booking_id):
+    """Email the booking contact that the booking was cancelled"""
+    booking = booking_for_email(booking_id)
+    if booking is None:
+        return
+    send_mail(
+        f'Booking #{booking.id} cancelled',
+        f'Your booking for {booking.package.name} on {booking.travel_date:%B %d, %Y} has been cancelled.\n',
+        settings.DEFAULT_FROM_EMAIL,
+        [booking.contact_email],
+    )
+
+
+@task
+def export_changelist(model_label, querystring, user_id, name, download_url):
+    """Write a large admin CSV export and email the requester its download link"""
+    model = apps.get_model(model_label)
+    user = User.objects.get(id=user_id)
+    count = exports.write_changelist(model, querystring, user, name)
+    if user.email:
+        send_mail(
+            f'Your {model._meta.verbose_name} export is ready',
+            f'{count} row(s) were exported. Download the file from {download_url}\n',
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+        )
+
+
+@task
+def generate_image_variants(destination_id):
+    """Render the derivatives of a destination's new or replaced image"""
+    images.process_destination(destination_id)
+
+
+@task
+def rebuild_recommendations():
+    """Recompute every package's similar-package list, then schedule the next rebuild"""
+    recommendations.rebuild()
+    # The periodic rebuild drops departed packages and picks up ones that became bookable again
+    schedule_recommendations_rebuild(delay=getattr(settings, 'RECOMMENDATIONS_REBUILD_HOURS', 24) * 3600)
+
+
+@task
+def refresh_recommendations(*package_ids):
+    """Recompute the lists saved packages can change, or queue a rebuild when there are too many"""
+    if len(package_ids) > recommendations.REFRESH_LIMIT or recommendations.refresh_for_packages(
+        package_ids, limit=recommendations.REFRESH_LIMIT
+    ) is None:
+        schedule_recommendations_rebuild()
+
+
+def queue_recommendations_refresh(package_id):
+    """Add a package to the queued refresh, or queue one, so a burst of saves shares one catalog scan"""
+    while True:
+        queued = Task.objects.filter(name=refresh_recommendations.task_name, status='queued').order_by('id').first()
+        if queued is None:
+            enqueue(refresh_recommendations, package_id)
+            return
+        if package_id in queued.args:
+            return
+        # Only succeeds if no worker claimed the task and no other save extended it meanwhile
+        if Task.objects.filter(id=queued.id, status='queued', args=queued.args).update(
+            args=queued.args + [package_id]
+        ):
+            return
+
+
+def schedule_recommendations_rebuild(delay=0):
+    """Queue a rebuild unless one is already queued to run within ``delay`` seconds"""
+    queued = Task.objects.filter(
+        name=rebuild_recommendations.task_name, status='queued',
+        run_at__lte=timezone.now() + timedelta(seconds=delay),
+    )
+    if not queued.exists():
+        enqueue(rebuild_recommendations, delay=delay)
@@ -0,0 +1,27 @@
+from django import template
+from django.utils.html import format_html
+
+from bookings import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(destination, variant, css_class='', alt='', style='', lazy=True):
+    """An <img> for one variant of a destination's image, with srcset when derivatives exist"""
+    if not destination.image:
+        return ''
+    loading = 'lazy' if lazy else 'eager'
+    rendition = images.srcset(destination.image_variants, variant)
+    if rendition is None:
+        # Not processed yet: fall back to the original
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" style="{}" loading="{}" decoding="async">',
+            destination.image.url, css_class, alt, style, loading,
+        )
+    src, srcset, width, height = rendition
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}" style="{}" '
+        'loading="{}" decoding="async">',
+        src, srcset, images.VARIANTS[variant][2], width, height, css_class, alt, style, loading,
+    )
@@ -1,3 +1,1538 @@
-from django.test import TestCase
+import json
+import tempfile
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.template.base import Template
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.http import http_date, urlencode
+from PIL import Image
+
+from . import admin, async_urls, caching, database, facets, images, pricing, queue, recommendations, routers, search, services, summaries, tasks, urls, views
+from .forms import PackageSearchForm
+from .models import Destination, DestinationSummary, Package, Booking, SeatHold, SimilarPackage, Task, UserProfile
+
+
+def make_package(destination=None, **kwargs):
+    if destination is None:
+        destination = Destination.objects.create(
+            name='Test Destination', description='Test', country='France', city='Paris'
+        )
+    defaults = {
+        'name': 'Test Package',
+        'description': 'Test',
+        'duration_days': 5,
+        'price': 100,
+        'available_seats': 10,
+        'departure_date': date.today() + timedelta(days=30),
+        'return_date': date.today() + timedelta(days=35),
+    }
+    defaults.update(kwargs)
+    return Package.objects.create(destination=destination, **defaults)
+
+
+def make_booking(user, package, **kwargs):
+    defaults = {
+        'travel_date': package.departure_date,
+        'number_of_travelers': 1,
+        'contact_phone': '555-0100',
+        'contact_email': 'test@example.com',
+    }
+    defaults.update(kwargs)
+    return Booking(user=user, package=package, **defaults)
+
+
+class ReservationServiceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.package = make_package(available_seats=3)
+
+    def test_create_booking_takes_seats(self):
+        booking = services.create_booking(make_booking(self.user, self.package, number_of_travelers=2))
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 1)
+        self.assertEqual(booking.total_price, 200)
+
+    def test_create_booking_rejects_when_sold_out(self):
+        with self.assertRaises(services.SeatsUnavailable):
+            services.create_booking(make_booking(self.user, self.package, number_of_travelers=4))
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 3)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_cancel_booking_releases_seats_once(self):
+        booking = services.create_booking(make_booking(self.user, self.package, number_of_travelers=2))
+        self.assertTrue(services.cancel_booking(booking))
+        self.assertFalse(services.cancel_booking(booking))
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 3)
+
+
+class SeatHoldTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.package = make_package(available_seats=5)
+
+    def test_hold_takes_seats_and_is_reused(self):
+        hold = services.hold_seats(self.user, self.package, seats=2)
+        again = services.hold_seats(self.user, self.package, seats=2)
+        self.assertEqual(hold.id, again.id)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 3)
+
+    def test_one_hold_per_user_and_package(self):
+        hold = services.hold_seats(self.user, self.package, seats=2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SeatHold.objects.create(user=self.user, package=self.package, expires_at=hold.expires_at)
+
+    def test_no_hold_is_left_when_seats_run_out(self):
+        self.assertIsNone(services.hold_seats(self.user, self.package, seats=6))
+        self.assertFalse(SeatHold.objects.exists())
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 5)
+
+    def test_booking_converts_hold(self):
+        hold = services.hold_seats(self.user, self.package, seats=2)
+        services.create_booking(make_booking(self.user, self.package, number_of_travelers=3), hold=hold)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 2)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_sweeper_releases_expired_holds_in_batches(self):
+        for i in range(5):
+            user = User.objects.create_user(f'user{i}')
+            services.hold_seats(user, self.package)
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(services.release_expired_holds(batch_size=2), 5)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 5)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_booking_page_holds_a_seat_until_submit(self):
+        self.client.force_login(self.user)
+        url = reverse('bookings:create_booking', args=[self.package.id])
+        self.client.get(url)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 4)
+        response = self.client.post(url, {
+            'travel_date': self.package.departure_date,
+            'number_of_travelers': 2,
+            'contact_phone': '555-0100',
+            'contact_email': 'test@example.com',
+        })
+        booking = Booking.objects.get()
+        self.assertRedirects(response, reverse('bookings:booking_detail', args=[booking.id]))
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.available_seats, 3)
+
+
+class PackageSearchTests(TestCase):
+    def setUp(self):
+        self.paris = make_package(name='City Lights')
+        self.tokyo = make_package(
+            Destination.objects.create(name='Tokyo Explorer', description='Test', country='Japan', city='Tokyo'),
+            name='Temple Tour',
+        )
+
+    def search(self, text):
+        return list(search.filter_packages(Package.objects.all(), text))
+
+    def test_matches_destination_text_by_prefix(self):
+        self.assertEqual(self.search('par'), [self.paris])
+        self.assertEqual(self.search('japan'), [self.tokyo])
+
+    def test_index_follows_destination_and_package_changes(self):
+        destination = self.tokyo.destination
+        destination.city = 'Kyoto'
+        destination.save()
+        self.assertEqual(self.search('kyoto'), [self.tokyo])
+        self.tokyo.delete()
+        self.assertEqual(self.search('kyoto'), [])
+
+    def test_package_list_uses_search(self):
+        response = self.client.get(reverse('bookings:package_list'), {'destination': 'tokyo'})
+        self.assertEqual(list(response.context['page_obj']), [self.tokyo])
+
+    def test_destination_fields_rank_first(self):
+        named = make_package(self.paris.destination, name='Tokyo Nights', departure_date=date.today())
+        self.assertEqual(self.search('tokyo'), [self.tokyo, named])
+
+    def test_fallback_searches_the_indexed_fields(self):
+        self.addCleanup(search.forget_availability, connection)
+        connection.fts_available = False
+        self.assertEqual(self.search('temple'), [self.tokyo])
+        self.assertEqual(self.search('japan tour'), [self.tokyo])
+        self.assertEqual(self.search('lights paris'), [self.paris])
+        self.assertEqual(self.search('tokyo paris'), [])
+
+    def test_availability_is_looked_up_again_on_a_new_connection(self):
+        connection.fts_available = False
+        search.probe_new_connections(sender=None, connection=connection)
+        self.assertTrue(search.is_available())
+
+
+@override_settings(PACKAGE_COUNT_CACHE_SECONDS=0)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        destination = Destination.objects.create(name='Lisbon', description='Test', country='Portugal', city='Lisbon')
+        # Pairs of packages share a departure date so the id tie-breaker matters
+        self.packages = [
+            make_package(destination, name=f'Package {i}', departure_date=date.today() + timedelta(days=i // 2))
+            for i in range(30)
+        ]
+
+    def test_pages_walk_forwards_and_backwards(self):
+        url = reverse('bookings:package_list')
+        seen = []
+        response = self.client.get(url)
+        self.assertEqual(response.context['total_packages'], 30)
+        pages = [response.context['page_obj']]
+        while pages[-1].has_next():
+            response = self.client.get(url, {'after': pages[-1].next_cursor})
+            pages.append(response.context['page_obj'])
+        for page in pages:
+            seen.extend(page)
+        self.assertEqual(seen, self.packages)
+        self.assertEqual([len(page) for page in pages], [12, 12, 6])
+
+        response = self.client.get(url, {'before': pages[-1].previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(pages[1]))
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get(reverse('bookings:package_list'), {'after': 'garbage'})
+        self.assertEqual(list(response.context['page_obj']), self.packages[:12])
+
+    def test_destination_list_pages_by_name(self):
+        # Shared names and underscores in them must not confuse the cursor
+        destinations = Destination.objects.bulk_create([
+            Destination(name=f'Stop_{i % 20}_x', description='Test', country='Test', city='Test') for i in range(40)
+        ])
+        expected = sorted(destinations + [Destination.objects.get(name='Lisbon')], key=lambda d: (d.name, d.id))
+        url = reverse('bookings:destination_list')
+        pages = [self.client.get(url).context['page_obj']]
+        while pages[-1].has_next():
+            pages.append(self.client.get(url, {'after': pages[-1].next_cursor}).context['page_obj'])
+        self.assertEqual([destination for page in pages for destination in page], expected)
+        response = self.client.get(url, {'before': pages[-1].previous_cursor})
+        self.assertEqual(list(response.context['page_obj']), list(pages[-2]))
+
+
+def populate_catalog(rows, user):
+    """Bulk create ``rows`` destinations, packages and bookings for query budget checks"""
+    destinations = Destination.objects.bulk_create([
+        Destination(name=f'Destination {i}', description='Test', country='France', city='Paris')
+        for i in range(rows)
+    ])
+    packages = Package.objects.bulk_create([
+        Package(
+            destination=destinations[0],
+            name=f'Package {i}',
+            description='Test',
+            duration_days=5,
+            price=100,
+            available_seats=rows + 10,
+            departure_date=date.today() + timedelta(days=30),
+            return_date=date.today() + timedelta(days=35),
+        )
+        for i in range(rows)
+    ])
+    bookings = Booking.objects.bulk_create([
+        make_booking(user, packages[i], total_price=100) for i in range(rows)
+    ])
+    summaries.rebuild()
+    recommendations.refresh_for_packages([packages[0].id], limit=0)
+    return destinations[0], packages[0], bookings[0]
+
+
+def consume(response):
+    """Read a response body, running the queries of streaming responses"""
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def route_requests(destination, package, booking):
+    """One request per route in bookings/urls.py, as (method, url)"""
+    return {
+        'home': ('get', reverse('bookings:home')),
+        'package_list': ('get', reverse('bookings:package_list')),
+        'package_detail': ('get', reverse('bookings:package_detail', args=[package.id])),
+        'create_booking': ('get', reverse('bookings:create_booking', args=[package.id])),
+        'booking_detail': ('get', reverse('bookings:booking_detail', args=[booking.id])),
+        'user_dashboard': ('get', reverse('bookings:user_dashboard')),
+        'cancel_booking': ('post', reverse('bookings:cancel_booking', args=[booking.id])),
+        'register': ('get', reverse('bookings:register')),
+        'destination_list': ('get', reverse('bookings:destination_list')),
+        'destination_detail': ('get', reverse('bookings:destination_detail', args=[destination.id])),
+        'package_export': ('get', reverse('bookings:package_export')),
+        'destination_availability': ('get', reverse('bookings:destination_availability', args=[destination.id])),
+        'profiling_stats': ('get', reverse('bookings:profiling_stats')),
+    }
+
+
+@override_settings(PACKAGE_COUNT_CACHE_SECONDS=0)
+class QueryBudgetTests(TestCase):
+    """Every route runs a fixed number of queries however many rows it shows"""
+
+    # Route name -> queries allowed, including session and user lookups
+    BUDGETS = {
+        'home': 4,
+        'package_list': 5,
+        'package_detail': 5,
+        'create_booking': 13,
+        'booking_detail': 3,
+        'user_dashboard': 5,
+        'cancel_booking': 10,
+        'register': 2,
+        'destination_list': 3,
+        'destination_detail': 5,
+        'package_export': 1,
+        'destination_availability': 4,
+        'profiling_stats': 2,
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def check_budgets(self, rows):
+        user = User.objects.create_user('traveler', password='secret')
+        self.client.force_login(user)
+        requests = route_requests(*populate_catalog(rows, user))
+        self.assertEqual(set(requests), {pattern.name for pattern in urls.urlpatterns})
+        for name, (method, url) in requests.items():
+            with self.subTest(route=name, rows=rows):
+                with self.assertNumQueries(self.BUDGETS[name]):
+                    consume(getattr(self.client, method)(url))
+
+    def test_one_row(self):
+        self.check_budgets(1)
+
+    def test_hundred_rows(self):
+        self.check_budgets(100)
+
+    def test_ten_thousand_rows(self):
+        self.check_budgets(10000)
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('agent', password='secret')
+        self.client.force_login(self.user)
+        package = make_package()
+        past = timezone.localdate() - timedelta(days=30)
+        statuses = ['confirmed'] * 25 + ['pending'] * 10 + ['cancelled'] * 4 + ['completed'] * 3
+        Booking.objects.bulk_create([
+            make_booking(
+                self.user, package, status=status, total_price=Decimal('100.00'),
+                travel_date=past if status == 'completed' else package.departure_date,
+            )
+            for status in statuses
+        ])
+        # Someone else's bookings never show up
+        Booking.objects.bulk_create([make_booking(User.objects.create_user('other'), package, total_price=1)])
+
+    def test_stats_and_pages(self):
+        response = self.client.get(reverse('bookings:user_dashboard'))
+        stats = response.context['stats']
+        self.assertEqual(stats['total'], 42)
+        self.assertEqual(stats['by_status'], {'pending': 10, 'confirmed': 25, 'cancelled': 4, 'completed': 3, 'expired': 0})
+        self.assertEqual(stats['spent'], Decimal('2800.00'))
+        self.assertEqual(stats['upcoming'], 35)
+        page = response.context['page_obj']
+        self.assertEqual((len(page), page.paginator.num_pages), (20, 3))
+        self.assertFalse(UserProfile.objects.exists())
+
+        response = self.client.get(reverse('bookings:user_dashboard') + '?status=pending&page=1')
+        page = response.context['page_obj']
+        self.assertEqual([booking.status for booking in page], ['pending'] * 10)
+        self.assertFalse(page.has_other_pages())
+
+        response = self.client.get(reverse('bookings:user_dashboard') + '?page=3')
+        dates = [booking.booking_date for booking in response.context['page_obj']]
+        self.assertEqual(len(dates), 2)
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_profile_is_created_on_first_save(self):
+        response = self.client.post(reverse('bookings:user_dashboard'), {'phone_number': '555-0199'})
+        self.assertRedirects(response, reverse('bookings:user_dashboard'))
+        self.assertEqual(UserProfile.objects.get(user=self.user).phone_number, '555-0199')
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.package = make_package(name='Seine Cruise')
+
+    def test_anonymous_pages_are_cached_until_the_catalog_changes(self):
+        url = reverse('bookings:package_detail', args=[self.package.id])
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.assertContains(self.client.get(url), 'Seine Cruise')
+        self.package.name = 'Loire Valley'
+        self.package.save()
+        self.assertContains(self.client.get(url), 'Loire Valley')
+
+    def test_destination_save_invalidates_listing(self):
+        url = reverse('bookings:destination_list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        destination = self.package.destination
+        destination.name = 'Renamed Destination'
+        stamp = caching.catalog_stamp()
+        with self.captureOnCommitCallbacks(execute=True):
+            destination.save()
+            # Until the edit commits, other requests still read the old row
+            self.assertEqual(caching.catalog_stamp(), stamp)
+        self.assertContains(self.client.get(url), 'Renamed Destination')
+
+    def test_selling_out_and_restocking_invalidate_listings(self):
+        stamp = caching.catalog_stamp()
+        with self.captureOnCommitCallbacks(execute=True):
+            services.reserve_seats(self.package.id, 3)
+        self.assertEqual(caching.catalog_stamp(), stamp)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.reserve_seats(self.package.id, 7)
+        sold_out = caching.catalog_stamp()
+        self.assertNotEqual(sold_out, stamp)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.release_seats(self.package.id, 2)
+        restocked = caching.catalog_stamp()
+        self.assertNotEqual(restocked, sold_out)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.release_seats(self.package.id, 2)
+        self.assertEqual(caching.catalog_stamp(), restocked)
+
+    def test_concurrent_misses_build_once(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'page'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(caching.get_or_build('test:key', build, timeout=60)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['page'] * 10)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.package = make_package(name='Seine Cruise')
+        self.neighbour = make_package(destination=self.package.destination, name='Loire Castles')
+        queue.run_pending()
+        self.url = reverse('bookings:package_detail', args=[self.package.id])
+
+    def test_unchanged_page_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.content, b'')
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        revalidated = self.client.get(self.url, headers={'if-modified-since': response['Last-Modified']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_edits_to_the_page_content_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        # The neighbour is listed under related packages
+        self.neighbour.price = Decimal('99.00')
+        self.neighbour.save()
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        destination_url = reverse('bookings:destination_detail', args=[self.package.destination_id])
+        etag = self.client.get(destination_url)['ETag']
+        self.package.destination.description = 'Updated'
+        self.package.destination.save()
+        self.assertEqual(self.client.get(destination_url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_deleting_or_moving_a_package_changes_the_etag(self):
+        older = make_package(self.package.destination, name='Old Mill')
+        moved = make_package(self.package.destination, name='Canal Walk')
+        Package.objects.filter(id__in=[older.id, moved.id]).update(updated_at=timezone.now() - timedelta(days=1))
+        queue.run_pending()
+        destination_url = reverse('bookings:destination_detail', args=[self.package.destination_id])
+        neighbour_url = reverse('bookings:package_detail', args=[self.neighbour.id])
+        self.assertTrue(SimilarPackage.objects.filter(package=self.neighbour, similar=older).exists())
+        etags = {url: self.client.get(url)['ETag'] for url in (destination_url, neighbour_url)}
+        older.delete()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+        etag = self.client.get(destination_url)['ETag']
+        moved.destination = Destination.objects.create(
+            name='Elsewhere', description='Test', country='Spain', city='Seville'
+        )
+        moved.save()
+        self.assertEqual(self.client.get(destination_url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_logged_in_pages_are_private_and_validated_separately(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.force_login(User.objects.create_user('traveler', password='secret'))
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get(self.url, headers={'if-none-match': response['ETag']}).status_code, 304)
+
+    async def test_async_views_answer_conditional_requests(self):
+        response = await self.async_client.get(self.url)
+        revalidated = await self.async_client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+        response = await self.async_client.get(reverse('bookings:destination_detail', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class DestinationSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.cheap = make_package(price=500, available_seats=4)
+        self.destination = self.cheap.destination
+        self.dear = make_package(
+            self.destination, price=900, available_seats=6, departure_date=date.today() + timedelta(days=10)
+        )
+
+    def summary(self):
+        return DestinationSummary.objects.get(destination=self.destination)
+
+    def test_summary_follows_package_changes(self):
+        summary = self.summary()
+        self.assertEqual(summary.min_price, 500)
+        self.assertEqual(summary.available_packages, 2)
+        self.assertEqual(summary.available_seats, 10)
+        self.assertEqual(summary.next_departure, self.dear.departure_date)
+        self.dear.delete()
+        self.assertEqual(self.summary().available_packages, 1)
+
+    def test_summary_follows_bookings(self):
+        booking = services.create_booking(make_booking(self.user, self.cheap, number_of_travelers=4))
+        summary = self.summary()
+        self.assertEqual(summary.min_price, 900)
+        self.assertEqual(summary.available_seats, 6)
+        services.cancel_booking(booking)
+        self.assertEqual(self.summary().min_price, 500)
+
+    def test_moving_a_package_refreshes_both_destinations(self):
+        other = Destination.objects.create(name='Porto', description='Test', country='Portugal', city='Porto')
+        self.cheap.destination = other
+        self.cheap.save()
+        summary = self.summary()
+        self.assertEqual((summary.available_packages, summary.available_seats, summary.min_price), (1, 6, 900))
+        moved = DestinationSummary.objects.get(destination=other)
+        self.assertEqual((moved.available_packages, moved.available_seats, moved.min_price), (1, 4, 500))
+
+    def test_seat_changes_update_the_summary_in_place(self):
+        with self.assertNumQueries(3):
+            self.assertTrue(services.reserve_seats(self.dear.id, 2))
+        self.assertEqual(self.summary().available_seats, 8)
+        services.release_seats(self.dear.id, 1)
+        services.reserve_seats(self.cheap.id, 4)
+        services.release_seats(self.cheap.id, 4)
+        incremental = DestinationSummary.objects.values().get(destination=self.destination)
+        summaries.rebuild()
+        rebuilt = DestinationSummary.objects.values().get(destination=self.destination)
+        incremental.pop('updated_at'), rebuilt.pop('updated_at')
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(rebuilt['available_seats'], 9)
+
+    def test_rebuild_matches_incremental_summary(self):
+        DestinationSummary.objects.update(available_packages=0, min_price=None)
+        self.assertEqual(summaries.rebuild(batch_size=1), 1)
+        self.assertEqual(self.summary().available_packages, 2)
+        self.assertEqual(self.summary().min_price, 500)
+
+    def test_deleting_destination_cascades(self):
+        self.destination.delete()
+        self.assertFalse(DestinationSummary.objects.exists())
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        destination = Destination.objects.create(name='Oslo', description='Test', country='Norway', city='Oslo')
+        departure = date(2030, 1, 15)
+        make_package(destination, name='Short', package_type='basic', price=300, duration_days=3, departure_date=departure)
+        make_package(destination, name='Week', package_type='basic', price=800, duration_days=6, departure_date=departure)
+        make_package(
+            destination, name='Grand', package_type='luxury', price=6000, duration_days=10,
+            departure_date=departure + timedelta(days=40),
+        )
+        make_package(destination, name='Sold Out', package_type='luxury', price=6000, duration_days=10, available_seats=0)
+
+    def test_counts_every_facet_in_one_query(self):
+        with self.assertNumQueries(1):
+            counts = facets.count_facets(PackageSearchForm({}), Package.objects.filter(available_seats__gt=0))
+        self.assertEqual(counts['package_type'], {'basic': 2, 'luxury': 1})
+        self.assertEqual(counts['price_bucket'], {0: 1, 1: 1, 4: 1})
+        self.assertEqual(counts['duration_bucket'], {0: 1, 1: 1, 2: 1})
+        self.assertEqual(counts['month'], {date(2030, 1, 1): 2, date(2030, 2, 1): 1})
+
+    def test_package_list_facets_follow_filters_and_are_cached(self):
+        url = reverse('bookings:package_list')
+        response = self.client.get(url, {'package_type': 'basic'})
+        # The type facet ignores its own filter, so the other type stays selectable
+        self.assertEqual([option['count'] for option in response.context['facets']['package_type']], [2, 1])
+        self.assertEqual([option['count'] for option in response.context['facets']['price']], [1, 1])
+        key = f'facets:{caching.catalog_stamp()}:{facets.filter_key(response.context["search_form"])}'
+        self.assertIsNotNone(cache.get(key))
+        response = self.client.get(url, {'destination': 'norway'})
+        self.assertEqual([option['count'] for option in response.context['facets']['package_type']], [2, 1])
+
+    def test_month_facets_select_as_many_packages_as_they_count(self):
+        url = reverse('bookings:package_list')
+        months = self.client.get(url).context['facets']['month']
+        self.assertEqual([option['count'] for option in months], [2, 1])
+        for option in months:
+            response = self.client.get(f'{url}?{option["query"]}')
+            self.assertEqual(response.context['total_packages'], option['count'], option['label'])
+
+    def test_a_facet_is_counted_without_its_own_filter(self):
+        form = PackageSearchForm({'package_type': 'basic', 'min_price': 500, 'max_price': 999.99})
+        with self.assertNumQueries(3):
+            counts = facets.count_facets(form, Package.objects.filter(available_seats__gt=0))
+        self.assertEqual(counts['package_type'], {'basic': 1})
+        self.assertEqual(counts['price_bucket'], {0: 1, 1: 1})
+        self.assertEqual(counts['duration_bucket'], {1: 1})
+        self.assertEqual(counts['month'], {date(2030, 1, 1): 1})
+
+    def test_search_pages_keep_every_filter(self):
+        destination = Destination.objects.get(name='Oslo')
+        for index in range(12):
+            make_package(destination, name=f'Extra {index}', duration_days=5, departure_date=date(2030, 1, 20))
+        params = {'destination': 'oslo', 'departure_month': '2030-01-01', 'duration_min': 4, 'duration_max': 7}
+        url = reverse('bookings:package_list')
+        self.assertEqual(self.client.get(url, params).context['total_packages'], 13)
+        next_page = f'?{urlencode({**params, "page": 2})}'
+        self.assertContains(self.client.get(url, params), f'href="{escape(next_page)}"')
+        response = self.client.get(f'{url}{next_page}')
+        self.assertEqual((response.context['total_packages'], response.context['page_obj'].number), (13, 2))
+
+    def test_filter_key_ignores_blank_fields_and_spacing(self):
+        first = PackageSearchForm({'destination': '  New   York', 'min_price': ''})
+        second = PackageSearchForm({'destination': 'new york'})
+        self.assertEqual(facets.filter_key(first), facets.filter_key(second))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN checks are SQLite specific')
+@override_settings(PACKAGE_COUNT_CACHE_SECONDS=0)
+class QueryPlanTests(TestCase):
+    """No query issued by a view may read every row of a table, with or without an index"""
+
+    # A plan step walking a table or one of its indexes, except an FTS5 MATCH lookup
+    SCAN = re.compile(r'^SCAN (\w+)\b(?! VIRTUAL TABLE INDEX \d+:M)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+    # Tables small enough by design that reading them whole is fine
+    SMALL_TABLES = {'django_content_type', 'django_site'}
+
+    # Partial indexes holding only available packages. The catalog count and
+    # facets, both cached, and the export read them whole on purpose.
+    CATALOG_INDEXES = {'package_avail_departure_idx', 'package_destination_avail_idx'}
+    CATALOG_ROUTES = {'package_export'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.client.force_login(self.user)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def allowed_scan(self, route, sql, steps, table, index):
+        if table in self.SMALL_TABLES:
+            return True
+        # An index walk in the ORDER BY's order stops after LIMIT rows
+        if index and ' LIMIT ' in sql and not any('TEMP B-TREE FOR ORDER BY' in step for step in steps):
+            return True
+        whole_catalog = route in self.CATALOG_ROUTES or sql.startswith('SELECT COUNT(*)') or ' GROUP BY ' in sql
+        return whole_catalog and index in self.CATALOG_INDEXES
+
+    def test_view_queries_use_indexes(self):
+        destination, package, booking = populate_catalog(50, self.user)
+        requests = route_requests(destination, package, booking)
+        requests['package_search'] = ('get', reverse('bookings:package_list') + '?destination=paris&package_type=basic')
+        requests['package_page_two'] = ('get', reverse('bookings:package_list') + f'?after={package.departure_date}_{package.id}')
+        cursor = urlencode({'after': f'{destination.name}_{destination.id}'})
+        requests['destination_page_two'] = ('get', reverse('bookings:destination_list') + f'?{cursor}')
+        for name, (method, url) in requests.items():
+            with CaptureQueriesContext(connection) as queries:
+                consume(getattr(self.client, method)(url))
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                steps = self.plan(sql)
+                for step in steps:
+                    scan = self.SCAN.match(step)
+                    with self.subTest(route=name, sql=sql):
+                        allowed = scan is None or self.allowed_scan(name, sql, steps, *scan.groups())
+                        self.assertTrue(allowed, f'{step} in {sql}')
+
+    def test_scans_are_caught(self):
+        for step in ('SCAN bookings_package', 'SCAN bookings_destination USING INDEX destination_name_idx',
+                     'SCAN bookings_booking USING COVERING INDEX booking_user_stats_idx'):
+            self.assertIsNotNone(self.SCAN.match(step))
+        self.assertIsNone(self.SCAN.match('SCAN bookings_package_fts VIRTUAL TABLE INDEX 0:M5'))
+        sql = 'SELECT * FROM bookings_destination ORDER BY name'
+        self.assertFalse(self.allowed_scan('destination_list', sql, [], 'bookings_destination', 'destination_name_idx'))
+
+
+class PackageExportTests(TestCase):
+    def setUp(self):
+        destination = Destination.objects.create(name='Cairo Nights', description='Test', country='Egypt', city='Cairo')
+        self.packages = [
+            make_package(destination, name=f'Nile {i}', departure_date=date.today() + timedelta(days=i))
+            for i in range(3)
+        ]
+        make_package(destination, name='Sold Out', available_seats=0)
+
+    def test_streams_ndjson_in_departure_order(self):
+        response = self.client.get(reverse('bookings:package_export'))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in consume(response).decode().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Nile 0', 'Nile 1', 'Nile 2'])
+        self.assertEqual(rows[0]['destination']['city'], 'Cairo')
+
+    def test_json_array_with_filters(self):
+        response = self.client.get(reverse('bookings:package_export'), {'format': 'json', 'destination': 'egypt'})
+        self.assertEqual(len(json.loads(consume(response))), 3)
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get(reverse('bookings:package_export'), {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_streams_from_an_async_iterator_under_asgi(self):
+        for params, count in (({}, 3), ({'format': 'json', 'destination': 'egypt'}, 3)):
+            response = await self.async_client.get(reverse('bookings:package_export'), params)
+            self.assertIs(response.resolver_match.func, views.apackage_export)
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+            rows = json.loads(content) if params else [json.loads(line) for line in content.splitlines()]
+            self.assertEqual([row['name'] for row in rows], [f'Nile {i}' for i in range(count)])
+
+
+class ImportCatalogTests(TestCase):
+    def write(self, name, content):
+        path = Path(self.directory.name) / name
+        path.write_text(content)
+        return str(path)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_imports_and_upserts_in_batches(self):
+        destinations = self.write('destinations.csv', 'name,description,country,city\nFjords,Cold,Norway,Bergen\n')
+        packages = self.write('packages.jsonl', ''.join(
+            json.dumps({
+                'destination': 'Fjords', 'name': f'Cruise {i}', 'description': 'Boat', 'duration_days': 4,
+                'price': '1200.00', 'max_travelers': 8, 'departure_date': '2030-06-01',
+                'return_date': '2030-06-05', 'includes_meals': 'yes',
+            }) + '\n'
+            for i in range(5)
+        ) + json.dumps({'destination': 'Atlantis', 'name': 'Lost'}) + '\n')
+        call_command('import_catalog', destinations=destinations, packages=packages, batch_size=2, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Package.objects.count(), 5)
+        self.assertEqual(Package.objects.filter(includes_meals=True, available_seats=8).count(), 5)
+        self.assertEqual(DestinationSummary.objects.get().available_packages, 5)
+        self.assertEqual(len(search.filter_packages(Package.objects.all(), 'bergen')), 5)
+        # The recommendations rebuild is left to a worker
+        self.assertFalse(SimilarPackage.objects.exists())
+        rebuilds = Task.objects.filter(name=tasks.rebuild_recommendations.task_name, status='queued')
+        self.assertEqual(rebuilds.count(), 1)
+        queue.run_pending()
+        self.assertEqual(SimilarPackage.objects.count(), 20)
+
+        # Re-importing updates in place and keeps seats that were booked
+        Package.objects.update(available_seats=1)
+        updated = self.write('update.csv', (
+            'destination,name,description,duration_days,price,max_travelers,departure_date,return_date\n'
+            'Fjords,Cruise 0,Boat,4,999.00,8,2030-06-01,2030-06-05\n'
+        ))
+        call_command('import_catalog', packages=updated, stdout=StringIO())
+        self.assertEqual(Package.objects.count(), 5)
+        cruise = Package.objects.get(name='Cruise 0')
+        self.assertEqual(cruise.price, Decimal('999.00'))
+        self.assertEqual(cruise.available_seats, 1)
+
+        # Rows with and without seats in one batch only overwrite the seats they give
+        mixed = self.write('mixed.jsonl', ''.join(json.dumps({
+            'destination': 'Fjords', 'name': f'Cruise {i}', 'description': 'Boat', 'duration_days': 4,
+            'price': '999.00', 'max_travelers': 8, 'departure_date': '2030-06-01', 'return_date': '2030-06-05',
+            **({'available_seats': 6} if i == 1 else {}),
+        }) + '\n' for i in range(3)))
+        call_command('import_catalog', packages=mixed, stdout=StringIO())
+        seats = dict(Package.objects.filter(name__startswith='Cruise').values_list('name', 'available_seats'))
+        self.assertEqual(seats, {'Cruise 0': 1, 'Cruise 1': 6, 'Cruise 2': 1, 'Cruise 3': 1, 'Cruise 4': 1})
+
+
+class AsyncViewTests(TestCase):
+    """ASGI requests get the async catalog views, which never touch the ORM synchronously"""
+
+    def setUp(self):
+        cache.clear()
+        self.package = make_package(name='Seine Cruise')
+        self.destination = self.package.destination
+
+    def urls(self):
+        return [
+            reverse('bookings:home'),
+            reverse('bookings:package_list'),
+            reverse('bookings:package_list') + '?destination=paris',
+            reverse('bookings:package_list') + '?destination=seine&page=2',
+            reverse('bookings:package_detail', args=[self.package.id]),
+            reverse('bookings:destination_list'),
+            reverse('bookings:destination_detail', args=[self.destination.id]),
+        ]
+
+    async def test_anonymous_and_logged_in(self):
+        user = await User.objects.acreate_user('traveler', password='secret')
+        for login in (False, True):
+            if login:
+                await self.async_client.aforce_login(user)
+            for url in self.urls():
+                with self.subTest(url=url, login=login):
+                    response = await self.async_client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertIn(response.resolver_match.func, async_urls.ASYNC_VIEWS.values())
+                    self.assertContains(response, 'Logout' if login else 'Login')
+
+    async def test_missing_objects_are_404(self):
+        for name in ('package_detail', 'destination_detail'):
+            response = await self.async_client.get(reverse(f'bookings:{name}', args=[999999]))
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], CATALOG_CACHE_SECONDS=0)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Catalog pages read from the replica unless the client has just written.
+
+    The replica mirrors the primary's test database, so the replica only
+    sees committed rows and the tests check which connection ran the reads.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.package = make_package(name='Seine Cruise')
+
+    def replica_reads(self, url):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.assertContains(self.client.get(url), 'Test Destination')
+        return len(queries)
+
+    def test_catalog_reads_use_replica(self):
+        self.assertGreater(self.replica_reads(reverse('bookings:destination_list')), 0)
+
+    def test_writer_is_pinned_to_primary(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('bookings:create_booking', args=[self.package.id]), {
+            'travel_date': self.package.departure_date,
+            'number_of_travelers': 1,
+            'contact_phone': '555-0100',
+            'contact_email': 'test@example.com',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.replica_reads(reverse('bookings:destination_list')), 0)
+
+        # Once the window has passed reads go back to the replica
+        self.client.cookies[routers.PIN_COOKIE] = str(time.time() - 1)
+        self.assertGreater(self.replica_reads(reverse('bookings:destination_list')), 0)
+
+    def test_reads_outside_requests_use_primary(self):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.assertEqual(Destination.objects.count(), 1)
+        self.assertEqual(len(queries), 0)
+
+
+class BookingSweeperTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.package = make_package(available_seats=10)
+        self.departed = make_package(
+            self.package.destination, name='Departed', available_seats=10,
+            departure_date=date.today() - timedelta(days=10), return_date=date.today() - timedelta(days=3),
+        )
+
+    def book(self, package, status='pending', travelers=1):
+        booking = services.create_booking(make_booking(self.user, package, number_of_travelers=travelers))
+        Booking.objects.filter(id=booking.id).update(status=status)
+        return booking
+
+    def status(self, booking):
+        return Booking.objects.values_list('status', flat=True).get(id=booking.id)
+
+    def test_finished_trips_are_completed(self):
+        finished = self.book(self.departed, 'confirmed')
+        upcoming = self.book(self.package, 'confirmed')
+        self.assertEqual(services.complete_finished_bookings(batch_size=1), 1)
+        self.assertEqual((self.status(finished), self.status(upcoming)), ('completed', 'confirmed'))
+
+    @override_settings(PENDING_BOOKING_DAYS=7)
+    def test_stale_pending_bookings_expire_and_return_seats(self):
+        departed = [self.book(self.departed, travelers=2) for _ in range(3)]
+        stale = self.book(self.package, travelers=3)
+        fresh = self.book(self.package, travelers=1)
+        Booking.objects.filter(id=stale.id).update(booking_date=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(services.expire_pending_bookings(batch_size=2), 4)
+        self.assertEqual([self.status(booking) for booking in departed + [stale, fresh]], ['expired'] * 4 + ['pending'])
+        self.package.refresh_from_db()
+        self.departed.refresh_from_db()
+        self.assertEqual((self.package.available_seats, self.departed.available_seats), (9, 10))
+        self.assertEqual(DestinationSummary.objects.get(destination=self.package.destination).available_seats, 19)
+        # An expired booking can no longer be cancelled for a second refund
+        self.assertFalse(services.cancel_booking(stale))
+        self.assertEqual(services.expire_pending_bookings(), 0)
+
+    @override_settings(PENDING_BOOKING_DAYS=7)
+    def test_expiring_the_last_seats_puts_a_package_back_on_sale(self):
+        sold_out = make_package(self.package.destination, name='Sold out', available_seats=2)
+        booking = self.book(sold_out, travelers=2)
+        Booking.objects.filter(id=booking.id).update(booking_date=timezone.now() - timedelta(days=8))
+        Task.objects.all().delete()
+        stamp = caching.catalog_stamp()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(services.expire_pending_bookings(), 1)
+        self.assertNotEqual(caching.catalog_stamp(), stamp)
+        queued = Task.objects.get(name=tasks.refresh_recommendations.task_name, status='queued')
+        self.assertEqual(queued.args, [sold_out.id])
+
+    def test_old_pending_bookings_wait_for_departure_by_default(self):
+        departed = self.book(self.departed)
+        old = self.book(self.package)
+        Booking.objects.filter(id=old.id).update(booking_date=timezone.now() - timedelta(days=30))
+        self.assertEqual(services.expire_pending_bookings(), 1)
+        self.assertEqual((self.status(departed), self.status(old)), ('expired', 'pending'))
+
+
+class AvailabilityCalendarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.start = date.today() + timedelta(days=10)
+        self.first = make_package(
+            price=300, available_seats=4,
+            departure_date=self.start, return_date=self.start + timedelta(days=3),
+        )
+        self.destination = self.first.destination
+        self.second = make_package(
+            self.destination, name='Second', price=200, available_seats=6,
+            departure_date=self.start + timedelta(days=2), return_date=self.start + timedelta(days=5),
+        )
+        make_package(
+            self.destination, name='Sold Out', price=50, available_seats=0,
+            departure_date=self.start, return_date=self.start + timedelta(days=5),
+        )
+        self.url = reverse('bookings:destination_availability', args=[self.destination.id])
+
+    def days(self, **params):
+        response = self.client.get(self.url, {'start': self.start, 'end': self.start + timedelta(days=6), **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['days']
+
+    def test_sweep_counts_overlapping_trips(self):
+        days = self.days()
+        self.assertEqual([day['packages'] for day in days], [1, 1, 2, 2, 1, 1, 0])
+        self.assertEqual([day['seats'] for day in days], [4, 4, 10, 10, 6, 6, 0])
+        self.assertEqual([day['min_price'] for day in days], ['300.00', '300.00', '200.00', '200.00', '200.00', '200.00', None])
+        self.assertEqual(days[0]['departures'], [self.first.id])
+        self.assertEqual(days[2]['departures'], [self.second.id])
+        self.assertEqual(days[0]['date'], self.start.isoformat())
+
+    def test_trips_starting_before_the_range_are_included(self):
+        days = self.days(start=self.start + timedelta(days=3))
+        self.assertEqual(days[0]['packages'], 2)
+        self.assertEqual(days[0]['departures'], [])
+
+    def test_bad_dates_and_unknown_destinations(self):
+        self.assertEqual(self.client.get(self.url, {'start': 'tomorrow'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2030-02-30'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2030-01-02', 'end': '2030-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'start': '2030-01-01', 'end': '2031-06-01'}).status_code, 400)
+        missing = reverse('bookings:destination_availability', args=[self.destination.id + 100])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+        # Errors carry no validators, so they are never revalidated or shared
+        response = self.client.get(self.url, {'start': 'tomorrow'})
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Cache-Control', response)
+
+    def test_each_range_has_its_own_validators(self):
+        first = self.client.get(self.url, {'start': self.start})
+        later = self.client.get(self.url, {'start': self.start + timedelta(days=1)})
+        self.assertNotEqual(first['ETag'], later['ETag'])
+        revalidated = self.client.get(self.url, {'start': self.start}, headers={'if-none-match': later['ETag']})
+        self.assertEqual(revalidated.status_code, 200)
+        # The default range starts today, so its validators change at midnight
+        past = timezone.now() - timedelta(days=2)
+        Destination.objects.filter(id=self.destination.id).update(updated_at=past)
+        Package.objects.filter(destination=self.destination).update(updated_at=past)
+        midnight = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+        self.assertEqual(self.client.get(self.url)['Last-Modified'], http_date(midnight.timestamp()))
+
+    def test_cached_until_seats_change(self):
+        self.days()
+        # Only the last-modified lookup runs on a cache hit
+        with self.assertNumQueries(1):
+            self.days()
+        user = User.objects.create_user('traveler', password='secret')
+        services.create_booking(make_booking(user, self.first, number_of_travelers=3, travel_date=self.start))
+        self.assertEqual(self.days()[0]['seats'], 1)
+
+    def test_deleted_and_moved_packages_leave_the_calendar(self):
+        params = {'start': self.start, 'end': self.start + timedelta(days=6)}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.json()['days'][2]['seats'], 10)
+        self.second.destination = Destination.objects.create(
+            name='Elsewhere', description='Test', country='Spain', city='Seville'
+        )
+        self.second.save()
+        moved = self.client.get(self.url, params, headers={'if-none-match': response['ETag']})
+        self.assertEqual(moved.status_code, 200)
+        self.assertEqual(moved.json()['days'][2]['seats'], 4)
+        self.first.delete()
+        deleted = self.client.get(self.url, params, headers={'if-none-match': moved['ETag']})
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(deleted.json()['days'][2]['seats'], 0)
+
+
+class PricingTests(TestCase):
+    RULES = [
+        {'NAME': 'bookings.pricing.GroupDiscount', 'OPTIONS': {'tiers': {4: 0.05, 8: 0.10}}},
+        {'NAME': 'bookings.pricing.SeasonalPricing', 'OPTIONS': {'months': {7: 0.20, 1: -0.10}}},
+        {'NAME': 'bookings.pricing.PackageTypeSurcharge', 'OPTIONS': {'rates': {'luxury': 0.10}}},
+    ]
+
+    def test_rules_apply_across_a_batch(self):
+        rows = [
+            (100, 'basic', date(2030, 3, 1)),
+            (100, 'basic', date(2030, 7, 31)),
+            (100, 'luxury', date(2030, 1, 15)),
+            (99.99, 'luxury', date(2030, 7, 1)),
+        ]
+        with self.settings(PRICING_RULES=self.RULES):
+            self.assertEqual(pricing.quote_totals(rows, 1), [100, 120, 99, Decimal('131.99')])
+            self.assertEqual(pricing.quote_totals(rows, [3, 4, 8, 1]), [300, 456, Decimal('712.80'), Decimal('131.99')])
+            # Quoting one at a time gives the same totals
+            self.assertEqual([pricing.quote_total(row, 8) for row in rows], pricing.quote_totals(rows, 8))
+        with self.settings(PRICING_RULES=[]):
+            self.assertEqual(pricing.quote_totals(rows, 3), [300, 300, 300, Decimal('299.97')])
+        self.assertEqual(pricing.quote_totals([], 2), [])
+
+    def test_quotes_match_decimal_arithmetic(self):
+        def rounded(value):
+            return value.quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+        prices = [Decimal(cents).scaleb(-2) for cents in range(1, 200000)]
+        with self.settings(PRICING_RULES=self.RULES[:1]):
+            quoted = pricing.quote_totals([(price, 'basic', date(2030, 3, 1)) for price in prices], 4)
+        self.assertEqual(quoted, [rounded(price * Decimal('0.95')) * 4 for price in prices])
+        # Each rule rounds its own result, in order
+        with self.settings(PRICING_RULES=self.RULES):
+            quoted = pricing.quote_totals([(price, 'luxury', date(2030, 7, 1)) for price in prices], 4)
+        self.assertEqual(quoted, [
+            rounded(rounded(rounded(price * Decimal('0.95')) * Decimal('1.20')) * Decimal('1.10')) * 4
+            for price in prices
+        ])
+        with self.assertRaises(ImproperlyConfigured):
+            pricing.GroupDiscount({4: 0.00001})
+
+    def test_bookings_are_charged_the_quote(self):
+        package = make_package(available_seats=10, departure_date=date(2030, 3, 1), return_date=date(2030, 3, 6))
+        user = User.objects.create_user('traveler', password='secret')
+        with self.settings(PRICING_RULES=self.RULES):
+            booking = services.create_booking(make_booking(user, package, number_of_travelers=4))
+        self.assertEqual(booking.total_price, 380)
+
+    def test_package_list_shows_party_totals(self):
+        cache.clear()
+        destination = make_package(name='Roomy', available_seats=10).destination
+        make_package(destination, name='Nearly Full', available_seats=2)
+        with self.settings(PRICING_RULES=self.RULES[:1]):
+            response = self.client.get(reverse('bookings:package_list'), {'travelers': 4})
+        self.assertEqual([package.name for package in response.context['page_obj']], ['Roomy'])
+        self.assertContains(response, '4 travelers')
+        self.assertContains(response, '$380.00')
+
+    def test_booking_form_lists_totals_per_party_size(self):
+        package = make_package(available_seats=5)
+        self.client.force_login(User.objects.create_user('traveler', password='secret'))
+        with self.settings(PRICING_RULES=self.RULES[:1]):
+            response = self.client.get(reverse('bookings:create_booking', args=[package.id]))
+        self.assertEqual(response.context['party_totals'], {1: '100.00', 2: '200.00', 3: '300.00', 4: '380.00', 5: '475.00'})
+        self.assertContains(response, 'id="party-totals"')
+        # Large packages are quoted up to the party size a booking may have
+        roomy = make_package(package.destination, name='Roomy', available_seats=500, max_travelers=8)
+        response = self.client.get(reverse('bookings:create_booking', args=[roomy.id]))
+        self.assertEqual(list(response.context['party_totals']), list(range(1, 9)))
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        paris = Destination.objects.create(name='Paris', description='Test', country='France', city='Paris')
+        nice = Destination.objects.create(name='Nice', description='Test', country='France', city='Nice')
+        tokyo = Destination.objects.create(name='Tokyo', description='Test', country='Japan', city='Tokyo')
+        self.package = make_package(paris, name='Paris Week', price=1000, duration_days=7)
+        self.same_city = make_package(paris, name='Paris Luxury', price=3000, package_type='luxury', duration_days=7)
+        self.same_country = make_package(nice, name='Riviera Week', price=1100, duration_days=7)
+        self.abroad = make_package(tokyo, name='Tokyo Week', price=1000, duration_days=7)
+        self.sold_out = make_package(paris, name='Paris Sold Out', price=1000, duration_days=7, available_seats=0)
+        queue.run_pending()
+
+    def lists(self):
+        return {
+            package_id: list(SimilarPackage.objects.filter(package_id=package_id).values_list('similar_id', flat=True))
+            for package_id in Package.objects.values_list('id', flat=True)
+        }
+
+    def test_nearest_available_packages_first(self):
+        self.assertEqual(
+            list(recommendations.similar_packages(self.package.id)),
+            [self.same_country, self.abroad, self.same_city],
+        )
+        # Sold out packages are left out, but get recommendations of their own
+        self.assertEqual(recommendations.similar_packages(self.sold_out.id)[0], self.package)
+        response = self.client.get(reverse('bookings:package_detail', args=[self.package.id]))
+        self.assertEqual(list(response.context['related_packages']), [self.same_country, self.abroad, self.same_city])
+
+    def test_saves_keep_lists_equal_to_a_rebuild(self):
+        self.same_city.price = 1000
+        self.same_city.package_type = 'basic'
+        self.same_city.save()
+        self.abroad.departure_date += timedelta(days=300)
+        self.abroad.save()
+        make_package(self.package.destination, name='Paris Twin', price=1000, duration_days=7)
+        queue.run_pending()
+        incremental = self.lists()
+        self.assertEqual(recommendations.rebuild(), 6)
+        self.assertEqual(self.lists(), incremental)
+        self.assertEqual(incremental[self.package.id][:2], [self.same_city.id, Package.objects.get(name='Paris Twin').id])
+
+    def test_a_burst_of_saves_queues_one_refresh(self):
+        Task.objects.all().delete()
+        for package in (self.same_city, self.abroad, self.same_city):
+            package.price += 100
+            package.save()
+        queued = Task.objects.get(name=tasks.refresh_recommendations.task_name, status='queued')
+        self.assertEqual(queued.args, [self.same_city.id, self.abroad.id])
+        queue.run_pending()
+        incremental = self.lists()
+        recommendations.rebuild()
+        self.assertEqual(self.lists(), incremental)
+
+    def test_blocks_fit_the_memory_budget(self):
+        catalog = recommendations.load()
+        self.assertEqual(recommendations.block_rows(catalog, memory_mb=0), 1)
+        self.assertEqual(recommendations.block_rows(catalog, memory_mb=64), recommendations.MAX_BLOCK_ROWS)
+        recommendations.rebuild()
+        lists = self.lists()
+        recommendations.rebuild(memory_mb=0)
+        self.assertEqual(self.lists(), lists)
+
+    def test_changed_recommendations_change_the_page(self):
+        url = reverse('bookings:package_detail', args=[self.package.id])
+        etag = self.client.get(url)['ETag']
+        SimilarPackage.objects.filter(package=self.package).delete()
+        recommendations.refresh_for_packages([self.package.id], limit=0)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_large_changes_are_left_to_the_task_queue(self):
+        Package.objects.bulk_create([
+            Package(
+                destination=self.package.destination, name=f'Bulk {i}', description='Test', price=500 + i,
+                duration_days=5, available_seats=5, departure_date=self.package.departure_date,
+                return_date=self.package.return_date,
+            )
+            for i in range(recommendations.REFRESH_LIMIT + 10)
+        ])
+        self.package.save()
+        self.package.save()
+        # Saves only queue the work, once per package
+        self.assertEqual(Task.objects.filter(name=tasks.refresh_recommendations.task_name, status='queued').count(), 1)
+        self.assertFalse(SimilarPackage.objects.filter(package__name='Bulk 0').exists())
+        queue.run_pending()
+        self.assertEqual(SimilarPackage.objects.filter(package__name='Bulk 0').count(), 10)
+        # The rebuild the refresh handed over to schedules the next one
+        rebuilds = Task.objects.filter(name=tasks.rebuild_recommendations.task_name)
+        self.assertEqual(list(rebuilds.values_list('status', flat=True).order_by('id')), ['done', 'queued'])
+        self.assertGreater(rebuilds.last().run_at, timezone.now() + timedelta(hours=23))
+
+    def test_departed_packages_are_not_recommended(self):
+        Package.objects.filter(id=self.same_country.id).update(
+            departure_date=date.today() - timedelta(days=7), return_date=date.today() - timedelta(days=1)
+        )
+        self.assertEqual(list(recommendations.similar_packages(self.package.id)), [self.abroad, self.same_city])
+        tasks.rebuild_recommendations()
+        self.assertFalse(SimilarPackage.objects.filter(package=self.same_country).exists())
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('traveler', password='secret')
+        self.package = make_package()
+        # Start from an empty queue, without the recommendations refresh the new package queued
+        Task.objects.all().delete()
+
+    def test_booking_emails_are_sent_by_the_worker(self):
+        booking = services.create_booking(make_booking(self.user, self.package))
+        services.cancel_booking(booking)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(queue.stats()['due'], 2)
+
+        self.assertEqual(queue.run_pending(), 2)
+        self.assertEqual([message.subject for message in mail.outbox], [
+            f'Booking #{booking.id} received: Test Package', f'Booking #{booking.id} cancelled',
+        ])
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+        stats = queue.stats()
+        self.assertEqual((stats['due'], stats['done_recently']), (0, 2))
+
+    @override_settings(TASK_RETRY_BACKOFF_SECONDS=60)
+    def test_failing_task_is_retried_with_backoff_then_failed(self):
+        task = queue.enqueue(tasks.send_booking_confirmation, 'not-an-id', max_attempts=2)
+        self.assertEqual(queue.run_pending(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('queued', 1))
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertIn('ValueError', task.last_error)
+        # Not due again until the backoff has passed
+        self.assertEqual(queue.run_pending(), 0)
+
+        Task.objects.filter(id=task.id).update(run_at=timezone.now())
+        with self.assertLogs('bookings.queue', 'ERROR'):
+            self.assertEqual(queue.run_pending(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('failed', 2))
+        self.assertEqual(queue.stats()['failed'], 1)
+
+    def test_claimed_task_is_not_claimed_twice(self):
+        queue.enqueue(tasks.send_booking_confirmation, 0)
+        self.assertIsNotNone(queue.claim())
+        self.assertIsNone(queue.claim())
+
+
+class StaleTaskTests(TransactionTestCase):
+    """A worker that dies mid-task leaves it running until a live worker's lease check puts it back"""
+
+    def test_expired_lease_is_claimed_by_a_live_worker(self):
+        booking = services.create_booking(make_booking(User.objects.create_user('traveler'), make_package()))
+        Task.objects.all().delete()
+        lost = queue.enqueue(tasks.send_booking_confirmation, booking.id)
+        busy = queue.enqueue(tasks.send_booking_confirmation, booking.id)
+        Task.objects.filter(id=lost.id).update(
+            status='running', attempts=1, started_at=timezone.now() - timedelta(seconds=queue.lease_seconds() + 1)
+        )
+        Task.objects.filter(id=busy.id).update(status='running', attempts=1, started_at=timezone.now())
+
+        with self.assertLogs('bookings.queue', 'WARNING'):
+            queue.work(threading.Event(), burst=True)
+        lost.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((lost.status, lost.attempts), ('done', 2))
+        self.assertEqual(busy.status, 'running')
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class AdminPerformanceTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'secret')
+        self.client.force_login(self.admin)
+        self.package = make_package(name='Seine Cruise')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.enterContext(override_settings(EXPORT_ROOT=Path(self.directory.name)))
+
+    def add_bookings(self, count):
+        destination = self.package.destination
+        for _ in range(count):
+            index = Booking.objects.count()
+            package = make_package(destination, name=f'Package {index}')
+            user = User.objects.create_user(f'customer{index}')
+            services.create_booking(make_booking(user, package))
+
+    def test_booking_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:bookings_booking_changelist')
+        self.add_bookings(2)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.add_bookings(20)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+    def test_related_filters_use_autocomplete(self):
+        other = Destination.objects.create(name='Unlisted', description='Test', country='Peru', city='Lima')
+        url = reverse('admin:bookings_package_changelist')
+        response = self.client.get(url)
+        self.assertContains(response, 'data-filter-param="destination__id__exact"')
+        self.assertNotContains(response, 'Unlisted')
+        response = self.client.get(url, {'destination__id__exact': other.id})
+        self.assertContains(response, f'<option value="{other.id}" selected>Unlisted, Lima, Peru</option>', html=True)
+        self.assertContains(response, '0 packages')
+
+    def test_large_unfiltered_changelist_uses_estimate(self):
+        self.add_bookings(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.add_bookings(2)
+        queryset = Booking.objects.all()
+        self.assertEqual(admin.estimated_count(queryset), 3)
+        self.assertIsNone(admin.estimated_count(queryset.filter(status='pending')))
+        with override_settings(ADMIN_ESTIMATED_COUNT_ROWS=3):
+            self.assertEqual(admin.EstimatedCountPaginator(queryset, 10).count, 3)
+        self.assertEqual(admin.EstimatedCountPaginator(queryset, 10).count, 5)
+
+    def export(self, **data):
+        return self.client.post(reverse('admin:bookings_booking_changelist') + '?status__exact=pending', {
+            'action': 'export_csv', '_selected_action': Booking.objects.values_list('id', flat=True), **data,
+        })
+
+    def test_small_export_streams_csv(self):
+        self.add_bookings(3)
+        response = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,user,package,'))
+        self.assertEqual(len(lines), 4)
+
+    @override_settings(ADMIN_EXPORT_SYNC_ROWS=1)
+    def test_large_export_runs_in_background(self):
+        self.add_bookings(3)
+        Booking.objects.filter(id=Booking.objects.first().id).update(status='confirmed')
+        response = self.export(select_across=1)
+        self.assertEqual(response.status_code, 302)
+        task = Task.objects.get(name=tasks.export_changelist.task_name)
+        name, url = task.args[3], task.args[4]
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        queue.run_pending()
+        self.assertIn(url, mail.outbox[-1].body)
+        response = self.client.get(url)
+        # Only the pending bookings the changelist was filtered to
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 3)
+        self.assertTrue((Path(self.directory.name) / name).is_file())
+
+        other = User.objects.create_superuser('other', 'other@example.com', 'secret')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 10000)
+
+    def test_wal_is_opt_in(self):
+        # Switching to WAL rewrites the database file, so only the production profile does it
+        self.assertNotIn('journal_mode', database.sqlite_pragmas())
+        with self.settings(SQLITE_WAL=True):
+            self.assertEqual(database.sqlite_pragmas()['journal_mode'], 'wal')
+            self.assertEqual(database.sqlite_pragmas()['busy_timeout'], 10000)
+
+
+class WriteRetryTests(SimpleTestCase):
+    def locked_after(self, failures):
+        calls = []
+
+        @database.retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError('database is locked')
+            return len(calls)
+        return write
+
+    @override_settings(WRITE_RETRIES=3, WRITE_RETRY_BACKOFF_MS=1)
+    def test_locked_writes_are_retried(self):
+        self.assertEqual(self.locked_after(3)(), 4)
+        with self.assertRaises(OperationalError):
+            self.locked_after(4)()
+
+    def test_other_errors_are_not_retried(self):
+        @database.retry_on_locked
+        def write():
+            raise OperationalError('no such table: bookings_booking')
+        with self.assertRaisesMessage(OperationalError, 'no such table'):
+            write()
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'bookings.profiling.ProfilingMiddleware'})
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.package = make_package()
+
+    def assertTimed(self, response):
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(timing, r'tpl;dur=[\d.]+, app;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertGreater(float(re.search(r'tpl;dur=([\d.]+)', timing).group(1)), 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_server_timing_and_histograms(self):
+        url = reverse('bookings:package_detail', args=[self.package.id])
+        render = Template.render
+        # Visitors are timed, but only staff, or anyone under DEBUG, see the timings
+        self.assertNotIn('Server-Timing', self.client.get(url))
+        cache.clear()
+        with self.settings(DEBUG=True):
+            self.assertTimed(self.client.get(url))
+        staff = User.objects.create_user('ops', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertTimed(self.client.get(url))
+        # Templates are only wrapped while a request is being profiled
+        self.assertIs(Template.render, render)
+
+        routes = self.client.get(reverse('bookings:profiling_stats')).json()['routes']
+        self.assertGreaterEqual(routes['bookings:package_detail']['requests'], 3)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    async def test_asgi_requests_are_timed(self):
+        staff = await User.objects.acreate_user('ops', password='secret', is_staff=True)
+        await self.async_client.aforce_login(staff)
+        response = await self.async_client.get(reverse('bookings:package_detail', args=[self.package.id]))
+        self.assertIn(response.resolver_match.func, async_urls.ASYNC_VIEWS.values())
+        self.assertTimed(response)
+
+    def test_slow_sampled_requests_are_dumped(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=0, PROFILING_DUMP_DIR=self.directory.name):
+            self.client.get(reverse('bookings:home'))
+        dumps = list(Path(self.directory.name).glob('bookings-home-*.prof'))
+        self.assertEqual(len(dumps), 1)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.directory.name))
+
+    def upload(self, size=(1000, 700), color='teal'):
+        buffer = BytesIO()
+        Image.new('RGB', size, color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('beach.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_upload_generates_hashed_variants(self):
+        destination = Destination.objects.create(
+            name='Algarve', description='Beaches', country='Portugal', city='Faro', image=self.upload()
+        )
+        # Rendering is left to the task queue
+        self.assertEqual(Destination.objects.get(id=destination.id).image_variants, {})
+        queue.run_pending()
+        destination.refresh_from_db()
+        variants = destination.image_variants
+        self.assertEqual(variants['source'], destination.image.name)
+        # The 1000px source is not upscaled to the 1200 and 1600px heroes
+        self.assertEqual([r['width'] for r in variants['hero']], [800])
+        self.assertEqual([(r['width'], r['height']) for r in variants['card']], [(400, 200), (800, 400)])
+        for rendition in variants['card'] + variants['thumb'] + variants['hero']:
+            with Image.open(Path(self.directory.name) / rendition['path']) as image:
+                self.assertEqual(image.size, (rendition['width'], rendition['height']))
+        digest = images.content_hash(destination.image.open('rb').read())
+        self.assertTrue(variants['thumb'][0]['path'].endswith(f'{digest}-thumb-60.webp'))
+
+        html = self.client.get(reverse('bookings:destination_list')).content.decode()
+        self.assertIn('400w, ', html)
+        self.assertNotIn(destination.image.url, html)
+
+    def test_unreadable_images_fail_without_raising(self):
+        garbage = Destination.objects.create(
+            name='Garbage', description='Test', country='Portugal', city='Faro',
+            image=SimpleUploadedFile('garbage.jpg', b'not an image', content_type='image/jpeg'),
+        )
+        bomb = Destination.objects.create(
+            name='Bomb', description='Test', country='Portugal', city='Faro', image=self.upload()
+        )
+        # Anything over twice MAX_IMAGE_PIXELS raises DecompressionBombError
+        self.addCleanup(setattr, Image, 'MAX_IMAGE_PIXELS', Image.MAX_IMAGE_PIXELS)
+        Image.MAX_IMAGE_PIXELS = 1000
+        self.assertEqual(images.process_images([garbage, bomb]), (0, [garbage.id, bomb.id]))
+
+    def test_backfill_command(self):
+        destination = Destination.objects.create(
+            name='Algarve', description='Beaches', country='Portugal', city='Faro', image=self.upload((300, 300))
+        )
+        make_package(destination=destination)
+        response = self.client.get(reverse('bookings:package_list'))
+        self.assertContains(response, f'src="{destination.image.url}"')
+
+        call_command('generate_image_derivatives', stdout=StringIO())
+        destination.refresh_from_db()
+        self.assertEqual([r['width'] for r in destination.image_variants['card']], [400])
+        output = StringIO()
+        call_command('generate_image_derivatives', stdout=output)
+        self.assertIn('for 0 destinations', output.getvalue())
+
+
+class BenchmarkTests(TestCase):
+    def test_scaled_dataset_and_route_benchmark(self):
+        call_command('populate_sample_data', scale=1, batch_size=500, stdout=StringIO())
+        self.assertEqual(Package.objects.count(), 1000)
+        self.assertEqual(Booking.objects.count(), 2000)
+        self.assertFalse(Package.objects.filter(available_seats__lt=0).exists())
+        # Bookings fit their package's dates and party size, and no upcoming trip is completed
+        bookings = Booking.objects.values_list(
+            'travel_date', 'number_of_travelers', 'status',
+            'package__departure_date', 'package__return_date', 'package__max_travelers',
+        )
+        for travel_date, travelers, status, departure, returned, max_travelers in bookings:
+            self.assertTrue(departure <= travel_date <= returned)
+            self.assertLessEqual(travelers, max_travelers)
+            if status == 'completed':
+                self.assertLess(returned, date.today())
+        self.assertEqual(DestinationSummary.objects.count(), 50)
+        pending = Booking.objects.filter(status='pending').count()
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('benchmark_routes', requests=3, warmup=1, output=output.name, stdout=StringIO())
+            results = json.loads(Path(output.name).read_text())
+        self.assertEqual(set(results['routes']), {pattern.name for pattern in urls.urlpatterns})
+        for name, result in results['routes'].items():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'], name)
+            self.assertNotIn('500', result['status_codes'], name)
+        # The benchmark rolls back whatever the routes wrote
+        self.assertEqual(Booking.objects.filter(status='pending').count(), pending)
+        self.assertFalse(SeatHold.objects.exists())
+
+        # Batch and single quotes of the catalog must agree, or the command fails
+        output = StringIO()
+        call_command('benchmark_pricing', catalog=True, repeat=1, sample=100, stdout=output)
+        self.assertIn('1000 packages', output.getvalue())
@@ -14,4 +14,7 @@ urlpatterns = [
     path('register/', views.register, name='register'),
     path('destinations/', views.destination_list, name='destination_list'),
     path('destination/<int:destination_id>/', views.destination_detail, name='destination_detail'),
+    path('api/packages/', views.package_export, name='package_export'),
+    path('api/destination/<int:destination_id>/availability/', views.destination_availability, name='destination_availability'),
+    path('profiling/', views.profiling_stats, name='profiling_stats'),
 ]
@@ -1,19 +1,36 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib import messages
-from django.db.models import Q
 from django.core.paginator import Paginator
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from .models import Destination, Package, Booking, UserProfile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q, Subquery, Sum
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from .models import Destination, Package, Booking, SeatHold, SimilarPackage, UserProfile
 from .forms import UserRegistrationForm, UserProfileForm, BookingForm, PackageSearchForm
+from .caching import cache_catalog_page, conditional_page, get_or_build, last_modified_key
+from . import availability, facets, pagination, pricing, profiling, recommendations, services
+from datetime import datetime, time, timedelta
 from decimal import Decimal
+import json
 
+# Largest party the booking form lists totals for
+MAX_QUOTED_PARTY = 20
+
+# Destination cards per page of the destination list
+DESTINATIONS_PER_PAGE = 24
+
+@cache_catalog_page()
 def home(request):
     """Home page with featured destinations and packages"""
     featured_destinations = Destination.objects.all()[:6]
-    featured_packages = Package.objects.filter(available_seats__gt=0).order_by('departure_date')[:6]
+    featured_packages = Package.objects.select_related('destination').filter(available_seats__gt=0).order_by('departure_date')[:6]
     
     context = {
         'featured_destinations': featured_destinations,
@@ -23,61 +40,73 @@ def home(request):
 
 def package_list(request):
     """List all available packages with search and filtering"""
-    packages = Package.objects.filter(available_seats__gt=0)
+    packages = Package.objects.select_related('destination').filter(available_seats__gt=0)
     search_form = PackageSearchForm(request.GET)
     
     if search_form.is_valid():
-        destination = search_form.cleaned_data.get('destination')
-        package_type = search_form.cleaned_data.get('package_type')
-        min_price = search_form.cleaned_data.get('min_price')
-        max_price = search_form.cleaned_data.get('max_price')
-        departure_date = search_form.cleaned_data.get('departure_date')
-        duration_min = search_form.cleaned_data.get('duration_min')
-        duration_max = search_form.cleaned_data.get('duration_max')
-        
-        if destination:
-            packages = packages.filter(
-                Q(destination__name__icontains=destination) |
-                Q(destination__city__icontains=destination) |
-                Q(destination__country__icontains=destination)
-            )
-        
-        if package_type:
-            packages = packages.filter(package_type=package_type)
-        
-        if min_price:
-            packages = packages.filter(price__gte=min_price)
-        
-        if max_price:
-            packages = packages.filter(price__lte=max_price)
-        
-        if departure_date:
-            packages = packages.filter(departure_date__gte=departure_date)
-        
-        if duration_min:
-            packages = packages.filter(duration_days__gte=duration_min)
-        
-        if duration_max:
-            packages = packages.filter(duration_days__lte=duration_max)
-    
-    # Pagination
-    paginator = Paginator(packages, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        packages = search_form.filter_queryset(packages)
+    
+    # Pagination: ranked search results are paged by number, the plain
+    # catalog by (departure_date, id) cursor so deep pages stay cheap
+    if search_form.is_valid() and search_form.cleaned_data.get('destination'):
+        paginator = Paginator(packages, 12)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        total_packages = paginator.count
+        keyset = False
+    else:
+        page_obj = pagination.keyset_page(
+            packages, after=request.GET.get('after'), before=request.GET.get('before'), per_page=12
+        )
+        total_packages = pagination.cached_count(packages)
+        keyset = True
+    
+    # Facet counts for the current filters, cached per filter set
+    facet_counts = facets.cached_facets(search_form, Package.objects.filter(available_seats__gt=0))
+
+    travelers = search_form.cleaned_data.get('travelers') if search_form.is_valid() else None
+    if travelers:
+        page_obj.object_list = pricing.annotate_party_totals(list(page_obj.object_list), travelers)
     
     context = {
         'page_obj': page_obj,
         'search_form': search_form,
-        'total_packages': packages.count(),
+        'total_packages': total_packages,
+        'keyset': keyset,
+        'travelers': travelers,
+        'facets': facets.facet_options(facet_counts, request.GET),
     }
     return render(request, 'bookings/package_list.html', context)
 
+def latest(*moments):
+    moments = [moment for moment in moments if moment is not None]
+    return max(moments) if moments else None
+
+def package_modified_query(package_id):
+    """The package and the packages recommended beside it"""
+    similar = SimilarPackage.objects.filter(package_id=package_id).values('similar_id')
+    return Package.objects.filter(Q(id=package_id) | Q(id__in=similar))
+
+def recommendations_modified(package_id):
+    """When the package's recommendations were last written; lists are replaced wholesale"""
+    return Max(Subquery(
+        SimilarPackage.objects.filter(package_id=package_id).order_by('-created_at').values('created_at')[:1]
+    ))
+
+def package_last_modified(request, package_id):
+    """When the package, its destination or the related packages shown beside it last changed"""
+    edits = package_modified_query(package_id).aggregate(
+        packages=Max('updated_at'),
+        destination=Max('destination__updated_at'),
+        recommended=recommendations_modified(package_id),
+    )
+    return latest(edits['packages'], edits['destination'], edits['recommended'])
+
+@conditional_page(package_last_modified)
+@cache_catalog_page(last_modified_key)
 def package_detail(request, package_id):
     """Detailed view of a specific package"""
-    package = get_object_or_404(Package, id=package_id)
-    related_packages = Package.objects.filter(
-        destination=package.destination
-    ).exclude(id=package.id)[:3]
+    package = get_object_or_404(Package.objects.select_related('destination'), id=package_id)
+    related_packages = recommendations.similar_packages(package.id)
     
     context = {
         'package': package,
@@ -88,62 +117,125 @@ def package_detail(request, package_id):
 @login_required
 def create_booking(request, package_id):
     """Create a new booking for a package"""
-    package = get_object_or_404(Package, id=package_id)
+    package = get_object_or_404(Package.objects.select_related('destination'), id=package_id)
     
     if request.method == 'POST':
-        form = BookingForm(request.POST, package=package)
+        hold = SeatHold.objects.filter(user=request.user, package=package).first()
+        form = BookingForm(request.POST, package=package, held_seats=hold.seats if hold else 0)
         if form.is_valid():
             booking = form.save(commit=False)
             booking.user = request.user
             booking.package = package
-            booking.total_price = package.price * booking.number_of_travelers
-            
-            # Update available seats
-            package.available_seats -= booking.number_of_travelers
-            package.save()
             
-            booking.save()
-            
-            messages.success(request, f'Booking created successfully! Your booking ID is {booking.id}')
-            return redirect('booking_detail', booking_id=booking.id)
+            # Convert the hold into the booking and save it atomically
+            try:
+                services.create_booking(booking, hold=hold)
+            except services.SeatsUnavailable:
+                messages.error(request, 'Sorry, there are no longer enough seats available for this package.')
+                package.refresh_from_db()
+            else:
+                messages.success(request, f'Booking created successfully! Your booking ID is {booking.id}')
+                return redirect('bookings:booking_detail', booking_id=booking.id)
     else:
-        form = BookingForm(package=package)
+        # Hold a seat while the user fills in the form
+        hold = services.hold_seats(request.user, package)
+        if hold is None:
+            messages.warning(request, 'This package is currently sold out.')
+        else:
+            package.refresh_from_db(fields=['available_seats'])
+        form = BookingForm(package=package, held_seats=hold.seats if hold else 0)
+
+    # Totals for every party size the form accepts, shown as the user changes it
+    seats = min(package.available_seats + (hold.seats if hold else 0), package.max_travelers, MAX_QUOTED_PARTY)
+    party_sizes = range(1, max(seats, 1) + 1)
+    party_totals = pricing.quote_totals([package] * len(party_sizes), list(party_sizes))
     
     context = {
         'form': form,
         'package': package,
+        'hold': hold,
+        'party_totals': {size: str(total) for size, total in zip(party_sizes, party_totals)},
     }
     return render(request, 'bookings/create_booking.html', context)
 
 @login_required
 def booking_detail(request, booking_id):
     """View details of a specific booking"""
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+    booking = get_object_or_404(Booking.objects.select_related('package__destination'), id=booking_id, user=request.user)
     
     context = {
         'booking': booking,
     }
     return render(request, 'bookings/booking_detail.html', context)
 
+# Booking statuses that count towards what a customer has spent
+SPENT_STATUSES = ('confirmed', 'completed')
+
+def booking_stats(user):
+    """Per-status counts, lifetime spend and upcoming trips from one grouped query"""
+    rows = Booking.objects.filter(user=user).order_by().values('status').annotate(
+        count=Count('id'),
+        spent=Sum('total_price'),
+        upcoming=Count('id', filter=Q(travel_date__gte=timezone.localdate())),
+    )
+    stats = {
+        'by_status': {status: 0 for status, _ in Booking.STATUS_CHOICES},
+        'total': 0,
+        'spent': Decimal('0'),
+        'upcoming': 0,
+    }
+    for row in rows:
+        stats['by_status'][row['status']] = row['count']
+        stats['total'] += row['count']
+        if row['status'] in SPENT_STATUSES:
+            stats['spent'] += row['spent'] or 0
+        if row['status'] in ('pending', 'confirmed'):
+            stats['upcoming'] += row['upcoming']
+    return stats
+
 @login_required
 def user_dashboard(request):
-    """User dashboard showing all bookings and profile"""
-    user_bookings = Booking.objects.filter(user=request.user).order_by('-booking_date')
-    
-    # Get or create user profile
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    """User dashboard with booking history, booking stats and profile"""
+    # Only POST creates the profile; a plain visit just reads it
+    profile = UserProfile.objects.filter(user=request.user).first() or UserProfile(user=request.user)
     
     if request.method == 'POST':
         profile_form = UserProfileForm(request.POST, instance=profile)
         if profile_form.is_valid():
             profile_form.save()
             messages.success(request, 'Profile updated successfully!')
-            return redirect('user_dashboard')
+            return redirect('bookings:user_dashboard')
     else:
         profile_form = UserProfileForm(instance=profile)
     
+    stats = booking_stats(request.user)
+    status = request.GET.get('status')
+    if status not in stats['by_status']:
+        status = None
+    user_bookings = Booking.objects.filter(user=request.user)
+    if status:
+        user_bookings = user_bookings.filter(status=status)
+    
+    # Page through ids alone, which the (user, [status,] booking_date) indexes
+    # cover, in a subquery that picks the rows to load with their packages.
+    # The stats already hold the row count, so the paginator need not count.
+    paginator = Paginator(user_bookings.order_by('-booking_date').values_list('id', flat=True), 20)
+    paginator.count = stats['by_status'][status] if status else stats['total']
+    page_obj = paginator.get_page(request.GET.get('page'))
+    page_obj.object_list = list(
+        Booking.objects.select_related('package__destination')
+        .filter(id__in=page_obj.object_list)
+        .order_by('-booking_date')
+    )
+    
     context = {
-        'user_bookings': user_bookings,
+        'page_obj': page_obj,
+        'stats': stats,
+        'status': status,
+        'status_tabs': [
+            {'value': value, 'label': label, 'count': stats['by_status'][value]}
+            for value, label in Booking.STATUS_CHOICES
+        ],
         'profile_form': profile_form,
         'profile': profile,
     }
@@ -155,20 +247,13 @@ def cancel_booking(request, booking_id):
     """Cancel a booking"""
     booking = get_object_or_404(Booking, id=booking_id, user=request.user)
     
-    if booking.status == 'pending':
-        booking.status = 'cancelled'
-        booking.save()
-        
-        # Restore available seats
-        package = booking.package
-        package.available_seats += booking.number_of_travelers
-        package.save()
-        
+    # Cancel and restore available seats atomically
+    if services.cancel_booking(booking):
         messages.success(request, 'Booking cancelled successfully!')
     else:
         messages.error(request, 'This booking cannot be cancelled.')
     
-    return redirect('user_dashboard')
+    return redirect('bookings:user_dashboard')
 
 def register(request):
     """User registration"""
@@ -186,7 +271,7 @@ def register(request):
             login(request, user)
             
             messages.success(request, 'Account created successfully!')
-            return redirect('home')
+            return redirect('bookings:home')
     else:
         form = UserRegistrationForm()
     
@@ -195,15 +280,29 @@ def register(request):
     }
     return render(request, 'bookings/register.html', context)
 
+@cache_catalog_page()
 def destination_list(request):
-    """List all destinations"""
-    destinations = Destination.objects.all()
+    """List all destinations, a page at a time by (name, id) cursor"""
+    destinations = pagination.keyset_page(
+        Destination.objects.select_related('summary'), after=request.GET.get('after'),
+        before=request.GET.get('before'), per_page=DESTINATIONS_PER_PAGE, keyset=pagination.DESTINATIONS,
+    )
     
     context = {
         'destinations': destinations,
+        'page_obj': destinations,
     }
     return render(request, 'bookings/destination_list.html', context)
 
+def destination_last_modified(request, destination_id):
+    """When the destination or any of its packages last changed"""
+    edits = Destination.objects.filter(id=destination_id).aggregate(
+        destination=Max('updated_at'), packages=Max('packages__updated_at')
+    )
+    return latest(edits['destination'], edits['packages'])
+
+@conditional_page(destination_last_modified)
+@cache_catalog_page(last_modified_key)
 def destination_detail(request, destination_id):
     """Detailed view of a specific destination"""
     destination = get_object_or_404(Destination, id=destination_id)
@@ -214,3 +313,238 @@ def destination_detail(request, destination_id):
         'packages': packages,
     }
     return render(request, 'bookings/destination_detail.html', context)
+
+# Async versions of the catalog views, served under ASGI by bookings.async_urls.
+# Every query is awaited before the template renders, since templates cannot
+# query from async code. Queries are awaited one after another: the async ORM
+# runs them all on the one thread-sensitive executor, so gathering them would
+# not overlap them.
+
+async def alist(queryset):
+    """Evaluate a queryset with the async ORM"""
+    return [obj async for obj in queryset]
+
+@cache_catalog_page()
+async def ahome(request):
+    """Async version of home"""
+    featured_destinations = await alist(Destination.objects.all()[:6])
+    featured_packages = await alist(
+        Package.objects.select_related('destination').filter(available_seats__gt=0).order_by('departure_date')[:6]
+    )
+    
+    context = {
+        'featured_destinations': featured_destinations,
+        'featured_packages': featured_packages,
+    }
+    return render(request, 'bookings/home.html', context)
+
+async def apackage_list(request):
+    """Async version of package_list"""
+    request.user = await request.auser()
+    packages = Package.objects.select_related('destination').filter(available_seats__gt=0)
+    search_form = PackageSearchForm(request.GET)
+    
+    if search_form.is_valid():
+        # Text search looks for the search index on the connection the ORM's worker thread uses
+        packages = await sync_to_async(search_form.filter_queryset)(packages)
+    
+    if search_form.is_valid() and search_form.cleaned_data.get('destination'):
+        paginator = Paginator(packages, 12)
+        total_packages = await packages.acount()
+        paginator.count = total_packages
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_obj.object_list = await alist(page_obj.object_list)
+        keyset = False
+    else:
+        page_obj = await pagination.akeyset_page(
+            packages, after=request.GET.get('after'), before=request.GET.get('before'), per_page=12
+        )
+        total_packages = await pagination.acached_count(packages)
+        keyset = True
+    
+    facet_counts = await sync_to_async(facets.cached_facets)(
+        search_form, Package.objects.filter(available_seats__gt=0)
+    )
+
+    travelers = search_form.cleaned_data.get('travelers') if search_form.is_valid() else None
+    if travelers:
+        pricing.annotate_party_totals(page_obj.object_list, travelers)
+    
+    context = {
+        'page_obj': page_obj,
+        'search_form': search_form,
+        'total_packages': total_packages,
+        'keyset': keyset,
+        'travelers': travelers,
+        'facets': facets.facet_options(facet_counts, request.GET),
+    }
+    return render(request, 'bookings/package_list.html', context)
+
+async def apackage_last_modified(request, package_id):
+    """Async version of package_last_modified"""
+    edits = await package_modified_query(package_id).aaggregate(
+        packages=Max('updated_at'),
+        destination=Max('destination__updated_at'),
+        recommended=recommendations_modified(package_id),
+    )
+    return latest(edits['packages'], edits['destination'], edits['recommended'])
+
+@conditional_page(apackage_last_modified)
+@cache_catalog_page(last_modified_key)
+async def apackage_detail(request, package_id):
+    """Async version of package_detail"""
+    package = await aget_object_or_404(Package.objects.select_related('destination'), id=package_id)
+    related_packages = await alist(recommendations.similar_packages(package.id))
+    
+    context = {
+        'package': package,
+        'related_packages': related_packages,
+    }
+    return render(request, 'bookings/package_detail.html', context)
+
+@cache_catalog_page()
+async def adestination_list(request):
+    """Async version of destination_list"""
+    destinations = await pagination.akeyset_page(
+        Destination.objects.select_related('summary'), after=request.GET.get('after'),
+        before=request.GET.get('before'), per_page=DESTINATIONS_PER_PAGE, keyset=pagination.DESTINATIONS,
+    )
+    
+    context = {
+        'destinations': destinations,
+        'page_obj': destinations,
+    }
+    return render(request, 'bookings/destination_list.html', context)
+
+async def adestination_last_modified(request, destination_id):
+    """Async version of destination_last_modified"""
+    edits = await Destination.objects.filter(id=destination_id).aaggregate(
+        destination=Max('updated_at'), packages=Max('packages__updated_at')
+    )
+    return latest(edits['destination'], edits['packages'])
+
+@conditional_page(adestination_last_modified)
+@cache_catalog_page(last_modified_key)
+async def adestination_detail(request, destination_id):
+    """Async version of destination_detail"""
+    destination = await aget_object_or_404(Destination, id=destination_id)
+    packages = await alist(Package.objects.filter(destination_id=destination_id, available_seats__gt=0))
+    
+    context = {
+        'destination': destination,
+        'packages': packages,
+    }
+    return render(request, 'bookings/destination_detail.html', context)
+
+# Fields emitted per package by the catalog export
+EXPORT_FIELDS = (
+    'id', 'name', 'package_type', 'duration_days', 'price', 'max_travelers', 'available_seats',
+    'departure_date', 'return_date', 'includes_flight', 'includes_hotel', 'includes_meals',
+    'includes_transport', 'destination_id', 'destination__name', 'destination__city', 'destination__country',
+)
+
+def export_rows(search_form):
+    """Rows of the catalog export for a valid search form"""
+    packages = search_form.filter_queryset(Package.objects.filter(available_seats__gt=0))
+    if not search_form.cleaned_data.get('destination'):
+        packages = packages.order_by('departure_date', 'id')
+    return packages.values(*EXPORT_FIELDS)
+
+def export_line(row, index, as_array):
+    """One exported row as an NDJSON line, or as a JSON array item"""
+    row['destination'] = {
+        'id': row.pop('destination_id'),
+        'name': row.pop('destination__name'),
+        'city': row.pop('destination__city'),
+        'country': row.pop('destination__country'),
+    }
+    line = json.dumps(row, cls=DjangoJSONEncoder)
+    if as_array:
+        return (',\n' if index else '\n') + line
+    return line + '\n'
+
+def export_stream(rows, as_array):
+    if as_array:
+        yield '['
+    for index, row in enumerate(rows):
+        yield export_line(row, index, as_array)
+    if as_array:
+        yield '\n]\n'
+
+async def aexport_stream(rows, as_array):
+    if as_array:
+        yield '['
+    index = 0
+    async for row in rows:
+        yield export_line(row, index, as_array)
+        index += 1
+    if as_array:
+        yield '\n]\n'
+
+@require_GET
+def package_export(request):
+    """Stream the filtered package catalog as NDJSON (or a JSON array with ?format=json)"""
+    search_form = PackageSearchForm(request.GET)
+    if not search_form.is_valid():
+        return JsonResponse({'errors': search_form.errors}, status=400)
+    as_array = request.GET.get('format') == 'json'
+    rows = export_rows(search_form).iterator(chunk_size=2000)
+    return StreamingHttpResponse(
+        export_stream(rows, as_array), content_type='application/json' if as_array else 'application/x-ndjson'
+    )
+
+@require_GET
+async def apackage_export(request):
+    """Async version of package_export; under ASGI a sync iterator is read whole before sending, so stream async"""
+    search_form = PackageSearchForm(request.GET)
+    if not search_form.is_valid():
+        return JsonResponse({'errors': search_form.errors}, status=400)
+    as_array = request.GET.get('format') == 'json'
+    # Text search looks for the search index on the connection the ORM's worker thread uses
+    rows = (await sync_to_async(export_rows)(search_form)).aiterator(chunk_size=2000)
+    return StreamingHttpResponse(
+        aexport_stream(rows, as_array), content_type='application/json' if as_array else 'application/x-ndjson'
+    )
+
+def availability_last_modified(request, destination_id):
+    """As destination_last_modified, but no earlier than midnight for the default range starting today"""
+    edits = destination_last_modified(request, destination_id)
+    if edits is None or request.GET.get('start'):
+        return edits
+    return latest(edits, timezone.make_aware(datetime.combine(timezone.localdate(), time.min)))
+
+@require_GET
+@conditional_page(availability_last_modified)
+def destination_availability(request, destination_id):
+    """Packages, seats left and lowest price per day for a destination (?start=&end=, ISO dates)"""
+    if request.last_modified is None:
+        raise Http404('No such destination')
+    try:
+        start = parse_date(request.GET.get('start') or timezone.localdate().isoformat())
+        end = parse_date(request.GET['end']) if request.GET.get('end') else start and start + timedelta(days=89)
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        return JsonResponse({'errors': {'dates': ['Use YYYY-MM-DD for start and end.']}}, status=400)
+    if not 0 <= (end - start).days < availability.MAX_DAYS:
+        return JsonResponse(
+            {'errors': {'dates': [f'end must be on or after start and at most {availability.MAX_DAYS} days later.']}},
+            status=400,
+        )
+
+    # The key changes whenever a package's seats or price change, or a package is deleted or moved away
+    days = get_or_build(
+        f'availability:{destination_id}:{request.last_modified.isoformat()}:{start}:{end}',
+        lambda: availability.calendar(destination_id, start, end),
+        timeout=getattr(settings, 'CATALOG_CACHE_SECONDS', 60),
+    )
+    return JsonResponse({'destination': destination_id, 'start': start, 'end': end, 'days': days})
+
+@staff_member_required
+@require_GET
+def profiling_stats(request):
+    """Per-route latency histograms recorded by the profiling middleware"""
+    return JsonResponse({
+        'window_seconds': profiling.histograms.window,
+        'routes': profiling.histograms.snapshot(),
+    })
@@ -0,0 +1,9 @@
+"""URL configuration used for ASGI requests: the project URLs with the async catalog views."""
+from django.urls import URLResolver, include, path
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('', include('bookings.async_urls'))
+    if isinstance(pattern, URLResolver) and pattern.namespace == 'bookings' else pattern
+    for pattern in wsgi_urlpatterns
+]
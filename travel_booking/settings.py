@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bookings.middleware.AsyncURLConfMiddleware',
+    'bookings.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,8 +52,21 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request profiling is opt-in: put 'bookings.profiling.ProfilingMiddleware'
+# first in MIDDLEWARE to get Server-Timing headers (staff, or everyone under
+# DEBUG), per-route histograms at /profiling/ (staff only) and sampled
+# cProfile dumps of slow requests.
+PROFILING_SAMPLE_RATE = 0.01  # share of requests run under cProfile
+PROFILING_SLOW_MS = 500  # sampled requests slower than this are dumped
+PROFILING_DUMP_DIR = BASE_DIR / 'profiles'
+PROFILING_WINDOW_SECONDS = 300  # histograms cover the last one to two windows
+
 ROOT_URLCONF = 'travel_booking.urls'
 
+# URLconf for requests served through asgi.py: the catalog pages use their
+# async views there (set to None to serve the sync views under ASGI too)
+ASYNC_URLCONF = 'travel_booking.asgi_urls'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -73,13 +88,105 @@ WSGI_APPLICATION = 'travel_booking.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are kept open between requests, and transactions start with
+# BEGIN IMMEDIATE so a writer waits for the lock up front rather than failing
+# when it tries to upgrade a read lock.
+SQLITE_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'transaction_mode': 'IMMEDIATE',
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        **SQLITE_DATABASE,
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Read replica for catalog queries. Locally it is the primary's own file;
+    # point NAME at a replicated copy before listing it in DATABASE_REPLICAS.
+    # Tests read it through the primary's test database.
+    'replica': {
+        **SQLITE_DATABASE,
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# Pragmas run on every new SQLite connection (see bookings/database.py).
+# They only configure the connection and leave the database file as it is.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 10000,
+    'cache_size': -20000,
+    'mmap_size': 134217728,
+    'temp_store': 'memory',
+}
+
+# Production profile: WAL journaling with synchronous=NORMAL on every
+# connection. WAL is recorded in the database file itself, so it is opt-in
+# and stays off for the sample db.sqlite3 kept in the repository.
+SQLITE_WAL = False
+
+# Further attempts at a write transaction that hit "database is locked", and
+# the delay before the first one (doubled for each attempt after it)
+WRITE_RETRIES = 5
+WRITE_RETRY_BACKOFF_MS = 20
+
+DATABASE_ROUTERS = ['bookings.routers.ReplicaRouter']
+
+# Aliases catalog reads are spread across (empty reads everything from default)
+DATABASE_REPLICAS = []
+
+# Seconds a client keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = 5
+
+
+# Background tasks (bookings/queue.py): attempts before a task is marked
+# failed, delay before the first retry (doubled after each failure), how long
+# a running task may go before another worker takes it over, and how long
+# finished tasks are kept for the queue statistics
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BACKOFF_SECONDS = 10
+TASK_LEASE_SECONDS = 300
+TASK_RETENTION_DAYS = 7
+
+# Admin changelists of tables with at least this many rows (by the planner's
+# estimate) show the estimate instead of running COUNT(*)
+ADMIN_ESTIMATED_COUNT_ROWS = 100000
+
+# Admin CSV exports of more rows than this are written in the background to
+# EXPORT_ROOT, which is not served publicly
+ADMIN_EXPORT_SYNC_ROWS = 5000
+EXPORT_ROOT = BASE_DIR / 'exports'
+
+# Booking emails are printed to the console; configure SMTP in production
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'bookings@travelease.com'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; use FileBasedCache or a shared backend to
+# share cached catalog pages between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'travel-booking',
     }
 }
 
+# Seconds an anonymous catalog page stays fresh before it is rebuilt. Catalog
+# edits, and packages selling out or coming back on sale, invalidate pages at
+# once; other seat count changes can show up to this much later.
+CATALOG_CACHE_SECONDS = 60
+
+# Seconds a shared HTTP cache (CDN, proxy) may serve an anonymous package or
+# destination page before revalidating it with If-None-Match
+CATALOG_HTTP_MAX_AGE = 0
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,6 +236,43 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Minutes a seat stays held while a user fills in the booking form
+SEAT_HOLD_MINUTES = 10
+
+# Days a booking may stay pending before manage.py sweep_bookings expires it.
+# None expires pending bookings only once their package has departed; set a
+# number only if staff confirm every booking within that time
+PENDING_BOOKING_DAYS = None
+
+# Pricing rules applied in order to every quote and booking; none by
+# default, so bookings are charged the listed price. For example, 5% off
+# parties of 4 and 10% off parties of 8:
+#     {'NAME': 'bookings.pricing.GroupDiscount', 'OPTIONS': {'tiers': {4: 0.05, 8: 0.10}}}
+# The other built-in rules are bookings.pricing.SeasonalPricing (OPTIONS
+# {'months': {month: rate}}) and bookings.pricing.PackageTypeSurcharge
+# (OPTIONS {'rates': {package_type: rate}})
+PRICING_RULES = []
+
+# Nearest neighbours stored per package by bookings.recommendations; package
+# pages show the first three that still have seats
+SIMILAR_PACKAGES = 10
+
+# Hours between the queued full rebuilds of those lists, which drop departed
+# packages and pick up ones that became bookable again
+RECOMMENDATIONS_REBUILD_HOURS = 24
+
+# Megabytes a rebuild may use to compare one block of packages with the whole
+# catalog; blocks shrink as the catalog grows
+RECOMMENDATIONS_BLOCK_MB = 64
+
+# Seconds a package listing total is cached for (0 counts on every request)
+PACKAGE_COUNT_CACHE_SECONDS = 60
+
+# Destination image derivatives: processes generate_image_derivatives renders
+# with (None = one per CPU) and output format (WEBP or JPEG)
+IMAGE_WORKERS = None
+IMAGE_FORMAT = 'WEBP'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 